@@ -0,0 +1,164 @@
+"""
+Колоночный in-memory кэш задач для статистики на NumPy.
+
+Для каждой задачи хранятся проект, день завершения и отработанные часы -
+в непрерывных массивах. Статистика по периодам и проектам считается
+векторно (searchsorted по границам периодов + bincount), без разбора
+дат построчно. NumPy - необязательная зависимость: без него available()
+возвращает False, и статистика считается SQL-запросами по daily_task_stats.
+Кэш включается явно (Database(use_analytics=True), PLANNER_ANALYTICS=1):
+на обычных периодах SQL по daily_task_stats быстрее.
+"""
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+
+# Строки для загрузки кэша: день завершения только у выполненных задач с разбираемой датой,
+# как и в daily_task_stats
+TASK_COLUMNS_SQL = '''
+    SELECT id, project_id,
+           CASE WHEN completed = 1 THEN date(substr(completed_at, 1, 10)) END,
+           COALESCE(tracked_hours, 0)
+    FROM tasks
+'''
+
+
+def available():
+    """Установлен ли NumPy"""
+    return np is not None
+
+
+def _days(values):
+    """Даты 'YYYY-MM-DD' (или None) -> номера дней от 1970-01-01; None -> NaT (минимальный int64)"""
+    return np.array(['NaT' if value is None else value for value in values],
+                    dtype='datetime64[D]').astype(np.int64)
+
+
+class TaskAnalytics:
+    """Колоночный кэш задач с инкрементальным обновлением"""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._positions = {}  # id задачи -> индекс в массивах
+        self._size = 0
+        self._allocate(0)
+        self.loaded = False
+    
+    def _allocate(self, capacity):
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._project = np.zeros(capacity, dtype=np.int64)
+        self._completed_day = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)
+        self._hours = np.zeros(capacity, dtype=np.float64)
+        self._alive = np.zeros(capacity, dtype=bool)
+    
+    def _grow(self, needed):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        old = (self._ids, self._project, self._completed_day, self._hours, self._alive)
+        self._allocate(max(needed, capacity * 2, 1024))
+        for target, source in zip((self._ids, self._project, self._completed_day, self._hours, self._alive), old):
+            target[:len(source)] = source
+    
+    def load(self, rows):
+        """Заполнить кэш целиком. rows: кортежи (id, project_id, день завершения или None, часы)"""
+        rows = list(rows)
+        with self._lock:
+            self._positions = {}
+            self._size = 0
+            self._allocate(max(len(rows), 1024))
+            if rows:
+                ids, projects, days, hours = zip(*rows)
+                count = len(rows)
+                self._ids[:count] = ids
+                self._project[:count] = projects
+                self._completed_day[:count] = _days(days)
+                self._hours[:count] = hours
+                self._alive[:count] = True
+                self._positions = {task_id: i for i, task_id in enumerate(ids)}
+                self._size = count
+            self.loaded = True
+    
+    def upsert(self, rows):
+        """Добавить новые задачи или обновить существующие (те же кортежи, что в load)"""
+        rows = list(rows)
+        if not rows:
+            return
+        days = _days(row[2] for row in rows)
+        with self._lock:
+            self._grow(self._size + len(rows))
+            for (task_id, project_id, _, hours), day in zip(rows, days):
+                position = self._positions.get(task_id)
+                if position is None:
+                    position = self._positions[task_id] = self._size
+                    self._size += 1
+                self._ids[position] = task_id
+                self._project[position] = project_id
+                self._completed_day[position] = day
+                self._hours[position] = hours
+                self._alive[position] = True
+    
+    def remove(self, task_ids):
+        with self._lock:
+            for task_id in task_ids:
+                position = self._positions.pop(task_id, None)
+                if position is not None:
+                    self._alive[position] = False
+    
+    def remove_project(self, project_id):
+        with self._lock:
+            size = self._size
+            removed = self._alive[:size] & (self._project[:size] == project_id)
+            for task_id in self._ids[:size][removed].tolist():
+                self._positions.pop(task_id, None)
+            self._alive[:size] &= ~removed
+    
+    def _snapshot(self):
+        """Копии живых строк: (проект, день завершения, часы)"""
+        with self._lock:
+            size = self._size
+            alive = self._alive[:size]
+            return self._project[:size][alive], self._completed_day[:size][alive], self._hours[:size][alive]
+    
+    def period_stats(self, date_from, date_to, starts, group_of=None):
+        """Выполненные задачи и часы за [date_from, date_to] по периодам.
+        
+        starts - отсортированные даты начала периодов (первая не позже date_from),
+        group_of(project_id) -> ключ группы или None без разреза. Возвращает
+        (ключи групп, количества [группа, период], часы [группа, период]).
+        """
+        project, day, hours = self._snapshot()
+        low, high = _days([str(date_from), str(date_to)])
+        done = (day >= low) & (day <= high)  # NaT (открытые задачи) меньше любой даты
+        project, day, hours = project[done], day[done], hours[done]
+        
+        periods = len(starts)
+        period = np.searchsorted(_days(str(start) for start in starts), day, side='right') - 1
+        if group_of is None:
+            groups = [None]
+            group = np.zeros(len(day), dtype=np.int64)
+        else:
+            project_ids, inverse = np.unique(project, return_inverse=True)
+            group_keys = [group_of(project_id) for project_id in project_ids.tolist()]
+            groups = sorted(set(group_keys))
+            index = {key: i for i, key in enumerate(groups)}
+            group = np.array([index[key] for key in group_keys], dtype=np.int64)[inverse]
+        
+        cells = group * periods + period
+        size = len(groups) * periods
+        counts = np.bincount(cells, minlength=size).reshape(len(groups), periods)
+        totals = np.bincount(cells, weights=hours, minlength=size).reshape(len(groups), periods)
+        return groups, counts, totals
+    
+    def project_stats(self):
+        """По проектам: (id проектов, выполнено, всего задач, часы) - массивы по возрастанию id"""
+        project, day, hours = self._snapshot()
+        project_ids, inverse = np.unique(project, return_inverse=True)
+        done = day != np.iinfo(np.int64).min
+        total = np.bincount(inverse, minlength=len(project_ids))
+        completed = np.bincount(inverse, weights=done, minlength=len(project_ids))
+        tracked = np.bincount(inverse, weights=np.where(done, hours, 0.0), minlength=len(project_ids))
+        return project_ids, completed.astype(np.int64), total, tracked
@@ -1,20 +1,118 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
-from database import Database
+from database import Database, SYNC_COLUMNS
+from functools import wraps
+from werkzeug.exceptions import HTTPException
+import assets
+import compression
+import events
+import os
 import socket
 
 app = Flask(__name__)
 # Включаем CORS для доступа с мобильного приложения
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-db = Database()
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor', 'X-Next-Offset'])
+# PLANNER_SINGLE_WRITER=1 - все изменения через один поток-писатель с групповой фиксацией,
+# PLANNER_POOL_SIZE - размер пула соединений (serve.py задает его по числу потоков),
+# PLANNER_ANALYTICS=1 - статистика в колоночном кэше на NumPy
+db = Database(pool_size=int(os.environ.get('PLANNER_POOL_SIZE', 5)),
+              use_analytics=os.environ.get('PLANNER_ANALYTICS') == '1',
+              single_writer=os.environ.get('PLANNER_SINGLE_WRITER') == '1')
+# Сжатие ответов и статики, распаковка сжатых тел запросов
+compression.init_app(app)
+assets.init_app(app)
 
 # Создаем дефолтный проект при первом запуске
 if not db.get_all_projects():
     db.create_project("Мой проект")
 
+# Сколько элементов массива отправляется одной порцией при потоковой выдаче
+STREAM_CHUNK_ITEMS = 200
+
+def stream_json_array(rows, serialize):
+    """Потоковый JSON-массив: строки читаются из курсора и сериализуются порциями,
+    поэтому ни список строк, ни итоговая JSON-строка целиком в памяти не собираются"""
+    rows = iter(rows)
+    # Первую строку читаем сразу: ошибка запроса превратится в обычный ответ 500
+    first = next(rows, None)
+    
+    def dumps(row):
+        return app.json.dumps(serialize(row), separators=(',', ':'))
+    
+    def generate():
+        if first is None:
+            yield '[]'
+            return
+        chunk = ['[', dumps(first)]
+        for row in rows:
+            chunk.append(',')
+            chunk.append(dumps(row))
+            if len(chunk) >= STREAM_CHUNK_ITEMS * 2:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append(']')
+        yield ''.join(chunk)
+    
+    return Response(generate(), mimetype='application/json')
+
+def read_app_version():
+    """Версия приложения из package.json и время его изменения (время сборки)"""
+    import os
+    import json
+    from datetime import datetime
+    
+    version = "1.0.0"
+    build_time = None
+    try:
+        package_path = os.path.join(os.path.dirname(__file__), 'package.json')
+        if os.path.exists(package_path):
+            build_time = datetime.fromtimestamp(os.path.getmtime(package_path))
+            with open(package_path, 'r', encoding='utf-8') as f:
+                package_data = json.load(f)
+                version = package_data.get('version', '1.0.0')
+    except:
+        pass
+    return version, build_time or datetime.now()
+
+APP_VERSION, APP_BUILD_TIME = read_app_version()
+
+def conditional_get(*tables):
+    """Условный GET для представлений, ответ которых зависит только от таблиц tables.
+    
+    ETag строится из счетчиков изменений таблиц (data_versions), текущей даты
+    (просрочка, дневные лимиты и статистика зависят от нее) и версии приложения.
+    Если клиент прислал тот же ETag в If-None-Match, отвечаем 304 без запросов
+    к данным и сериализации JSON.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from datetime import date
+            
+            versions = db.get_data_versions(tables) if tables else ()
+            etag = '-'.join([APP_VERSION, date.today().isoformat()] + [str(v) for v in versions])
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # Кэшировать можно, но перед использованием - всегда перепроверять
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # Данные первого экрана встраиваются в страницу: клиенту не нужны стартовые запросы к API
+    try:
+        bootstrap = build_bootstrap(request.args.get('project', 0, type=int))
+    except Exception as e:
+        print(f"Ошибка сборки стартовых данных: {e}")
+        bootstrap = None
+    return render_template('index.html', bootstrap=bootstrap)
 
 @app.route('/check')
 def check_connection():
@@ -39,52 +137,35 @@ def server_info():
     })
 
 @app.route('/api/app-version')
+@conditional_get()
 def app_version():
     """Версия приложения для проверки обновлений"""
-    import os
-    import json
-    from datetime import datetime
-    
-    # Читаем версию из package.json
-    version = "1.0.0"
-    build_time = datetime.now().isoformat()
-    
-    try:
-        package_path = os.path.join(os.path.dirname(__file__), 'package.json')
-        if os.path.exists(package_path):
-            with open(package_path, 'r', encoding='utf-8') as f:
-                package_data = json.load(f)
-                version = package_data.get('version', '1.0.0')
-    except:
-        pass
-    
     return jsonify({
-        'version': version,
-        'buildTime': build_time,
-        'timestamp': int(datetime.now().timestamp() * 1000)
+        'version': APP_VERSION,
+        'buildTime': APP_BUILD_TIME.isoformat(),
+        'timestamp': int(APP_BUILD_TIME.timestamp() * 1000)
     })
 
 # API для проектов
+def project_to_dict(p):
+    return {
+        'id': p[0],
+        'name': p[1],
+        'monthly_price': float(p[2]),
+        'is_subscription': bool(p[3]),
+        'payment_date': p[4] or None,
+        'rank': p[5],
+        'task_count': p[6],
+        'open_task_count': p[7],
+        'overdue_task_count': p[8],
+        'total_task_count': p[9],
+        'open_price_sum': float(p[10])
+    }
+
 @app.route('/api/projects', methods=['GET'])
+@conditional_get('projects', 'tasks', 'daily_subscription_time')
 def get_projects():
-    projects = db.get_all_projects()
-    result = []
-    for p in projects:
-        project_id = p[0]
-        # Получаем количество незавершенных задач для проекта
-        tasks = db.get_tasks(project_id, include_completed=False)
-        task_count = len(tasks) if tasks else 0
-        
-        result.append({
-            'id': project_id, 
-            'name': p[1],
-            'monthly_price': float(p[2]) if len(p) > 2 else 0,
-            'is_subscription': bool(p[3]) if len(p) > 3 else False,
-            'payment_date': p[4] if len(p) > 4 and p[4] else None,
-            'sort_order': int(p[5]) if len(p) > 5 else 0,
-            'task_count': task_count
-        })
-    return jsonify(result)
+    return jsonify([project_to_dict(p) for p in db.get_projects_with_stats()])
 
 @app.route('/api/projects', methods=['POST'])
 def create_project():
@@ -111,8 +192,7 @@ def update_project(project_id):
         name=data.get('name'),
         monthly_price=data.get('monthly_price'),
         is_subscription=data.get('is_subscription'),
-        payment_date=data.get('payment_date'),
-        sort_order=data.get('sort_order')
+        payment_date=data.get('payment_date')
     )
     return jsonify({'success': True}), 200
 
@@ -129,62 +209,94 @@ def update_projects_order():
     db.update_projects_order(orders)
     return jsonify({'success': True}), 200
 
+def move_params(data):
+    """Соседи после перемещения из тела {"prev_id": ..., "next_id": ...} или None, если они некорректны"""
+    neighbours = ((data or {}).get('prev_id'), (data or {}).get('next_id'))
+    if not all(item_id is None or (isinstance(item_id, int) and not isinstance(item_id, bool)) for item_id in neighbours):
+        return None
+    return neighbours
+
+@app.route('/api/projects/<int:project_id>/move', methods=['PUT'])
+def move_project(project_id):
+    """Переставить проект между соседями: меняется только его ранг"""
+    neighbours = move_params(request.json)
+    if neighbours is None:
+        return jsonify({'error': 'prev_id и next_id - id проектов или null'}), 400
+    rank = db.move_project(project_id, *neighbours)
+    if rank is None:
+        return jsonify({'error': 'Проект не найден'}), 404
+    return jsonify({'success': True, 'rank': rank}), 200
+
 @app.route('/api/projects/<int:project_id>', methods=['DELETE'])
 def delete_project(project_id):
     db.delete_project(project_id)
     return jsonify({'success': True}), 200
 
 # API для задач
+# Размер страницы задач при постраничной загрузке (?limit=&after=)
+TASKS_PAGE_SIZE = 100
+TASKS_PAGE_MAX = 500
+
+def parse_price(price):
+    try:
+        return float(price) if price else 0
+    except (ValueError, TypeError):
+        return 0
+
+def task_to_dict(t):
+    return {
+        'id': t[0],
+        'title': t[1],
+        'description': t[2] or '',
+        'completed': bool(t[3]),
+        'created_at': t[4] or '',
+        'completed_at': t[5] or '',
+        'deadline': t[6] or '',
+        'started_at': t[7] or '' if len(t) > 7 else '',
+        'price': float(t[8]) if len(t) > 8 else 0
+    }
+
+def all_task_to_dict(t):
+    """Задача из get_all_tasks (с проектом)"""
+    task = task_to_dict(t)
+    task['project_id'] = t[9] if len(t) > 9 else None
+    task['project_name'] = t[10] if len(t) > 10 else None
+    return task
+
 @app.route('/api/projects/<int:project_id>/tasks', methods=['GET'])
+@conditional_get('tasks', 'projects', 'daily_subscription_time')
 def get_tasks(project_id):
     include_completed = request.args.get('include_completed', 'true').lower() == 'true'
-    
     # Если project_id = 0, возвращаем все задачи из всех проектов
-    if project_id == 0:
+    serialize = all_task_to_dict if project_id == 0 else task_to_dict
+    
+    # Постраничная загрузка: limit - размер страницы, after - курсор из X-Next-Cursor
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
+    if limit is not None or after:
+        limit = min(max(limit or TASKS_PAGE_SIZE, 1), TASKS_PAGE_MAX)
         try:
-            tasks = db.get_all_tasks(include_completed=include_completed)
-            return jsonify([{
-                'id': t[0],
-                'title': t[1],
-                'description': t[2] or '',
-                'completed': bool(t[3]),
-                'created_at': t[4] or '',
-                'completed_at': t[5] or '',
-                'deadline': t[6] or '',
-                'started_at': t[7] or '' if len(t) > 7 else '',
-                'price': float(t[8]) if len(t) > 8 else 0,
-                'project_id': t[9] if len(t) > 9 else None,
-                'project_name': t[10] if len(t) > 10 else None
-            } for t in tasks])
-        except Exception as e:
-            print(f"Ошибка получения всех задач: {e}")
-            return jsonify({'error': str(e)}), 500
+            tasks, next_cursor = db.get_tasks_page(project_id, limit, after, include_completed)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        response = jsonify([serialize(t) for t in tasks])
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     
     try:
-        tasks = db.get_tasks(project_id, include_completed=include_completed)
-        return jsonify([{
-            'id': t[0],
-            'title': t[1],
-            'description': t[2] or '',
-            'completed': bool(t[3]),
-            'created_at': t[4] or '',
-            'completed_at': t[5] or '',
-            'deadline': t[6] or '',
-            'started_at': t[7] or '' if len(t) > 7 else '',
-            'price': float(t[8]) if len(t) > 8 else 0
-        } for t in tasks])
+        return stream_json_array(db.iter_tasks(project_id, include_completed=include_completed), serialize)
     except Exception as e:
-        print(f"Ошибка получения задач проекта {project_id}: {e}")
+        if project_id == 0:
+            print(f"Ошибка получения всех задач: {e}")
+        else:
+            print(f"Ошибка получения задач проекта {project_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/projects/<int:project_id>/tasks', methods=['POST'])
 def create_task(project_id):
     data = request.json
-    price = data.get('price', 0)
-    try:
-        price = float(price) if price else 0
-    except (ValueError, TypeError):
-        price = 0
+    price = parse_price(data.get('price', 0))
     task_id = db.create_task(project_id, data['title'], data.get('description', ''), data.get('deadline'), price)
     return jsonify({'id': task_id, 'title': data['title']}), 201
 
@@ -202,13 +314,89 @@ def update_task(task_id):
     )
     return jsonify({'success': True}), 200
 
+@app.route('/api/tasks/<int:task_id>/move', methods=['PUT'])
+def move_task(task_id):
+    """Переставить задачу вручную между соседями: меняется только ее ранг"""
+    neighbours = move_params(request.json)
+    if neighbours is None:
+        return jsonify({'error': 'prev_id и next_id - id задач или null'}), 400
+    rank = db.move_task(task_id, *neighbours)
+    if rank is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify({'success': True, 'rank': rank}), 200
+
 @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     db.delete_task(task_id)
     return jsonify({'success': True}), 200
 
+# Массовые операции с задачами
+BULK_MAX_TASKS = 10000
+
+def bulk_task_ids(data):
+    """Список id задач из тела массового запроса или None, если он некорректен"""
+    ids = (data or {}).get('ids')
+    if (not isinstance(ids, list) or len(ids) > BULK_MAX_TASKS
+            or not all(isinstance(task_id, int) and not isinstance(task_id, bool) for task_id in ids)):
+        return None
+    return ids
+
+@app.route('/api/projects/<int:project_id>/tasks/bulk', methods=['POST'])
+def create_tasks_bulk(project_id):
+    """Создать задачи списком: {"tasks": [{"title": ..., "description", "deadline", "price"}, ...]}"""
+    tasks = (request.json or {}).get('tasks')
+    if (not isinstance(tasks, list) or len(tasks) > BULK_MAX_TASKS
+            or not all(isinstance(task, dict) and task.get('title') for task in tasks)):
+        return jsonify({'error': f'tasks: ожидается список задач с title (не больше {BULK_MAX_TASKS})'}), 400
+    try:
+        task_ids = db.create_tasks(project_id, [{
+            'title': task['title'],
+            'description': task.get('description', ''),
+            'deadline': task.get('deadline'),
+            'price': parse_price(task.get('price', 0))
+        } for task in tasks])
+        return jsonify({'ids': task_ids}), 201
+    except Exception as e:
+        print(f"Ошибка массового создания задач: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tasks/bulk', methods=['PATCH'])
+def update_tasks_bulk():
+    """Одинаково изменить задачи: {"ids": [...], "completed", "project_id", "deadline", "started_at", "price"}"""
+    data = request.json
+    task_ids = bulk_task_ids(data)
+    if task_ids is None:
+        return jsonify({'error': f'ids: ожидается список id задач (не больше {BULK_MAX_TASKS})'}), 400
+    try:
+        updated = db.update_tasks(
+            task_ids,
+            completed=data.get('completed'),
+            deadline=data.get('deadline'),
+            started_at=data.get('started_at'),
+            price=data.get('price'),
+            project_id=data.get('project_id')
+        )
+        return jsonify({'success': True, 'updated': len(updated)}), 200
+    except Exception as e:
+        print(f"Ошибка массового изменения задач: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tasks/bulk', methods=['DELETE'])
+def delete_tasks_bulk():
+    """Удалить задачи: {"ids": [...]}"""
+    task_ids = bulk_task_ids(request.json)
+    if task_ids is None:
+        return jsonify({'error': f'ids: ожидается список id задач (не больше {BULK_MAX_TASKS})'}), 400
+    try:
+        deleted = db.delete_tasks(task_ids)
+        return jsonify({'success': True, 'deleted': len(deleted)}), 200
+    except Exception as e:
+        print(f"Ошибка массового удаления задач: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # API для заметок
 @app.route('/api/projects/<int:project_id>/notes', methods=['GET'])
+@conditional_get('notes')
 def get_notes(project_id):
     note = db.get_note(project_id)
     if note:
@@ -223,6 +411,7 @@ def save_notes(project_id):
 
 # API для заметок задач
 @app.route('/api/tasks/<int:task_id>/notes', methods=['GET'])
+@conditional_get('task_notes')
 def get_task_notes(task_id):
     note = db.get_task_note(task_id)
     if note:
@@ -237,21 +426,22 @@ def save_task_notes(task_id):
 
 # API для общих заметок (ежедневник)
 @app.route('/api/daily-notes', methods=['GET'])
+@conditional_get('daily_notes')
 def get_all_daily_notes():
     try:
-        notes = db.get_all_daily_notes()
-        return jsonify([{
+        return stream_json_array(db.iter_all_daily_notes(), lambda n: {
             'id': n[0],
             'title': n[1],
             'content': n[2] or '',
             'created_at': n[3],
             'updated_at': n[4]
-        } for n in notes])
+        })
     except Exception as e:
         print(f"Ошибка получения всех заметок ежедневника: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/daily-notes/<int:note_id>', methods=['GET'])
+@conditional_get('daily_notes')
 def get_daily_note(note_id):
     try:
         note = db.get_daily_note(note_id)
@@ -305,6 +495,7 @@ def delete_daily_note(note_id):
 
 # API для состояния UI
 @app.route('/api/ui-state', methods=['GET'])
+@conditional_get('ui_state')
 def get_ui_state():
     try:
         key = request.args.get('key')
@@ -334,23 +525,52 @@ def set_ui_state():
         return jsonify({'error': str(e)}), 500
 
 # API для глобального поиска
+# Размер страницы результатов поиска (?limit=&offset=)
+SEARCH_PAGE_SIZE = 50
+SEARCH_PAGE_MAX = 200
+
 @app.route('/api/search/tasks', methods=['GET'])
+@conditional_get('tasks', 'projects')
 def search_tasks():
     query = request.args.get('q', '')
     if not query:
         return jsonify([])
-    tasks = db.search_tasks(query)
-    return jsonify([{
+    limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_PAGE_MAX)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    tasks = db.search_tasks(query, limit=limit, offset=offset)
+    # Результаты содержат все поля задачи - клиенту не нужно догружать задачи проекта
+    response = jsonify([{
         'id': t[0],
         'project_id': t[1],
         'title': t[2],
         'description': t[3] or '',
         'completed': bool(t[4]),
-        'project_name': t[5]
+        'project_name': t[5],
+        'created_at': t[6] or '',
+        'completed_at': t[7] or '',
+        'deadline': t[8] or '',
+        'started_at': t[9] or '',
+        'price': float(t[10]),
+        'snippet': t[11]
     } for t in tasks])
+    if len(tasks) == limit:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response
+
+# Подсказки при вводе в строку поиска (in-memory индекс, без запросов к базе)
+SUGGEST_LIMIT = 10
+SUGGEST_LIMIT_MAX = 50
+
+@app.route('/api/search/suggest', methods=['GET'])
+@conditional_get('projects', 'tasks', 'daily_notes', 'calendar_events')
+def search_suggest():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', SUGGEST_LIMIT, type=int), 1), SUGGEST_LIMIT_MAX)
+    return jsonify(db.suggest(query, limit))
+
 
-# API для паролей
 @app.route('/api/projects/<project_id>/passwords', methods=['GET'])
+@conditional_get('passwords', 'projects')
 def get_passwords(project_id):
     try:
         # Парсим project_id (может быть отрицательным)
@@ -361,8 +581,7 @@ def get_passwords(project_id):
         
         # Если project_id = 0 или -1, возвращаем все пароли из всех проектов
         if project_id_int == 0 or project_id_int == -1:
-            passwords = db.get_all_passwords()
-            return jsonify([{
+            return stream_json_array(db.iter_all_passwords(), lambda p: {
                 'id': p[0],
                 'name': p[1],
                 'type': p[2] or 'website',
@@ -372,7 +591,7 @@ def get_passwords(project_id):
                 'notes': p[6] or '',
                 'project_id': p[7] if len(p) > 7 else None,
                 'project_name': p[8] if len(p) > 8 else None
-            } for p in passwords])
+            })
         elif project_id_int < 1:
             # Для других отрицательных ID возвращаем пустой список
             return jsonify([])
@@ -412,6 +631,7 @@ def create_password(project_id):
     return jsonify({'id': password_id}), 201
 
 @app.route('/api/passwords/<int:password_id>', methods=['GET'])
+@conditional_get('passwords', 'projects')
 def get_password(password_id):
     try:
         password = db.get_password(password_id)
@@ -453,57 +673,97 @@ def delete_password(password_id):
     return jsonify({'success': True}), 200
 
 # API для статистики
-@app.route('/api/statistics', methods=['GET'])
-def get_statistics():
+STATS_MAX_PERIODS = 5000  # защита от запроса посуточной статистики за столетия
+
+def stats_series(date_from, date_to, granularity):
+    """Непрерывный ряд периодов и данные по ним: (ключи периодов, {ключ: [количество, часы]})"""
+    from database import stats_period_keys
+    
+    totals = {key: [0, 0.0] for key in stats_period_keys(date_from, date_to, granularity)}
+    for period, _, _, count, hours in db.query_task_stats(date_from, date_to, granularity):
+        totals[period] = [count, hours]
+    return list(totals), totals
+
+@app.route('/api/statistics/query', methods=['GET'])
+@conditional_get('daily_task_stats', 'projects')
+def query_statistics():
+    """Статистика за произвольный период: from, to (YYYY-MM-DD), granularity
+    (day/week/month/year) и group_by (project/subscription, по умолчанию без разреза).
+    Ответ в колонках: список периодов и ряды значений по каждой группе."""
+    from datetime import date, timedelta
+    from database import STATS_GROUP_SQL, STATS_PERIOD_SQL, stats_period_keys
+    
+    granularity = request.args.get('granularity', 'day')
+    group_by = request.args.get('group_by') or None
+    if granularity not in STATS_PERIOD_SQL:
+        return jsonify({'error': 'granularity должен быть одним из: ' + ', '.join(STATS_PERIOD_SQL)}), 400
+    if group_by not in STATS_GROUP_SQL:
+        return jsonify({'error': 'group_by должен быть project или subscription'}), 400
     try:
-        from datetime import datetime, date
-        
-        today = date.today().isoformat()
-        
-        # Получаем все задачи
-        all_tasks = db.get_all_tasks(include_completed=True)
-        
-        # Подсчитываем выполненные задачи за сегодня
-        completed_today = 0
-        remaining_tasks = 0
-        total_pomodoro_minutes = 0
-        
-        for task in all_tasks:
-            task_id = task[0]
-            completed = bool(task[3])
-            completed_at = task[5] if len(task) > 5 else None
-            started_at = task[7] if len(task) > 7 else None
-            
-            # Проверяем, выполнена ли задача сегодня
-            if completed and completed_at:
-                completed_date = completed_at.split('T')[0] if 'T' in completed_at else completed_at.split(' ')[0]
-                if completed_date == today:
-                    completed_today += 1
-                    
-                    # Подсчитываем время работы (помидоро)
-                    if started_at:
-                        try:
-                            start_time = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                            end_time = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
-                            # Проверяем, что задача была начата сегодня
-                            if start_time.date().isoformat() == today:
-                                duration = (end_time - start_time).total_seconds() / 60  # в минутах
-                                total_pomodoro_minutes += duration
-                        except:
-                            pass
-            
-            # Подсчитываем оставшиеся задачи
-            if not completed:
-                remaining_tasks += 1
-        
-        # Конвертируем минуты в часы (помидоро = 25 минут)
-        pomodoro_hours = total_pomodoro_minutes / 60
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else date_to - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'from и to должны быть датами в формате YYYY-MM-DD'}), 400
+    if date_from > date_to:
+        return jsonify({'error': 'from не может быть позже to'}), 400
+    
+    periods = stats_period_keys(date_from, date_to, granularity)
+    if len(periods) > STATS_MAX_PERIODS:
+        return jsonify({'error': f'Слишком много периодов (больше {STATS_MAX_PERIODS}), укрупните granularity'}), 400
+    
+    try:
+        position = {period: i for i, period in enumerate(periods)}
+        series = {}
+        for period, group_key, group_name, count, hours in db.query_task_stats(date_from, date_to, granularity, group_by):
+            item = series.get(group_key)
+            if item is None:
+                item = series[group_key] = {
+                    'key': group_key,
+                    'name': group_name,
+                    'completed': [0] * len(periods),
+                    'hours': [0] * len(periods),
+                }
+            item['completed'][position[period]] = count
+            item['hours'][position[period]] = round(hours, 2)
         
         return jsonify({
-            'completed_today': completed_today,
-            'remaining_tasks': remaining_tasks,
-            'pomodoro_hours': round(pomodoro_hours, 1)
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'granularity': granularity,
+            'group_by': group_by,
+            'periods': periods,
+            'series': list(series.values()),
+            'total_completed': sum(sum(item['completed']) for item in series.values()),
+            'total_hours': round(sum(sum(item['hours']) for item in series.values()), 1)
         })
+    except Exception as e:
+        print(f"Ошибка запроса статистики: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def today_statistics():
+    """Сводка за сегодня для проекта «Все задачи»"""
+    from datetime import date
+    
+    today = date.today()
+    
+    # Выполненные задачи и отработанное время за сегодня - одна строка сводки
+    _, totals = stats_series(today, today, 'day')
+    completed_today, pomodoro_hours = totals[today.isoformat()]
+    
+    # Подсчитываем оставшиеся задачи
+    remaining_tasks = db.count_open_tasks()
+    
+    return {
+        'completed_today': completed_today,
+        'remaining_tasks': remaining_tasks,
+        'pomodoro_hours': round(pomodoro_hours, 1)
+    }
+
+@app.route('/api/statistics', methods=['GET'])
+@conditional_get('daily_task_stats', 'tasks')
+def get_statistics():
+    try:
+        return jsonify(today_statistics())
     except Exception as e:
         print(f"Ошибка получения статистики: {e}")
         import traceback
@@ -516,68 +776,19 @@ def get_statistics():
 
 # API для детальной статистики
 @app.route('/api/statistics/detailed', methods=['GET'])
+@conditional_get('daily_task_stats')
 def get_detailed_statistics():
     try:
-        from datetime import datetime, date, timedelta
+        from datetime import date, timedelta
         
-        # Получаем все задачи
-        all_tasks = db.get_all_tasks(include_completed=True)
-        
-        # Подсчитываем статистику за последние 30 дней
+        # Статистика за последние 30 дней
         today = date.today()
-        completed_by_day = {}
-        pomodoro_by_day = {}
-        
-        for task in all_tasks:
-            completed = bool(task[3])
-            completed_at = task[5] if len(task) > 5 else None
-            started_at = task[7] if len(task) > 7 else None
-            
-            if completed and completed_at:
-                try:
-                    completed_date = completed_at.split('T')[0] if 'T' in completed_at else completed_at.split(' ')[0]
-                    task_date = datetime.strptime(completed_date, '%Y-%m-%d').date()
-                    
-                    # Только за последние 30 дней
-                    if (today - task_date).days <= 30:
-                        if task_date not in completed_by_day:
-                            completed_by_day[task_date] = 0
-                        completed_by_day[task_date] += 1
-                        
-                        # Подсчитываем время работы
-                        if started_at:
-                            try:
-                                start_time = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                                end_time = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
-                                if start_time.date() == task_date:
-                                    duration = (end_time - start_time).total_seconds() / 3600  # в часах
-                                    if task_date not in pomodoro_by_day:
-                                        pomodoro_by_day[task_date] = 0
-                                    pomodoro_by_day[task_date] += duration
-                            except:
-                                pass
-                except:
-                    pass
-        
-        # Формируем данные за последние 30 дней
-        completed_list = []
-        pomodoro_list = []
-        total_completed = 0
-        total_pomodoro = 0
-        
-        for i in range(30):
-            day = today - timedelta(days=i)
-            day_str = day.isoformat()
-            count = completed_by_day.get(day, 0)
-            hours = pomodoro_by_day.get(day, 0)
-            
-            completed_list.append({'date': day_str, 'count': count})
-            pomodoro_list.append({'date': day_str, 'hours': round(hours, 1)})
-            total_completed += count
-            total_pomodoro += hours
+        days, totals = stats_series(today - timedelta(days=29), today, 'day')
         
-        completed_list.reverse()
-        pomodoro_list.reverse()
+        completed_list = [{'date': day, 'count': totals[day][0]} for day in days]
+        pomodoro_list = [{'date': day, 'hours': round(totals[day][1], 1)} for day in days]
+        total_completed = sum(count for count, _ in totals.values())
+        total_pomodoro = sum(hours for _, hours in totals.values())
         
         return jsonify({
             'completed_by_day': completed_list,
@@ -600,176 +811,57 @@ def get_detailed_statistics():
 
 # API для статистики по типам
 @app.route('/api/statistics/<stats_type>', methods=['GET'])
+@conditional_get('daily_task_stats', 'tasks', 'projects')
 def get_statistics_by_type(stats_type):
     try:
-        from datetime import datetime, date, timedelta
+        from datetime import date, timedelta
         
-        # Получаем все задачи
-        all_tasks = db.get_all_tasks(include_completed=True)
+        today = date.today()
         
         if stats_type == 'dailyStats':
-            # Ежедневная статистика (последние 30 дней)
-            return get_detailed_statistics()
+            # Ежедневная статистика (последние 30 дней); ETag уже проверен этим маршрутом
+            return get_detailed_statistics.__wrapped__()
         
-        elif stats_type == 'weeklyStats':
-            # Недельная статистика (последние 12 недель)
-            today = date.today()
-            completed_by_week = {}
-            pomodoro_by_week = {}
-            
-            for task in all_tasks:
-                completed = bool(task[3])
-                completed_at = task[5] if len(task) > 5 else None
-                started_at = task[7] if len(task) > 7 else None
-                
-                if completed and completed_at:
-                    try:
-                        completed_date = completed_at.split('T')[0] if 'T' in completed_at else completed_at.split(' ')[0]
-                        task_date = datetime.strptime(completed_date, '%Y-%m-%d').date()
-                        
-                        # Определяем неделю (год, номер недели)
-                        week_key = f"{task_date.year}-W{task_date.isocalendar()[1]}"
-                        
-                        if week_key not in completed_by_week:
-                            completed_by_week[week_key] = 0
-                        completed_by_week[week_key] += 1
-                        
-                        # Подсчитываем время работы
-                        if started_at:
-                            try:
-                                start_time = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                                end_time = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
-                                duration = (end_time - start_time).total_seconds() / 3600  # в часах
-                                if week_key not in pomodoro_by_week:
-                                    pomodoro_by_week[week_key] = 0
-                                pomodoro_by_week[week_key] += duration
-                            except:
-                                pass
-                    except:
-                        pass
-            
-            # Формируем данные за последние 12 недель
-            weekly_list = []
-            total_completed = 0
-            total_pomodoro = 0
+        elif stats_type in ('weeklyStats', 'monthlyStats'):
+            # Последние 12 недель (начиная с понедельника) или 12 календарных месяцев
+            if stats_type == 'weeklyStats':
+                granularity, key_name, unit = 'week', 'week', 'per_week'
+                date_from = today - timedelta(days=today.weekday(), weeks=11)
+            else:
+                granularity, key_name, unit = 'month', 'month', 'per_month'
+                month_index = today.year * 12 + today.month - 1 - 11
+                date_from = date(month_index // 12, month_index % 12 + 1, 1)
             
-            for i in range(12):
-                week_date = today - timedelta(weeks=i)
-                week_key = f"{week_date.year}-W{week_date.isocalendar()[1]}"
-                count = completed_by_week.get(week_key, 0)
-                hours = pomodoro_by_week.get(week_key, 0)
-                
-                weekly_list.append({'week': week_key, 'count': count, 'hours': round(hours, 1)})
-                total_completed += count
-                total_pomodoro += hours
+            periods, totals = stats_series(date_from, today, granularity)
+            period_list = []
+            for period in periods:
+                count, hours = totals[period]
+                if granularity == 'week':
+                    # Подпись недели: ISO-год и номер недели
+                    iso = date.fromisoformat(period).isocalendar()
+                    period = f"{iso[0]}-W{iso[1]}"
+                period_list.append({key_name: period, 'count': count, 'hours': round(hours, 1)})
             
-            weekly_list.reverse()
+            total_completed = sum(count for count, _ in totals.values())
+            total_pomodoro = sum(hours for _, hours in totals.values())
             
             return jsonify({
-                'completed_by_week': weekly_list,
-                'pomodoro_by_week': weekly_list,
+                f'completed_by_{key_name}': period_list,
+                f'pomodoro_by_{key_name}': period_list,
                 'total_completed': total_completed,
                 'total_pomodoro_hours': round(total_pomodoro, 1),
-                'avg_per_week': round(total_completed / 12, 1) if total_completed > 0 else 0
-            })
-        
-        elif stats_type == 'monthlyStats':
-            # Месячная статистика (последние 12 месяцев)
-            today = date.today()
-            completed_by_month = {}
-            pomodoro_by_month = {}
-            
-            for task in all_tasks:
-                completed = bool(task[3])
-                completed_at = task[5] if len(task) > 5 else None
-                started_at = task[7] if len(task) > 7 else None
-                
-                if completed and completed_at:
-                    try:
-                        completed_date = completed_at.split('T')[0] if 'T' in completed_at else completed_at.split(' ')[0]
-                        task_date = datetime.strptime(completed_date, '%Y-%m-%d').date()
-                        
-                        # Определяем месяц (год-месяц)
-                        month_key = f"{task_date.year}-{task_date.month:02d}"
-                        
-                        if month_key not in completed_by_month:
-                            completed_by_month[month_key] = 0
-                        completed_by_month[month_key] += 1
-                        
-                        # Подсчитываем время работы
-                        if started_at:
-                            try:
-                                start_time = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                                end_time = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
-                                duration = (end_time - start_time).total_seconds() / 3600  # в часах
-                                if month_key not in pomodoro_by_month:
-                                    pomodoro_by_month[month_key] = 0
-                                pomodoro_by_month[month_key] += duration
-                            except:
-                                pass
-                    except:
-                        pass
-            
-            # Формируем данные за последние 12 месяцев
-            monthly_list = []
-            total_completed = 0
-            total_pomodoro = 0
-            
-            for i in range(12):
-                month_date = today - timedelta(days=30*i)
-                month_key = f"{month_date.year}-{month_date.month:02d}"
-                count = completed_by_month.get(month_key, 0)
-                hours = pomodoro_by_month.get(month_key, 0)
-                
-                monthly_list.append({'month': month_key, 'count': count, 'hours': round(hours, 1)})
-                total_completed += count
-                total_pomodoro += hours
-            
-            monthly_list.reverse()
-            
-            return jsonify({
-                'completed_by_month': monthly_list,
-                'pomodoro_by_month': monthly_list,
-                'total_completed': total_completed,
-                'total_pomodoro_hours': round(total_pomodoro, 1),
-                'avg_per_month': round(total_completed / 12, 1) if total_completed > 0 else 0
+                f'avg_{unit}': round(total_completed / 12, 1) if total_completed > 0 else 0
             })
         
         elif stats_type == 'projectStats':
             # Статистика по проектам
-            from collections import defaultdict
-            
-            project_stats = defaultdict(lambda: {'completed': 0, 'total': 0, 'pomodoro_hours': 0})
-            
-            for task in all_tasks:
-                project_id = task[9] if len(task) > 9 else None
-                project_name = task[10] if len(task) > 10 else 'Без проекта'
-                completed = bool(task[3])
-                completed_at = task[5] if len(task) > 5 else None
-                started_at = task[7] if len(task) > 7 else None
-                
-                if project_id:
-                    project_stats[project_name]['total'] += 1
-                    if completed:
-                        project_stats[project_name]['completed'] += 1
-                        
-                        # Подсчитываем время работы
-                        if started_at and completed_at:
-                            try:
-                                start_time = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                                end_time = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
-                                duration = (end_time - start_time).total_seconds() / 3600  # в часах
-                                project_stats[project_name]['pomodoro_hours'] += duration
-                            except:
-                                pass
-            
             project_list = []
-            for project_name, stats in project_stats.items():
+            for project_id, project_name, completed, total, hours in db.get_task_stats_by_project():
                 project_list.append({
                     'project': project_name,
-                    'completed': stats['completed'],
-                    'total': stats['total'],
-                    'pomodoro_hours': round(stats['pomodoro_hours'], 1)
+                    'completed': completed,
+                    'total': total,
+                    'pomodoro_hours': round(hours, 1)
                 })
             
             # Сортируем по количеству выполненных задач
@@ -790,11 +882,11 @@ def get_statistics_by_type(stats_type):
 
 # API для календаря
 @app.route('/api/calendar/events', methods=['GET'])
+@conditional_get('calendar_events')
 def get_calendar_events():
     date = request.args.get('date')
     try:
-        events = db.get_calendar_events(date=date)
-        return jsonify([{
+        return stream_json_array(db.iter_calendar_events(date=date), lambda e: {
             'id': e[0],
             'title': e[1],
             'description': e[2] or '',
@@ -802,7 +894,7 @@ def get_calendar_events():
             'event_time': e[4] or '',
             'created_at': e[5],
             'updated_at': e[6]
-        } for e in events])
+        })
     except Exception as e:
         print(f"Ошибка получения событий календаря: {e}")
         return jsonify({'error': str(e)}), 500
@@ -848,42 +940,259 @@ def delete_calendar_event(event_id):
         return jsonify({'error': str(e)}), 500
 
 # API для синхронизации помидорного таймера
+POMODORO_STATES = ('idle', 'work', 'break', 'paused')
+
+def pomodoro_state():
+    """Состояние помидоро из базы; оставшееся время идущего таймера выводится из момента старта"""
+    state, time_left, work_count, started_at = db.get_pomodoro()
+    result = {
+        'timeLeft': time_left,
+        'state': state,
+        'workCount': work_count
+    }
+    if started_at is not None and state != 'idle':
+        result['startTime'] = int(started_at * 1000)
+    return result
+
 @app.route('/api/pomodoro/state', methods=['GET'])
 def get_pomodoro_state():
     """Получить текущее состояние помидорного таймера"""
     try:
-        import time
-        state = getattr(app, 'pomodoro_state', None)
-        if state:
-            # Проверяем, не истекло ли время
-            if 'startTime' in state:
-                current_time = int(time.time() * 1000)
-                elapsed = (current_time - state['startTime']) / 1000
-                state['timeLeft'] = max(0, state.get('timeLeft', 0) - int(elapsed))
-        return jsonify(state or {
-            'timeLeft': 25 * 60,
-            'state': 'idle',
-            'workCount': 0
-        })
+        return jsonify(pomodoro_state())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pomodoro/state', methods=['POST'])
 def save_pomodoro_state():
-    """Сохранить состояние помидорного таймера"""
+    """Сохранить состояние помидорного таймера (общее для всех процессов и устройств)"""
     try:
-        import time
-        data = request.json
-        # Сохраняем состояние в памяти приложения (можно добавить в БД)
-        app.pomodoro_state = {
-            'timeLeft': data.get('timeLeft', 25 * 60),
-            'state': data.get('state', 'idle'),
-            'workCount': data.get('workCount', 0),
-            'startTime': data.get('startTime', int(time.time() * 1000))
+        data = request.get_json(silent=True) or {}
+        state = data.get('state', 'idle')
+        time_left = data.get('timeLeft', 25 * 60)
+        work_count = data.get('workCount', 0)
+        if (state not in POMODORO_STATES or not isinstance(time_left, int) or time_left < 0
+                or not isinstance(work_count, int) or work_count < 0):
+            return jsonify({'error': 'Некорректное состояние помидоро'}), 400
+        # Клиентам его разошлет наблюдатель /api/events, если состояние действительно изменилось
+        db.save_pomodoro(state, time_left, work_count)
+        return jsonify({'success': True, 'state': pomodoro_state()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/pomodoro/sessions', methods=['GET'])
+def get_pomodoro_sessions():
+    """История сессий помидоро, новые первыми (?limit=)"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    try:
+        return jsonify([{
+            'id': s[0],
+            'kind': s[1],
+            'started_at': s[2],
+            'ended_at': s[3],
+            'completed': bool(s[4])
+        } for s in db.get_pomodoro_sessions(limit)])
+    except Exception as e:
+        print(f"Ошибка получения истории помидоро: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Серверные события (SSE): состояние помидоро, изменения данных и версия приложения
+event_broker = events.EventBroker()
+
+def watch_data_changes():
+    """Наблюдатель журнала sync_log: замечает изменения, сделанные любым процессом
+    сервера, и сообщает клиентам, какие таблицы перечитать"""
+    cursor = None
+    
+    def check():
+        nonlocal cursor
+        if cursor is None:
+            cursor = db.get_sync_cursor()
+            return
+        new_cursor, entities = db.get_changed_entities(cursor)
+        if entities:
+            event_broker.publish('changes', {'cursor': new_cursor, 'entities': entities})
+        cursor = new_cursor
+    return check
+
+event_broker.watch(watch_data_changes())
+
+def watch_pomodoro():
+    """Наблюдатель помидоро: состояние хранится в базе, поэтому смену, записанную
+    любым процессом, видно по счетчику изменений pomodoro_state"""
+    version = None
+    
+    def check():
+        nonlocal version
+        new_version, = db.get_data_versions(['pomodoro_state'])
+        if version is not None and new_version != version:
+            event_broker.publish('pomodoro', pomodoro_state())
+        version = new_version
+    return check
+
+event_broker.watch(watch_pomodoro())
+
+@app.route('/api/events', methods=['GET'])
+def server_events():
+    """Поток событий text/event-stream. Первым приходит hello с версией приложения,
+    позицией журнала изменений и состоянием помидоро - клиент сверяет их со своими"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        hello = {'version': APP_VERSION, 'syncCursor': db.get_sync_cursor(), 'pomodoro': pomodoro_state()}
+    except Exception as e:
+        print(f"Ошибка подключения к событиям: {e}")
+        return jsonify({'error': str(e)}), 500
+    response = Response(event_broker.stream(last_event_id, hello), mimetype='text/event-stream')
+    # no-transform: поток не сжимается (compression.py) и не буферизуется прокси
+    response.headers['Cache-Control'] = 'no-cache, no-transform'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Стартовые данные клиента
+def build_bootstrap(project_id, include_completed=False):
+    """Все, что клиент запрашивает при открытии проекта project_id: проекты, первая
+    страница задач, состояние панели, заметки проекта или статистика "Все задачи",
+    состояние помидоро. Читается одним соединением и одной транзакцией"""
+    with db.connection() as conn:
+        # Явная транзакция - все части ответа читаются из одного снимка базы
+        # (внутри пакета /api/batch транзакция уже открыта)
+        if not conn.in_transaction:
+            conn.execute('BEGIN')
+        projects = [project_to_dict(p) for p in db.get_projects_with_stats()]
+        bootstrap = {
+            'projectId': project_id,
+            'projects': projects,
+            'uiState': {'projects_panel_collapsed': str(db.get_ui_state('projects_panel_collapsed', '0'))},
+            'pomodoro': pomodoro_state(),
+            # Позиция журнала изменений на момент снимка: дальше клиент догоняет через /api/sync
+            'syncCursor': db.get_sync_cursor(),
         }
-        return jsonify({'success': True, 'state': app.pomodoro_state})
+        if project_id >= 0:
+            serialize = all_task_to_dict if project_id == 0 else task_to_dict
+            tasks, next_cursor = db.get_tasks_page(project_id, TASKS_PAGE_SIZE, None, include_completed)
+            bootstrap['tasks'] = {
+                'includeCompleted': include_completed,
+                'items': [serialize(t) for t in tasks],
+                'nextCursor': next_cursor,
+            }
+        if project_id == 0:
+            bootstrap['statistics'] = today_statistics()
+        elif project_id > 0:
+            note = db.get_note(project_id)
+            bootstrap['notes'] = {'content': note[1] or '' if note else ''}
+    return bootstrap
+
+@app.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    try:
+        project_id = request.args.get('project', 0, type=int)
+        include_completed = request.args.get('include_completed', 'false').lower() == 'true'
+        return jsonify(build_bootstrap(project_id, include_completed))
+    except Exception as e:
+        print(f"Ошибка сборки стартовых данных: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Дельта-синхронизация: изменения после позиции журнала (?since=&limit=)
+SYNC_PAGE_SIZE = 1000
+SYNC_PAGE_MAX = 5000
+
+@app.route('/api/sync', methods=['GET'])
+def get_sync():
+    """Строки, измененные после since, и id удаленных (надгробия). Клиент повторяет
+    запрос с полученным cursor, пока more = true"""
+    since = max(request.args.get('since', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', SYNC_PAGE_SIZE, type=int), 1), SYNC_PAGE_MAX)
+    try:
+        cursor, more, changed, deleted = db.get_changes(since, limit)
+        return jsonify({
+            'cursor': cursor,
+            'more': more,
+            'changes': {entity: [dict(zip(SYNC_COLUMNS[entity], row)) for row in rows]
+                        for entity, rows in changed.items()},
+            'deleted': deleted,
+        })
+    except Exception as e:
+        print(f"Ошибка синхронизации: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Пакет операций: несколько запросов к API одним HTTP-запросом и одной транзакцией
+BATCH_MAX_OPERATIONS = 100
+
+class BatchOperationFailed(Exception):
+    """Операция пакета завершилась ошибкой - транзакция пакета откатывается"""
+    
+    def __init__(self, index, result):
+        super().__init__(index)
+        self.index = index
+        self.result = result
+
+def run_batch_operation(operation):
+    """Выполнить операцию {'method', 'path', 'body'} представлением соответствующего маршрута.
+    Возвращает {'status': код ответа, 'body': JSON ответа}"""
+    method = str(operation.get('method') or 'GET').upper()
+    path = str(operation.get('path') or '')
+    if not path.startswith('/'):
+        path = '/' + path
+    with app.test_request_context(path, method=method, json=operation.get('body')):
+        if request.routing_exception is not None:
+            # 404/405, а также перенаправления (путь без завершающего "/") - ошибка операции
+            error = request.routing_exception
+            status = error.code if error.code >= 400 else 400
+            return {'status': status, 'body': {'error': f'{method} {path}: {error.description}'}}
+        endpoint = request.url_rule.endpoint
+        # Поток событий бесконечен, вложенный пакет - отдельная транзакция
+        if endpoint in ('run_batch', 'server_events') or not request.path.startswith('/api/'):
+            return {'status': 400, 'body': {'error': f'Операция недоступна в пакете: {method} {path}'}}
+        try:
+            response = app.make_response(app.view_functions[endpoint](**request.view_args))
+            # Потоковые ответы читаются здесь же - пока открыта транзакция пакета
+            return {'status': response.status_code, 'body': response.get_json(silent=True)}
+        except HTTPException as e:
+            return {'status': e.code, 'body': {'error': e.description}}
+        except Exception as e:
+            print(f"Ошибка операции пакета {method} {path}: {e}")
+            return {'status': 500, 'body': {'error': str(e)}}
+
+@app.route('/api/batch', methods=['POST'])
+def run_batch():
+    """Выполнить операции по порядку в одной транзакции с одной фиксацией.
+    
+    Тело: {"operations": [{"method": "PUT", "path": "/api/tasks/1", "body": {...}}, ...]}.
+    Ответ: {"results": [{"status": 200, "body": {...}}, ...]} в порядке операций.
+    Если операция вернула ошибку, изменения всех операций пакета откатываются, а ответ
+    получает ее код и номер (failed).
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+        return jsonify({'error': 'operations: ожидается список операций'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'Не больше {BATCH_MAX_OPERATIONS} операций в пакете'}), 400
+    
+    def run_operations():
+        results = []
+        for index, operation in enumerate(operations):
+            result = run_batch_operation(operation)
+            if result['status'] < 400 and db.transaction_failed():
+                # Представление перехватило ошибку базы и ответило запасным значением
+                result = {'status': 500, 'body': {'error': 'Ошибка базы данных при выполнении операции'}}
+            if result['status'] >= 400:
+                raise BatchOperationFailed(index, result)
+            results.append(result)
+        return results
+    
+    try:
+        # Весь пакет - одно изменение: при включенном писателе выполняется в его потоке
+        results = db.run_write(run_operations)
+    except BatchOperationFailed as e:
+        return jsonify({
+            'error': 'Операция пакета не выполнена, изменения отменены',
+            'failed': e.index,
+            'result': e.result
+        }), e.result['status']
     except Exception as e:
+        print(f"Ошибка выполнения пакета: {e}")
         return jsonify({'error': str(e)}), 500
+    return jsonify({'results': results})
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
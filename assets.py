@@ -0,0 +1,148 @@
+"""
+Статические файлы с хэшем содержимого в адресе.
+
+Манифест сопоставляет файлам static (js/*.js, css/*.css) адреса вида
+/assets/js/tasks.<хэш>.js, которые отдаются с Cache-Control: immutable -
+повторные загрузки страницы не перепроверяют ни один модуль. Сами файлы
+не переписываются: модули импортируют друг друга по относительным путям
+(/assets/js/api.js), а import map на странице перенаправляет эти адреса
+на адреса с хэшем. Для модулей, достижимых статическими import от точек
+входа, страница выдает <link rel="modulepreload">, и браузер запрашивает
+весь граф параллельно, а не каскадом по мере разбора import.
+
+Модули намеренно не склеиваются в один файл: первая загрузка делает около
+20 параллельных запросов, зато изменение одного модуля меняет адрес только
+у него, остальные остаются в кэше браузера, а для развертывания не нужен
+сборщик. Повторные загрузки страницы не делают ни одного запроса за модулями.
+
+Манифест строится при запуске (init_app) и пересобирается после fork воркера
+(serve.py), при отрисовке страницы - только в режиме отладки, когда файлы
+правят на ходу: обход static с проверкой mtime не нужен на каждом запросе.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import threading
+
+from flask import abort
+
+from compression import send_static
+
+URL_PREFIX = '/assets'
+
+ASSET_EXTENSIONS = ('.js', '.css')
+
+# Статический import/export ... from './x.js'. Динамический import() не учитывается:
+# такие модули грузятся по требованию и предзагружать их не нужно
+IMPORT_RE = re.compile(r'''^\s*(?:import|export)\s+(?:[\w*\s{},$]*?\s*from\s*)?['"](\.{1,2}/[^'"]+)['"]''',
+                       re.MULTILINE)
+
+
+def _hashed_name(filename, digest):
+    root, ext = posixpath.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+class AssetManifest:
+    """Манифест: файл static -> имя с хэшем содержимого и статические import модуля"""
+    
+    def __init__(self, folder, url_prefix=URL_PREFIX):
+        self.folder = folder
+        self.url_prefix = url_prefix
+        self._entries = {}  # файл -> {'mtime', 'hashed', 'imports'}
+        self._files = {}  # имя с хэшем -> файл
+        self._lock = threading.Lock()
+    
+    def refresh(self):
+        """Пересчитать хэши измененных файлов (по mtime). Возвращает число файлов в манифесте"""
+        entries = {}
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if not name.endswith(ASSET_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                entry = self._entries.get(filename)
+                if entry is None or entry['mtime'] != mtime:
+                    entry = self._build_entry(filename, path, mtime)
+                entries[filename] = entry
+        with self._lock:
+            self._entries = entries
+            self._files = {entry['hashed']: filename for filename, entry in entries.items()}
+        return len(entries)
+    
+    def _build_entry(self, filename, path, mtime):
+        with open(path, 'rb') as f:
+            data = f.read()
+        imports = []
+        if filename.endswith('.js'):
+            base = posixpath.dirname(filename)
+            for spec in IMPORT_RE.findall(data.decode('utf-8', errors='replace')):
+                imports.append(posixpath.normpath(posixpath.join(base, spec)))
+        return {
+            'mtime': mtime,
+            'hashed': _hashed_name(filename, hashlib.sha256(data).hexdigest()[:12]),
+            'imports': imports,
+        }
+    
+    def __contains__(self, filename):
+        return filename in self._entries
+    
+    def resolve(self, hashed):
+        """Файл static по имени с хэшем или None, если хэш устарел"""
+        return self._files.get(hashed)
+    
+    def url(self, filename):
+        """Адрес файла с хэшем; для файлов вне манифеста - обычный адрес в /assets"""
+        entry = self._entries.get(filename)
+        return f"{self.url_prefix}/{entry['hashed'] if entry else filename}"
+    
+    def import_map(self):
+        """Import map: адрес модуля без хэша -> адрес с хэшем"""
+        return {'imports': {f'{self.url_prefix}/{filename}': self.url(filename)
+                            for filename in sorted(self._entries) if filename.endswith('.js')}}
+    
+    def preload(self, entry_points):
+        """Адреса с хэшем всех модулей, статически достижимых от точек входа, в порядке обхода"""
+        entries = self._entries
+        seen = []
+        stack = list(reversed(entry_points))
+        while stack:
+            filename = stack.pop()
+            if filename in seen or filename not in entries:
+                continue
+            seen.append(filename)
+            stack.extend(reversed(entries[filename]['imports']))
+        return [self.url(filename) for filename in seen]
+
+
+def init_app(app):
+    """Подключить манифест к приложению: маршрут /assets и переменная assets в шаблонах.
+    Требует compression.init_app (отдача сжатой статики)"""
+    manifest = AssetManifest(app.static_folder)
+    manifest.refresh()
+    app.extensions['assets'] = manifest
+    
+    def serve_asset(filename):
+        source = manifest.resolve(filename)
+        if source is not None:
+            return send_static(source, immutable=True)
+        if filename in manifest or not filename.endswith(ASSET_EXTENSIONS):
+            # Адрес без хэша: браузеры без поддержки import map, картинки из CSS
+            return send_static(filename)
+        abort(404)
+    
+    app.add_url_rule(f'{URL_PREFIX}/<path:filename>', 'assets', serve_asset)
+    
+    @app.context_processor
+    def inject_assets():
+        if app.debug:
+            manifest.refresh()
+        return {'assets': manifest}
+    
+    return manifest
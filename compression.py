@@ -0,0 +1,281 @@
+"""
+Сжатие HTTP-ответов и распаковка сжатых тел запросов.
+
+- JSON и текстовые ответы больше порога сжимаются по Accept-Encoding
+  (brotli, если установлен пакет brotli, иначе gzip/deflate); потоковые
+  ответы сжимаются на лету, порциями.
+- Статические файлы сжимаются один раз при старте (и при изменении файла)
+  с максимальной степенью и отдаются из кэша.
+- Тела запросов с Content-Encoding: gzip/deflate распаковываются WSGI-прослойкой
+  до того, как их прочитает Flask.
+"""
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import threading
+import zlib
+
+from flask import Response, current_app, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+# Ответы меньше порога не сжимаются: выигрыш меньше накладных расходов
+COMPRESS_MIN_SIZE = 1024
+
+# Срок кэширования файлов с хэшем содержимого в адресе (год - максимум по RFC 9111)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Предел размера распакованного тела запроса (защита от "zip-бомб")
+MAX_REQUEST_BODY = 16 * 1024 * 1024
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/manifest+json',
+    'application/xml', 'image/svg+xml',
+}
+
+# Поддерживаемые кодировки в порядке предпочтения
+ENCODINGS = (['br'] if brotli is not None else []) + ['gzip', 'deflate']
+
+# wbits для zlib: gzip-обертка и zlib-обертка (HTTP "deflate")
+ZLIB_WBITS = {'gzip': 31, 'deflate': 15}
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES)
+
+
+def negotiate():
+    """Лучшая поддерживаемая кодировка из Accept-Encoding текущего запроса или None"""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data, encoding, best=False):
+    """Сжать байты целиком. best - максимальная степень (для статики, сжимаемой один раз)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else 5)
+    compressor = zlib.compressobj(9 if best else 6, zlib.DEFLATED, ZLIB_WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+class _StreamCompressor:
+    """Потоковое сжатие: каждая порция сбрасывается сразу, чтобы клиент получал данные без задержки"""
+    
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=5)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, ZLIB_WBITS[encoding])
+    
+    def compress(self, chunk):
+        if self._brotli is not None:
+            return self._brotli.process(chunk) + self._brotli.flush()
+        return self._zlib.compress(chunk) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self):
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def _compress_stream(chunks, encoding):
+    compressor = _StreamCompressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Закрываем исходный генератор: он может держать соединение из пула
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """after_request: сжать ответ, если клиент это поддерживает и ответ того стоит"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'no-transform' in response.headers.get('Cache-Control', '')
+            or not is_compressible(response.mimetype)):
+        return response
+    if not response.is_streamed and (response.content_length or 0) < COMPRESS_MIN_SIZE:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class StaticCache:
+    """Заранее сжатые варианты статических файлов: путь -> {кодировка: байты}"""
+    
+    def __init__(self, folder, encodings=None):
+        self.folder = folder
+        self.encodings = list(encodings or ENCODINGS)
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def precompress(self):
+        """Сжать все подходящие файлы папки. Возвращает число файлов в кэше"""
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                self.get(os.path.relpath(os.path.join(root, name), self.folder).replace(os.sep, '/'))
+        return len(self._entries)
+    
+    def get(self, filename):
+        """Запись кэша для файла (сжимается заново, если файл изменился) или None,
+        если файл не сжимается"""
+        path = safe_join(self.folder, filename)
+        if path is None:
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        entry = self._entries.get(filename)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry
+        
+        mimetype = mimetypes.guess_type(filename)[0]
+        if not is_compressible(mimetype):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return None
+        entry = {
+            'mtime': mtime,
+            'mimetype': mimetype,
+            'digest': hashlib.sha1(data).hexdigest()[:16],
+            'variants': {encoding: compress(data, encoding, best=True) for encoding in self.encodings},
+        }
+        with self._lock:
+            self._entries[filename] = entry
+        return entry
+
+
+def send_static(filename, immutable=False):
+    """Отдать файл из static: сжатый вариант из кэша, если клиент его принимает,
+    иначе стандартной отдачей Flask. immutable - адрес файла содержит хэш
+    содержимого, поэтому клиент может кэшировать его без перепроверки."""
+    app = current_app
+    encoding = negotiate()
+    entry = app.extensions['compression'].get(filename) if encoding else None
+    if entry is None:
+        response = app.send_static_file(filename)
+    else:
+        response = Response(entry['variants'][encoding], mimetype=entry['mimetype'])
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f"{entry['digest']}-{encoding}")
+        response.last_modified = entry['mtime']
+        response = response.make_conditional(request)
+    
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    elif entry is not None:
+        max_age = app.get_send_file_max_age(filename)
+        if max_age is None:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+    return response
+
+
+class DecompressRequestMiddleware:
+    """WSGI-прослойка: распаковывает тела запросов с Content-Encoding gzip/deflate"""
+    
+    def __init__(self, wsgi_app, max_size=MAX_REQUEST_BODY):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+    
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding in ('', 'identity'):
+            return self.wsgi_app(environ, start_response)
+        if encoding not in ZLIB_WBITS:
+            return self._error(start_response, '415 Unsupported Media Type',
+                               f'Неподдерживаемый Content-Encoding: {encoding}')
+        
+        stream = environ['wsgi.input']
+        length = environ.get('CONTENT_LENGTH')
+        if length:
+            body = stream.read(min(int(length), self.max_size + 1))
+        elif environ.get('wsgi.input_terminated'):
+            body = stream.read(self.max_size + 1)
+        else:
+            return self._error(start_response, '411 Length Required', 'Нужен заголовок Content-Length')
+        
+        try:
+            data = self._decompress(body, encoding)
+        except zlib.error:
+            return self._error(start_response, '400 Bad Request', 'Не удалось распаковать тело запроса')
+        if data is None:
+            return self._error(start_response, '413 Request Entity Too Large', 'Тело запроса слишком большое')
+        
+        environ['wsgi.input'] = io.BytesIO(data)
+        environ['CONTENT_LENGTH'] = str(len(data))
+        environ.pop('HTTP_CONTENT_ENCODING')
+        return self.wsgi_app(environ, start_response)
+    
+    def _decompress(self, body, encoding):
+        """Распакованное тело или None, если оно больше max_size"""
+        if len(body) > self.max_size:
+            return None
+        if encoding == 'deflate':
+            # Часть клиентов шлет "сырой" deflate без zlib-заголовка
+            wbits_options = (15, -15)
+        else:
+            wbits_options = (31,)
+        for i, wbits in enumerate(wbits_options):
+            decompressor = zlib.decompressobj(wbits)
+            try:
+                data = decompressor.decompress(body, self.max_size + 1)
+            except zlib.error:
+                if i + 1 < len(wbits_options):
+                    continue
+                raise
+            if len(data) > self.max_size or decompressor.unconsumed_tail:
+                return None
+            return data
+    
+    @staticmethod
+    def _error(start_response, status, message):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+        return [body]
+
+
+def init_app(app):
+    """Подключить сжатие к приложению Flask. Возвращает кэш сжатой статики"""
+    cache = StaticCache(app.static_folder)
+    cache.precompress()
+    app.extensions['compression'] = cache
+    app.view_functions['static'] = send_static
+    app.after_request(compress_response)
+    app.wsgi_app = DecompressRequestMiddleware(app.wsgi_app)
+    return cache
@@ -1,1036 +1,2089 @@
+import base64
+import bisect
+import functools
+import json
 import sqlite3
 import os
-from datetime import datetime
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 
-class Database:
-    def __init__(self, db_name='planner.db'):
+import analytics
+import migrations
+import ranking
+from suggestions import SuggestionIndex
+
+
+class ConnectionPool:
+    """Пул соединений SQLite ограниченного размера.
+    
+    Соединения создаются лениво и переиспользуются между запросами,
+    поэтому кэш подготовленных выражений (cached_statements) живет
+    вместе с соединением и не теряется после каждого вызова.
+    """
+    
+    def __init__(self, db_name, size=5, statement_cache_size=128, timeout=30.0, read_only=False):
         self.db_name = db_name
-        self.init_database()
+        # Только чтение (PRAGMA query_only): записи идут через WriteQueue
+        self.read_only = read_only
+        # Каждое соединение с ':memory:' - отдельная пустая база, поэтому одно на всех
+        self.size = 1 if db_name == ':memory:' else max(1, size)
+        self.statement_cache_size = statement_cache_size
+        self.timeout = timeout
+        # Настройка каждого нового пишущего соединения (Database задает после миграций)
+        self.on_connect = None
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
     
-    def get_connection(self):
-        return sqlite3.connect(self.db_name)
+    def connect(self, read_only=None):
+        """Открыть новое настроенное соединение (в обход пула). read_only=None - как у пула"""
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.timeout,
+            cached_statements=self.statement_cache_size,
+            check_same_thread=False  # соединение переходит между потоками через пул
+        )
+        # WAL позволяет читать параллельно с записью из других соединений пула
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if read_only is None:
+            read_only = self.read_only
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+        elif self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
     
-    def init_database(self):
-        """Инициализация базы данных и создание таблиц"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Таблица проектов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                monthly_price REAL DEFAULT 0,
-                is_subscription INTEGER DEFAULT 0,
-                payment_date TEXT,
-                sort_order INTEGER DEFAULT 0
-            )
-        ''')
-        
-        # Таблица задач
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT,
-                completed INTEGER DEFAULT 0,
-                created_at TEXT NOT NULL,
-                completed_at TEXT,
-                deadline TEXT,
-                price REAL DEFAULT 0,
-                FOREIGN KEY (project_id) REFERENCES projects (id)
-            )
-        ''')
-        
-        # Добавляем новые колонки если их нет (для существующих БД)
+    def set_on_connect(self, on_connect):
+        """Задать настройку новых пишущих соединений и применить ее к свободным"""
+        self.on_connect = on_connect
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for conn in idle:
+            if not self.read_only:
+                on_connect(conn)
+            self._idle.put(conn)
+    
+    def acquire(self):
         try:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN completed_at TEXT')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
         
-        try:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN deadline TEXT')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
         
-        try:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN started_at TEXT')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
+        if can_create:
+            try:
+                return self.connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
         
+        # Пул исчерпан - ждем, пока другой поток вернет соединение
         try:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN price REAL DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
-        
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError('Пул соединений исчерпан') from None
+    
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+    
+    def reset_after_fork(self, inherited=()):
+        """Начать с пустым пулом в дочернем процессе после fork. Унаследованные
+        соединения не закрываются и не используются: SQLite запрещает переносить
+        соединение через fork, а закрытие в дочернем процессе затронуло бы файлы
+        базы, открытые родителем. Поэтому они (и другие соединения из inherited,
+        открытые до fork) остаются в _inherited до выхода процесса"""
+        inherited = list(inherited)
+        while True:
+            try:
+                inherited.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        self._inherited = getattr(self, '_inherited', []) + inherited
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def close(self):
+        """Закрыть все свободные соединения"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+# Сколько последних диапазонов seq своих записей в sync_log помнит процесс (см. _note_own_writes)
+OWN_WRITES_KEPT = 1024
+
+
+def _track_own_writes(conn):
+    """Записывать seq строк sync_log, добавленных этим соединением, во временную таблицу.
+    Временные таблица и триггер видны только своему соединению, поэтому в own_sync_seq
+    попадают только собственные записи процесса"""
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS own_sync_seq (seq INTEGER NOT NULL)')
+    conn.execute('''
+        CREATE TEMP TRIGGER IF NOT EXISTS own_sync_seq_insert AFTER INSERT ON main.sync_log BEGIN
+            INSERT INTO own_sync_seq (seq) VALUES (new.seq);
+        END
+    ''')
+    conn.commit()
+
+
+def _take_own_writes(conn):
+    """Диапазон (min, max) seq, записанных текущей транзакцией соединения, или None.
+    Вызывается перед фиксацией: транзакция держит блокировку записи, поэтому все seq
+    между min и max - ее собственные"""
+    lo, hi = conn.execute('SELECT MIN(seq), MAX(seq) FROM temp.own_sync_seq').fetchone()
+    if lo is None:
+        return None
+    conn.execute('DELETE FROM temp.own_sync_seq')
+    return lo, hi
+
+
+# Очередь писателя (Database(single_writer=True)): сколько изменений ждет в очереди
+# и сколько фиксируется одной транзакцией
+WRITE_QUEUE_SIZE = 1000
+WRITE_BATCH_SIZE = 100
+
+# Сколько вызывающий поток ждет результата изменения, секунды
+WRITE_TIMEOUT = 120
+
+
+class WriteQueue:
+    """Единственный поток-писатель с групповой фиксацией.
+    
+    Изменения из всех потоков ставятся в ограниченную очередь. Писатель забирает
+    все накопившиеся (не больше batch_size) и выполняет их одной транзакцией,
+    каждое - в своей точке сохранения (SAVEPOINT): ошибка одного изменения
+    откатывает только его. Потоки не соревнуются за блокировку записи SQLite,
+    а фиксация одна на пачку. Результат или исключение возвращаются вызывающему
+    потоку через Future после фиксации и callbacks _on_commit.
+    
+    Каждое изменение пачки получает результат или исключение, даже если пачка
+    прервана. Если поток писателя все же остановился, ожидавшие изменения
+    завершаются ошибкой, а следующий submit запускает писателя заново.
+    """
+    
+    def __init__(self, db, queue_size=WRITE_QUEUE_SIZE, batch_size=WRITE_BATCH_SIZE, timeout=WRITE_TIMEOUT):
+        self.db = db
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.connection = db.pool.connect(read_only=False)
+        self._start()
+    
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+    
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+    
+    def _ensure_running(self):
+        with self._lock:
+            if self._closed:
+                raise sqlite3.OperationalError('Писатель остановлен')
+            if not self._thread.is_alive():
+                # Причину остановки уже вывел threading.excepthook, ожидавшие изменения получили ее
+                self._rollback()
+                self._start()
+    
+    def submit(self, func, *args, **kwargs):
+        """Выполнить func(*args, **kwargs) в потоке писателя и дождаться результата"""
+        self._ensure_running()
+        future = Future()
         try:
-            cursor.execute('ALTER TABLE projects ADD COLUMN monthly_price REAL DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
-        
+            self._queue.put((func, args, kwargs, future), timeout=self.db.pool.timeout)
+        except queue.Full:
+            raise sqlite3.OperationalError('Очередь записи переполнена') from None
         try:
-            cursor.execute('ALTER TABLE projects ADD COLUMN is_subscription INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
-        
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Еще не начатое изменение отменяем, чтобы оно не выполнилось после ошибки
+            if future.cancel():
+                raise sqlite3.OperationalError(
+                    f'Изменение не выполнено: писатель не ответил за {self.timeout} с') from None
+            if future.done():
+                return future.result()
+            raise sqlite3.OperationalError(
+                f'Писатель не ответил за {self.timeout} с, изменение еще выполняется') from None
+    
+    def close(self):
+        """Выполнить уже поставленные изменения и остановить писателя"""
+        with self._lock:
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self.connection.close()
+    
+    def _rollback(self):
         try:
-            cursor.execute('ALTER TABLE projects ADD COLUMN payment_date TEXT')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
-        
+            if self.connection.in_transaction:
+                self.connection.rollback()
+        except sqlite3.Error as e:
+            print(f"Ошибка отката транзакции писателя: {e}")
+    
+    def _take(self, item):
+        """Изменение для пачки или None, если вызывающий уже отменил его по таймауту"""
+        return item if item[3].set_running_or_notify_cancel() else None
+    
+    def _run(self):
         try:
-            cursor.execute('ALTER TABLE projects ADD COLUMN sort_order INTEGER DEFAULT 0')
-            # Устанавливаем порядок для существующих проектов
-            cursor.execute('UPDATE projects SET sort_order = id WHERE sort_order = 0 OR sort_order IS NULL')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
-        
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [self._take(item)]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(self._take(item))
+                batch = [item for item in batch if item is not None]
+                if batch:
+                    self._execute(batch)
+                if stop:
+                    return
+        except BaseException as e:
+            # Писатель остановился: изменения в очереди не должны ждать до таймаута
+            self._fail_pending(e)
+            raise
+    
+    def _fail_pending(self, error):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[3].set_running_or_notify_cancel():
+                item[3].set_exception(error)
+    
+    def _execute(self, batch):
+        db = self.db
+        conn = self.connection
+        results = []  # (future, результат, исключение)
         try:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN started_at TEXT')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
-        
-        # Таблица для отслеживания времени работы с абонентскими клиентами за день
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS daily_subscription_time (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                work_date TEXT NOT NULL,
-                hours_worked REAL DEFAULT 0,
-                FOREIGN KEY (project_id) REFERENCES projects (id),
-                UNIQUE(project_id, work_date)
-            )
-        ''')
-        
-        # Таблица заметок проектов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                content TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY (project_id) REFERENCES projects (id)
-            )
-        ''')
-        
-        # Таблица заметок задач
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS task_notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_id INTEGER NOT NULL,
-                content TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY (task_id) REFERENCES tasks (id)
-            )
-        ''')
-        
-        # Таблица для сохранения состояния UI (свернутость панели проектов)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ui_state (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                key TEXT UNIQUE NOT NULL,
-                value TEXT NOT NULL
-            )
-        ''')
-        
-        # Таблица паролей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS passwords (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                type TEXT NOT NULL DEFAULT 'website',
-                username TEXT,
-                password TEXT NOT NULL,
-                url TEXT,
-                notes TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY (project_id) REFERENCES projects (id)
-            )
-        ''')
+            callbacks = []
+            # Методы Database внутри изменений получают соединение писателя (см. connection())
+            db._local.conn = conn
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for func, args, kwargs, future in batch:
+                    db._local.on_commit = []
+                    db._local.failed = False
+                    conn.execute('SAVEPOINT write_item')
+                    try:
+                        result = func(*args, **kwargs)
+                    except BaseException as e:
+                        conn.execute('ROLLBACK TO write_item')
+                        conn.execute('RELEASE write_item')
+                        results.append((future, None, e))
+                    else:
+                        conn.execute('RELEASE write_item')
+                        callbacks.extend(db._local.on_commit)
+                        results.append((future, result, None))
+                own_writes = _take_own_writes(conn)
+                conn.commit()
+                if own_writes is not None:
+                    db._note_own_writes(*own_writes)
+            except BaseException as e:
+                # Пачка не зафиксирована: изменения, выполненные без ошибок, тоже потеряны
+                self._rollback()
+                results = [(future, None, error or e) for future, _, error in results]
+                results.extend((future, None, e) for _, _, _, future in batch[len(results):])
+                callbacks = []
+            finally:
+                db._local.conn = None
+                db._local.on_commit = None
+                db._local.failed = False
+            
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Ошибка обработчика после записи: {e}")
+        finally:
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(sqlite3.OperationalError('Изменение не выполнено: писатель остановлен'))
+
+
+def _writes(method):
+    """Метод Database, изменяющий базу: при включенном писателе выполняется в его потоке"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.writer is None or self.writer.in_writer_thread():
+            return method(self, *args, **kwargs)
+        return self.writer.submit(method, self, *args, **kwargs)
+    return wrapper
+
+
+# Источники индекса подсказок: таблица -> (тип элемента, запрос строк id, заголовок, доп. поля)
+SUGGESTION_SOURCES = {
+    'projects': ('project', 'SELECT id, name FROM projects'),
+    'tasks': ('task', 'SELECT id, title, project_id, completed FROM tasks'),
+    'daily_notes': ('daily_note', 'SELECT id, title FROM daily_notes'),
+    'calendar_events': ('event', 'SELECT id, title, event_date FROM calendar_events'),
+}
+
+
+def _suggestion_items(kind, rows):
+    """Элементы индекса подсказок (тип, id, заголовок, доп. поля) из строк SUGGESTION_SOURCES"""
+    if kind == 'task':
+        return [(kind, row[0], row[1], {'project_id': row[2], 'completed': bool(row[3])}) for row in rows]
+    if kind == 'event':
+        return [(kind, row[0], row[1], {'event_date': row[2]}) for row in rows]
+    return [(kind, row[0], row[1], {}) for row in rows]
+
+
+# Помидоро: длительность рабочей сессии по умолчанию, состояния с идущим таймером
+# и расхождение оставшегося времени (секунды), при котором состояние считается тем же
+POMODORO_WORK_SECONDS = 25 * 60
+POMODORO_RUNNING_STATES = ('work', 'break')
+POMODORO_DRIFT_SECONDS = 5
+
+# Колонки строк, которые /api/sync отдает для каждой таблицы журнала sync_log
+# (служебные колонки сортировки и статистики клиенту не нужны)
+SYNC_COLUMNS = {
+    'projects': ('id', 'name', 'monthly_price', 'is_subscription', 'payment_date', 'rank', 'created_at', 'updated_at'),
+    'tasks': ('id', 'project_id', 'title', 'description', 'completed', 'created_at', 'completed_at', 'deadline',
+              'started_at', 'price', 'rank', 'updated_at'),
+    'notes': ('id', 'project_id', 'content', 'created_at', 'updated_at'),
+    'task_notes': ('id', 'task_id', 'content', 'created_at', 'updated_at'),
+    'passwords': ('id', 'project_id', 'name', 'type', 'username', 'password', 'url', 'notes', 'created_at',
+                  'updated_at'),
+    'daily_notes': ('id', 'title', 'content', 'created_at', 'updated_at'),
+    'calendar_events': ('id', 'title', 'description', 'event_date', 'event_time', 'created_at', 'updated_at'),
+}
+
+# Сколько часов в день можно работать с одним абонентским клиентом
+SUBSCRIPTION_DAILY_HOURS_LIMIT = 3.0
+
+# Колонки задач в ответах get_tasks и get_all_tasks
+PROJECT_TASK_COLUMNS = '''
+    t.id, t.title, t.description, t.completed, t.created_at, t.completed_at, t.deadline,
+    COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
+    p.is_subscription, t.project_id
+'''
+ALL_TASK_COLUMNS = '''
+    t.id, t.title, t.description, t.completed, t.created_at, t.completed_at, t.deadline,
+    COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
+    t.project_id, p.name as project_name, p.is_subscription
+'''
+
+# Сколько строк за раз читается при потоковой выдаче (одна порция - одно обращение к пулу)
+STREAM_BATCH_SIZE = 500
+
+# Таблицы с ручной сортировкой по колонке rank (ranking.py)
+RANKED_TABLES = ('projects', 'tasks')
+
+# Сколько id подставляется в один запрос "WHERE id IN (...)" при массовых операциях
+BULK_CHUNK_SIZE = 500
+
+TASK_INSERT_SQL = '''
+    INSERT INTO tasks (project_id, title, description, created_at, deadline, price, created_date, deadline_date,
+                       updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Прибавить часы к дню абонентского проекта: (project_id, work_date, hours)
+SUBSCRIPTION_TIME_ADD_SQL = '''
+    INSERT INTO daily_subscription_time (project_id, work_date, hours_worked)
+    VALUES (?, ?, ?)
+    ON CONFLICT(project_id, work_date) DO UPDATE SET hours_worked = hours_worked + excluded.hours_worked
+'''
+
+# Ключи сортировки задач (см. Database._get_sorted_tasks). По ним же строится
+# курсор постраничной загрузки, поэтому выражения не должны давать NULL
+OPEN_TASK_SORT_KEY = [
+    'CASE WHEN COALESCE(p.is_subscription, 0) THEN 0 ELSE 1 END',
+    'CASE WHEN COALESCE(p.is_subscription, 0) THEN COALESCE(d.hours_worked, 0) ELSE 0 END',
+    'CASE WHEN COALESCE(p.is_subscription, 0) THEN t.project_id ELSE 0 END',
+    # '~' больше любой цифры ранга: задачи без ранга идут после перемещенных вручную
+    "COALESCE(t.rank, '~')",
+    'COALESCE(t.created_date, :today)',
+    'CASE WHEN t.deadline_date > :price_from THEN -COALESCE(t.price, 0) ELSE 0 END',
+    't.id',
+]
+COMPLETED_TASK_SORT_KEY = ['t.created_at', 't.id']
+
+
+def _encode_task_cursor(phase, key):
+    """Курсор страницы: фаза (0 - открытые, 1 - завершенные) и ключ последней задачи"""
+    payload = json.dumps([phase, key], separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_task_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        phase, key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Некорректный курсор') from None
+    
+    expected = {0: len(OPEN_TASK_SORT_KEY), 1: len(COMPLETED_TASK_SORT_KEY)}
+    if (phase not in expected or not isinstance(key, list) or len(key) != expected[phase]
+            or not all(isinstance(value, (int, float, str)) for value in key)):
+        raise ValueError('Некорректный курсор')
+    return phase, key
+
+
+def _fts_terms(query):
+    """Строка запроса FTS5 из пользовательского ввода: каждое слово ищется по префиксу,
+    все слова должны встретиться. Пустая строка, если слов нет."""
+    words = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+# Группировка daily_task_stats по периодам: выражение SQL над s.stat_date -> ключ периода.
+# Ключ недели - дата ее понедельника, месяца - 'YYYY-MM', года - 'YYYY'
+STATS_PERIOD_SQL = {
+    'day': 's.stat_date',
+    'week': "date(s.stat_date, '-' || ((strftime('%w', s.stat_date) + 6) % 7) || ' days')",
+    'month': "strftime('%Y-%m', s.stat_date)",
+    'year': "strftime('%Y', s.stat_date)",
+}
+
+# Разрезы статистики: (ключ группы, название группы)
+STATS_GROUP_SQL = {
+    None: ('NULL', 'NULL'),
+    'project': ('s.project_id', 'p.name'),
+    'subscription': ('COALESCE(p.is_subscription, 0)', 'NULL'),
+}
+
+
+def stats_periods(date_from, date_to, granularity):
+    """Все периоды от date_from до date_to включительно: (ключ как в STATS_PERIOD_SQL, дата начала)"""
+    if granularity not in STATS_PERIOD_SQL:
+        raise ValueError(f'Неизвестная гранулярность: {granularity}')
+    periods = []
+    day = date_from
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    elif granularity == 'month':
+        day = day.replace(day=1)
+    elif granularity == 'year':
+        day = day.replace(month=1, day=1)
+    while day <= date_to:
+        if granularity == 'day':
+            periods.append((day.isoformat(), day))
+            day += timedelta(days=1)
+        elif granularity == 'week':
+            periods.append((day.isoformat(), day))
+            day += timedelta(weeks=1)
+        elif granularity == 'month':
+            periods.append((f'{day.year}-{day.month:02d}', day))
+            day = (day + timedelta(days=32)).replace(day=1)
+        else:
+            periods.append((str(day.year), day))
+            day = date(day.year + 1, 1, 1)
+    return periods
+
+
+def stats_period_keys(date_from, date_to, granularity):
+    """Ключи всех периодов от date_from до date_to включительно - в том же виде, что STATS_PERIOD_SQL"""
+    return [key for key, _ in stats_periods(date_from, date_to, granularity)]
+
+
+# Методы чтения, запросы которых обязаны идти через индексы: (метод, аргументы).
+# Проверяется через Database.explain_query_plans() / manage.py check-indexes
+INDEXED_QUERIES = [
+    ('get_tasks', (1,)),
+    ('get_tasks', (1, False)),
+    ('get_all_tasks', (False,)),
+    ('get_note', (1,)),
+    ('get_task_note', (1,)),
+    ('get_passwords', (1,)),
+    ('get_all_passwords', ()),
+    ('get_password', (1,)),
+    ('get_all_daily_notes', ()),
+    ('get_daily_note', (1,)),
+    ('get_calendar_events', ('2000-01-01',)),
+    ('get_calendar_events', ()),
+    ('get_daily_subscription_time', (1, '2000-01-01')),
+    ('get_daily_subscription_times', ([1, 2], '2000-01-01')),
+    ('_query_task_stats_sql', ('2000-01-01', '2000-12-31', 'month', 'project')),
+    ('count_open_tasks', ()),
+]
+
+
+class Database:
+    def __init__(self, db_name='planner.db', pool_size=5, statement_cache_size=128, use_analytics=False,
+                 single_writer=False):
+        """use_analytics - считать статистику в колоночном кэше на NumPy (если NumPy установлен).
+        По умолчанию выключено: статистику за обычные периоды SQL по daily_task_stats
+        считает быстрее, кэш выигрывает только на длинных периодах (manage.py bench-analytics).
+        single_writer - все изменения выполняет один поток-писатель с групповой фиксацией
+        (WriteQueue), остальные соединения пула открываются только для чтения"""
+        self.db_name = db_name
+        self.pool = ConnectionPool(db_name, size=pool_size, statement_cache_size=statement_cache_size)
+        self._local = threading.local()
+        self.suggestions = SuggestionIndex()
+        self._suggestions_lock = threading.Lock()
+        self._suggestions_cursor = 0  # позиция sync_log, которую отражает индекс подсказок
+        self.analytics = analytics.TaskAnalytics() if use_analytics and analytics.available() else None
+        self._analytics_lock = threading.Lock()
+        self._analytics_cursor = 0
+        # Диапазоны seq журнала sync_log, записанные этим процессом: кэши уже получили
+        # эти изменения в обработчиках после фиксации и не перечитывают их из журнала
+        self._own_writes = deque(maxlen=OWN_WRITES_KEPT)
+        self._own_writes_lock = threading.Lock()
+        self.writer = None
+        self.init_database()
+        with self.connection() as conn:
+            self.fts_enabled = migrations.has_fts(conn)
+        # Журнал sync_log создан миграциями - соединения отмечают свои записи в нем
+        self.pool.set_on_connect(_track_own_writes)
+        if single_writer and db_name != ':memory:':
+            self._start_writer()
+    
+    def _start_writer(self):
+        # Соединения, открытые для миграций, пишущие - пул начинает заново, только для чтения
+        self.pool.close()
+        self.pool.read_only = True
+        self.writer = WriteQueue(self)
+    
+    def reset_after_fork(self):
+        """Подготовить объект к работе в дочернем процессе (воркер serve.py): новый пул
+        соединений и блокировки. Кэши в памяти сохраняются - изменения, сделанные после
+        fork другими процессами, они получают из журнала sync_log"""
+        self.pool.reset_after_fork([self.writer.connection] if self.writer is not None else [])
+        self._local = threading.local()
+        self._suggestions_lock = threading.Lock()
+        self._analytics_lock = threading.Lock()
+        self._own_writes_lock = threading.Lock()
+        if self.writer is not None:
+            # Поток писателя родителя в дочерний процесс не переходит
+            self.writer = WriteQueue(self)
+    
+    def run_write(self, func, *args, **kwargs):
+        """Выполнить func как одно изменение в одной транзакции: в потоке писателя, если он
+        включен, иначе в текущем потоке. Исключение func откатывает все ее записи"""
+        if self.writer is None or self.writer.in_writer_thread():
+            with self.connection():
+                return func(*args, **kwargs)
+        return self.writer.submit(func, *args, **kwargs)
+    
+    @contextmanager
+    def connection(self):
+        """Соединение из пула на время блока with.
+        
+        Вложенные вызовы в том же потоке получают то же соединение, поэтому
+        методы могут вызывать друг друга внутри одной транзакции. Внешний блок
+        фиксирует изменения при успешном выходе и откатывает их при ошибке.
+        Ошибка SQLite во вложенном блоке отмечается в транзакции (transaction_failed),
+        даже если вызывающий ее перехватит.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            try:
+                yield conn
+            except sqlite3.Error:
+                self._local.failed = True
+                raise
+            return
         
-        # Добавляем колонку type если её нет (для существующих БД)
+        conn = self.pool.acquire()
+        self._local.conn = conn
+        self._local.on_commit = []
+        self._local.failed = False
+        changes = conn.total_changes
+        own_writes = None
         try:
-            cursor.execute('ALTER TABLE passwords ADD COLUMN type TEXT DEFAULT "website"')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
+            yield conn
+            if conn.total_changes != changes and self.pool.on_connect is not None:
+                own_writes = _take_own_writes(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            callbacks = self._local.on_commit
+            self._local.conn = None
+            self._local.on_commit = None
+            self._local.failed = False
+            self.pool.release(conn)
+        
+        if own_writes is not None:
+            self._note_own_writes(*own_writes)
+        for callback in callbacks:
+            callback()
+    
+    def transaction_failed(self):
+        """Была ли в текущей транзакции ошибка SQLite, в том числе перехваченная вызывающим
+        (например, представлением, которое отвечает запасным значением вместо ошибки)"""
+        return getattr(self._local, 'failed', False)
+    
+    def _on_commit(self, callback):
+        """Выполнить callback после фиксации текущей транзакции (вне блока - сразу).
+        При откате транзакции callback не вызывается."""
+        callbacks = getattr(self._local, 'on_commit', None)
+        if callbacks is None:
+            callback()
+        else:
+            callbacks.append(callback)
+    
+    def _iter_rows(self, sql, params=()):
+        """Построчное чтение результата запроса порциями по STREAM_BATCH_SIZE (LIMIT/OFFSET).
+        Соединение берется на время чтения порции: пока клиент медленно читает ответ,
+        генератор не держит соединение пула. Порядок sql должен быть однозначным"""
+        offset = 0
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(sql + ' LIMIT ? OFFSET ?', (*params, STREAM_BATCH_SIZE, offset)).fetchall()
+            yield from rows
+            if len(rows) < STREAM_BATCH_SIZE:
+                return
+            offset += len(rows)
+    
+    def close(self):
+        """Закрыть соединения пула (и остановить писателя, дождавшись очереди)"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.pool.close()
+    
+    def init_database(self):
+        """Инициализация базы данных: применяет недостающие миграции схемы"""
+        with self.connection() as conn:
+            migrations.migrate(conn)
+    
+    def get_data_versions(self, tables):
+        """Счетчики изменений таблиц (в порядке tables) - меняются при любой записи в таблицу"""
+        tables = list(tables)
+        placeholders = ', '.join('?' * len(tables))
+        with self.connection() as conn:
+            versions = dict(conn.execute(f'SELECT name, version FROM data_versions WHERE name IN ({placeholders})',
+                                         tables).fetchall())
+        return tuple(versions.get(table, 0) for table in tables)
+    
+    def explain_query_plans(self):
+        """Выполнить методы из INDEXED_QUERIES и получить планы их запросов.
         
-        # Таблица общих заметок (ежедневник) - теперь несколько заметок
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS daily_notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                content TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-        ''')
+        SQL перехватывается trace-callback'ом соединения, так что проверяются
+        ровно те запросы, которые выполняют методы. Возвращает список словарей
+        с ключами method, sql, plan и full_scans (строки плана с полным
+        сканированием таблицы без индекса).
+        """
+        with self.connection() as conn:
+            captured = []
+            statements = []
+            conn.set_trace_callback(statements.append)
+            try:
+                for method, args in INDEXED_QUERIES:
+                    statements.clear()
+                    getattr(self, method)(*args)
+                    captured.extend((method, sql) for sql in statements
+                                    if sql.lstrip().upper().startswith('SELECT'))
+            finally:
+                conn.set_trace_callback(None)
+            
+            results = []
+            for method, sql in captured:
+                plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+                full_scans = [step for step in plan
+                              if step.startswith('SCAN ') and ' USING ' not in step]
+                results.append({'method': method, 'sql': ' '.join(sql.split()),
+                                'plan': plan, 'full_scans': full_scans})
+            return results
+    
+    # Подсказки для поиска по мере ввода
+    def suggest(self, query, limit=10):
+        """Подсказки по заголовкам задач, проектов, заметок ежедневника и событий.
+        Отвечает из in-memory индекса, при первом вызове индекс загружается из базы."""
+        if not self.suggestions.loaded:
+            self._load_suggestions()
+        else:
+            self._catch_up_suggestions()
+        return self.suggestions.search(query, limit)
+    
+    def _load_suggestions(self):
+        with self._suggestions_lock:
+            if self.suggestions.loaded:
+                return
+            with self.connection() as conn:
+                # Позиция журнала и строки - из одного снимка: с нее индекс догоняет чужие изменения
+                if not conn.in_transaction:
+                    conn.execute('BEGIN')
+                self._suggestions_cursor = self.get_sync_cursor()
+                items = []
+                for kind, sql in SUGGESTION_SOURCES.values():
+                    items.extend(_suggestion_items(kind, conn.execute(sql)))
+            self.suggestions.load(items)
+    
+    def _catch_up_suggestions(self):
+        """Применить к индексу подсказок изменения из журнала sync_log после его позиции.
+        Свои изменения процесс вносит в индекс сразу после фиксации; журнал нужен для
+        изменений, сделанных другими процессами сервера (serve.py с несколькими воркерами)"""
+        with self._suggestions_lock, self.connection() as conn:
+            if conn.in_transaction:
+                # Внутри чужой транзакции (пакет /api/batch): ее записи еще могут откатиться
+                return
+            conn.execute('BEGIN')
+            cursor, changed, deleted = self._changed_since(conn, self._suggestions_cursor, SUGGESTION_SOURCES)
+            for entity, ids in changed.items():
+                kind, sql = SUGGESTION_SOURCES[entity]
+                rows = self._select_by_ids(conn.cursor(), sql + ' WHERE id IN ({ids})', ids)
+                self.suggestions.add_many(_suggestion_items(kind, rows))
+                deleted.setdefault(entity, []).extend(set(ids) - {row[0] for row in rows})
+            self.suggestions.remove_many((SUGGESTION_SOURCES[entity][0], item_id)
+                                         for entity, ids in deleted.items() for item_id in ids)
+            self._suggestions_cursor = cursor
+    
+    def _note_own_writes(self, lo, hi):
+        """Запомнить диапазон seq, записанный этим процессом (после фиксации)"""
+        with self._own_writes_lock:
+            self._own_writes.append((lo, hi))
+    
+    def _changed_since(self, conn, since, entities):
+        """Записи журнала после since по таблицам entities, сделанные другими процессами:
+        (позиция, {таблица: id измененных}, {таблица: id удаленных}). Свои записи процесс
+        уже применил после фиксации; если после since только они - один запрос MAX(seq)"""
+        cursor = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM sync_log').fetchone()[0]
+        changed = {}
+        deleted = {}
+        if cursor <= since:
+            return cursor, changed, deleted
+        with self._own_writes_lock:
+            own = sorted(range_ for range_ in self._own_writes if range_[1] > since)
+        own_starts = [lo for lo, _ in own]
+        # Покрывают ли свои диапазоны все seq от since до cursor
+        covered = since
+        for lo, hi in own:
+            if lo > covered + 1:
+                break
+            covered = max(covered, hi)
+        if covered >= cursor:
+            return cursor, changed, deleted
+        for seq, entity, entity_id, is_deleted in conn.execute(
+                'SELECT seq, entity, entity_id, deleted FROM sync_log WHERE seq > ? AND seq <= ?', (since, cursor)):
+            pos = bisect.bisect_right(own_starts, seq) - 1
+            if entity in entities and not (pos >= 0 and seq <= own[pos][1]):
+                (deleted if is_deleted else changed).setdefault(entity, []).append(entity_id)
+        return cursor, changed, deleted
+    
+    def _update_suggestions(self, method, *args, **kwargs):
+        """Обновить индекс подсказок после фиксации изменений (если индекс уже загружен)"""
+        if self.suggestions.loaded:
+            self._on_commit(lambda: getattr(self.suggestions, method)(*args, **kwargs))
+    
+    # Колоночный кэш статистики (analytics.py)
+    def _analytics_cache(self):
+        """Загруженный кэш статистики или None, если он выключен"""
+        if self.analytics is None:
+            return None
+        with self._analytics_lock, self.connection() as conn:
+            if not self.analytics.loaded:
+                if not conn.in_transaction:
+                    conn.execute('BEGIN')
+                self._analytics_cursor = self.get_sync_cursor()
+                self.analytics.load(conn.execute(analytics.TASK_COLUMNS_SQL).fetchall())
+            elif not conn.in_transaction:
+                conn.execute('BEGIN')
+                # Изменения задач, сделанные другими процессами сервера (см. _catch_up_suggestions)
+                cursor, changed, deleted = self._changed_since(conn, self._analytics_cursor, ('tasks',))
+                task_ids = changed.get('tasks', [])
+                rows = self._select_by_ids(conn.cursor(), analytics.TASK_COLUMNS_SQL + ' WHERE id IN ({ids})', task_ids)
+                self.analytics.upsert(rows)
+                self.analytics.remove(set(task_ids) - {row[0] for row in rows} | set(deleted.get('tasks', [])))
+                self._analytics_cursor = cursor
+        return self.analytics
+    
+    def _update_analytics(self, *task_ids):
+        """Перечитать задачи в кэш статистики после фиксации (удаленные - убрать)"""
+        if self.analytics is None or not self.analytics.loaded:
+            return
         
-        # Добавляем колонку title если её нет (для существующих БД)
-        try:
-            cursor.execute('ALTER TABLE daily_notes ADD COLUMN title TEXT')
-            # Если колонка была добавлена, обновляем существующие записи
-            cursor.execute('UPDATE daily_notes SET title = "Заметка" WHERE title IS NULL')
-        except sqlite3.OperationalError:
-            pass  # Колонка уже существует
+        def refresh():
+            with self.connection() as conn:
+                rows = self._select_by_ids(conn.cursor(), analytics.TASK_COLUMNS_SQL + ' WHERE id IN ({ids})',
+                                           task_ids)
+            self.analytics.upsert(rows)
+            self.analytics.remove(set(task_ids) - {row[0] for row in rows})
         
-        # Таблица событий календаря
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS calendar_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                event_date TEXT NOT NULL,
-                event_time TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-        ''')
+        self._on_commit(refresh)
+    
+    def _select_by_ids(self, cursor, sql, ids):
+        """Строки запроса sql с условием "id IN ({ids})" для списка ids - порциями по BULK_CHUNK_SIZE"""
+        ids = list(ids)
+        rows = []
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            chunk = ids[start:start + BULK_CHUNK_SIZE]
+            cursor.execute(sql.format(ids=', '.join('?' * len(chunk))), chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+    
+    # Ручная сортировка (ranking.py)
+    def _move_ranked(self, table, item_id, prev_id=None, next_id=None):
+        """Поставить элемент table сразу после prev_id или перед next_id (None - в конец
+        упорядоченной части). Второй сосед находится одним запросом по индексу rank,
+        поэтому перемещение не зависит от длины списка. Соседи без ранга (задачи,
+        которые не перемещали) считаются концом упорядоченной части."""
+        if table not in RANKED_TABLES:
+            raise ValueError(f'Таблица без ручной сортировки: {table}')
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if cursor.execute(f'SELECT 1 FROM {table} WHERE id = ?', (item_id,)).fetchone() is None:
+                return None
+            
+            def rank_of(other_id):
+                if other_id is None or other_id == item_id:
+                    return None
+                row = cursor.execute(f'SELECT rank FROM {table} WHERE id = ?', (other_id,)).fetchone()
+                return row[0] if row else None
+            
+            lower = rank_of(prev_id)
+            upper = None if lower is not None else rank_of(next_id)
+            if lower is not None:
+                cursor.execute(f'SELECT MIN(rank) FROM {table} WHERE rank > ? AND id != ?', (lower, item_id))
+                upper = cursor.fetchone()[0]
+            elif upper is not None:
+                cursor.execute(f'SELECT MAX(rank) FROM {table} WHERE rank < ? AND id != ?', (upper, item_id))
+                lower = cursor.fetchone()[0]
+            else:
+                cursor.execute(f'SELECT MAX(rank) FROM {table} WHERE id != ?', (item_id,))
+                lower = cursor.fetchone()[0]
+            rank = ranking.rank_between(lower, upper)
+            cursor.execute(f'UPDATE {table} SET rank = ?, updated_at = ? WHERE id = ?',
+                           (rank, datetime.now().isoformat(), item_id))
+            self._check_rank_length(table, rank)
+            return rank
+    
+    def _check_rank_length(self, table, rank):
+        """Слишком длинный ранг - перебалансировать таблицу в фоне после фиксации"""
+        if not ranking.needs_rebalance(rank):
+            return
         
-        conn.commit()
-        conn.close()
+        def rebalance():
+            try:
+                self.rebalance_ranks(table)
+            except Exception as e:
+                print(f"Ошибка перебалансировки рангов {table}: {e}")
+        
+        self._on_commit(lambda: threading.Thread(target=rebalance, daemon=True).start())
+    
+    @_writes
+    def rebalance_ranks(self, table=None):
+        """Раздать элементам с рангом равномерные короткие ранги в прежнем порядке
+        (table=None - все таблицы с ручной сортировкой)"""
+        tables = RANKED_TABLES if table is None else [table]
+        if not set(tables) <= set(RANKED_TABLES):
+            raise ValueError(f'Таблица без ручной сортировки: {table}')
+        with self.connection() as conn:
+            updated_at = datetime.now().isoformat()
+            for name in tables:
+                ids = [row[0] for row in conn.execute(f'SELECT id FROM {name} WHERE rank IS NOT NULL ORDER BY rank, id')]
+                conn.executemany(f'UPDATE {name} SET rank = ?, updated_at = ? WHERE id = ?',
+                                 [(rank, updated_at, item_id) for rank, item_id in zip(ranking.spread_ranks(len(ids)), ids)])
     
     # Методы для работы с проектами
+    @_writes
     def create_project(self, name, monthly_price=0, is_subscription=False, payment_date=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        # Получаем максимальный порядок и добавляем 1
-        cursor.execute('SELECT COALESCE(MAX(sort_order), 0) FROM projects')
-        max_order = cursor.fetchone()[0]
-        new_order = max_order + 1
-        
-        cursor.execute('''
-            INSERT INTO projects (name, created_at, monthly_price, is_subscription, payment_date, sort_order)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (name, datetime.now().isoformat(), monthly_price, 1 if is_subscription else 0, payment_date, new_order))
-        conn.commit()
-        project_id = cursor.lastrowid
-        conn.close()
-        return project_id
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # Новый проект - в конец списка (MAX по индексу idx_projects_rank)
+            cursor.execute('SELECT MAX(rank) FROM projects')
+            rank = ranking.rank_between(cursor.fetchone()[0], None)
+            
+            created_at = datetime.now().isoformat()
+            cursor.execute('''
+                INSERT INTO projects (name, created_at, monthly_price, is_subscription, payment_date, rank, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (name, created_at, monthly_price, 1 if is_subscription else 0, payment_date, rank, created_at))
+            project_id = cursor.lastrowid
+            self._check_rank_length('projects', rank)
+            self._update_suggestions('add', 'project', project_id, name)
+            return project_id
     
     def get_all_projects(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, name, COALESCE(monthly_price, 0) as monthly_price, 
-                   COALESCE(is_subscription, 0) as is_subscription, payment_date,
-                   COALESCE(sort_order, 0) as sort_order
-            FROM projects 
-            ORDER BY COALESCE(sort_order, 0) ASC, created_at DESC
-        ''')
-        projects = cursor.fetchall()
-        conn.close()
-        return projects
-    
-    def update_project(self, project_id, name=None, monthly_price=None, is_subscription=None, payment_date=None, sort_order=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        updates = []
-        params = []
-        
-        if name is not None:
-            updates.append('name = ?')
-            params.append(name)
-        if monthly_price is not None:
-            updates.append('monthly_price = ?')
-            params.append(monthly_price)
-        if is_subscription is not None:
-            updates.append('is_subscription = ?')
-            params.append(1 if is_subscription else 0)
-        if payment_date is not None:
-            updates.append('payment_date = ?')
-            params.append(payment_date)
-        if sort_order is not None:
-            updates.append('sort_order = ?')
-            params.append(sort_order)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, name, COALESCE(monthly_price, 0) as monthly_price, 
+                       COALESCE(is_subscription, 0) as is_subscription, payment_date,
+                       rank
+                FROM projects 
+                ORDER BY rank, created_at DESC
+            ''')
+            projects = cursor.fetchall()
+            return projects
+    
+    def get_projects_with_stats(self):
+        """Получить проекты вместе со счетчиками задач одним запросом.
         
-        if updates:
-            params.append(project_id)
-            cursor.execute(f'UPDATE projects SET {", ".join(updates)} WHERE id = ?', params)
-            conn.commit()
-        conn.close()
+        Кортеж: (id, name, monthly_price, is_subscription, payment_date, rank,
+                 task_count, open_count, overdue_count, total_count, open_price_sum)
+        task_count - число задач в списке проекта: у абонентского проекта, по которому
+        за сегодня уже отработан дневной лимит, открытые задачи в список не попадают.
+        """
+        today = date.today().isoformat()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT p.id, p.name, COALESCE(p.monthly_price, 0) as monthly_price,
+                       COALESCE(p.is_subscription, 0) as is_subscription, p.payment_date,
+                       p.rank,
+                       CASE WHEN COALESCE(p.is_subscription, 0) AND COALESCE(d.hours_worked, 0) >= ?
+                            THEN 0 ELSE COALESCE(o.open_count, 0) END as task_count,
+                       COALESCE(o.open_count, 0) as open_count,
+                       COALESCE(o.overdue_count, 0) as overdue_count,
+                       COALESCE(a.total_count, 0) as total_count,
+                       COALESCE(o.open_price_sum, 0) as open_price_sum
+                FROM projects p
+                LEFT JOIN (
+                    SELECT project_id, COUNT(*) as open_count,
+                           SUM(deadline IS NOT NULL AND deadline != '' AND substr(deadline, 1, 10) < ?) as overdue_count,
+                           SUM(COALESCE(price, 0)) as open_price_sum
+                    FROM tasks
+                    WHERE completed = 0
+                    GROUP BY project_id
+                ) o ON o.project_id = p.id
+                LEFT JOIN (
+                    SELECT project_id, COUNT(*) as total_count
+                    FROM tasks
+                    GROUP BY project_id
+                ) a ON a.project_id = p.id
+                LEFT JOIN daily_subscription_time d ON d.project_id = p.id AND d.work_date = ?
+                ORDER BY p.rank, p.created_at DESC
+            ''', (SUBSCRIPTION_DAILY_HOURS_LIMIT, today, today))
+            return cursor.fetchall()
     
+    @_writes
+    def update_project(self, project_id, name=None, monthly_price=None, is_subscription=None, payment_date=None):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            updates = []
+            params = []
+            
+            if name is not None:
+                updates.append('name = ?')
+                params.append(name)
+            if monthly_price is not None:
+                updates.append('monthly_price = ?')
+                params.append(monthly_price)
+            if is_subscription is not None:
+                updates.append('is_subscription = ?')
+                params.append(1 if is_subscription else 0)
+            if payment_date is not None:
+                updates.append('payment_date = ?')
+                params.append(payment_date)
+            
+            if updates:
+                updates.append('updated_at = ?')
+                params.append(datetime.now().isoformat())
+                params.append(project_id)
+                cursor.execute(f'UPDATE projects SET {", ".join(updates)} WHERE id = ?', params)
+                if name is not None:
+                    self._update_suggestions('update', 'project', project_id, name)
+    
+    @_writes
     def update_projects_order(self, project_orders):
-        """Обновить порядок нескольких проектов одновременно
+        """Задать порядок всего списка проектов (переписывает ранги всех переданных проектов;
+        для перетаскивания одного проекта - move_project)
         project_orders: список кортежей (project_id, sort_order)
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        for project_id, sort_order in project_orders:
-            cursor.execute('UPDATE projects SET sort_order = ? WHERE id = ?', (sort_order, project_id))
-        conn.commit()
-        conn.close()
+        ids = [project_id for project_id, _ in sorted(project_orders, key=lambda item: item[1])]
+        updated_at = datetime.now().isoformat()
+        with self.connection() as conn:
+            conn.executemany('UPDATE projects SET rank = ?, updated_at = ? WHERE id = ?',
+                             [(rank, updated_at, project_id) for rank, project_id in zip(ranking.spread_ranks(len(ids)), ids)])
+    
+    @_writes
+    def move_project(self, project_id, prev_id=None, next_id=None):
+        """Переставить проект после prev_id (или перед next_id) - одна измененная строка.
+        Возвращает новый ранг или None, если проекта нет"""
+        return self._move_ranked('projects', project_id, prev_id, next_id)
     
+    @_writes
     def delete_project(self, project_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
-        cursor.execute('DELETE FROM tasks WHERE project_id = ?', (project_id,))
-        cursor.execute('DELETE FROM notes WHERE project_id = ?', (project_id,))
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+            cursor.execute('DELETE FROM tasks WHERE project_id = ?', (project_id,))
+            cursor.execute('DELETE FROM daily_task_stats WHERE project_id = ?', (project_id,))
+            cursor.execute('DELETE FROM notes WHERE project_id = ?', (project_id,))
+            self._update_suggestions('remove', 'project', project_id)
+            self._update_suggestions('remove_where', 'task', project_id=project_id)
+            if self.analytics is not None and self.analytics.loaded:
+                self._on_commit(lambda: self.analytics.remove_project(project_id))
     
     # Методы для работы с задачами
+    @_writes
     def create_task(self, project_id, title, description='', deadline=None, price=0):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO tasks (project_id, title, description, created_at, deadline, price)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (project_id, title, description, datetime.now().isoformat(), deadline, price))
-        conn.commit()
-        task_id = cursor.lastrowid
-        conn.close()
-        return task_id
-    
-    def get_tasks(self, project_id, include_completed=True):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            created_at = datetime.now().isoformat()
+            cursor.execute(TASK_INSERT_SQL, (project_id, title, description, created_at, deadline, price,
+                                             migrations.sort_date(created_at), migrations.sort_date(deadline),
+                                             created_at))
+            task_id = cursor.lastrowid
+            self._update_suggestions('add', 'task', task_id, title, {'project_id': project_id, 'completed': False})
+            self._update_analytics(task_id)
+            return task_id
+    
+    def get_tasks(self, project_id, include_completed=True, limit=None):
         """Получить задачи проекта с правильной сортировкой"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        if include_completed:
-            cursor.execute('''
-                SELECT t.id, t.title, t.description, t.completed, t.created_at, t.completed_at, t.deadline, 
-                       COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
-                       p.is_subscription
-                FROM tasks t
-                LEFT JOIN projects p ON t.project_id = p.id
-                WHERE t.project_id = ?
-            ''', (project_id,))
-        else:
-            cursor.execute('''
-                SELECT t.id, t.title, t.description, t.completed, t.created_at, t.completed_at, t.deadline, 
-                       COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
-                       p.is_subscription
-                FROM tasks t
-                LEFT JOIN projects p ON t.project_id = p.id
-                WHERE t.project_id = ? AND t.completed = 0
-            ''', (project_id,))
-        
-        tasks = cursor.fetchall()
-        conn.close()
-        
-        # Добавляем project_id к каждой задаче для сортировки
-        tasks_with_project = []
-        for task in tasks:
-            # Добавляем project_id в конец кортежа для удобства сортировки
-            task_list = list(task)
-            task_list.append(project_id)  # Добавляем project_id на позицию 9 (или последнюю)
-            tasks_with_project.append(tuple(task_list))
-        
-        # Применяем сортировку
-        sorted_tasks = self._sort_tasks(tasks_with_project, project_id)
-        return sorted_tasks
+        tasks, _ = self._get_sorted_tasks(PROJECT_TASK_COLUMNS, project_id, include_completed, limit)
+        return tasks
     
-    def get_all_tasks(self, include_completed=True):
+    def get_all_tasks(self, include_completed=True, limit=None):
         """Получить все задачи из всех проектов с правильной сортировкой"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        tasks, _ = self._get_sorted_tasks(ALL_TASK_COLUMNS, None, include_completed, limit)
+        return tasks
+    
+    def get_tasks_page(self, project_id, limit, after=None, include_completed=True):
+        """Страница задач для постраничной загрузки (keyset-пагинация).
+        
+        project_id = 0 (или None) - задачи всех проектов в формате get_all_tasks.
+        after - курсор, полученный с предыдущей страницей.
+        Возвращает (задачи, курсор следующей страницы или None).
+        Некорректный курсор - ValueError.
+        """
+        if project_id:
+            return self._get_sorted_tasks(PROJECT_TASK_COLUMNS, project_id, include_completed, limit, after)
+        return self._get_sorted_tasks(ALL_TASK_COLUMNS, None, include_completed, limit, after)
+    
+    def iter_tasks(self, project_id, include_completed=True):
+        """Потоковый вариант get_tasks/get_all_tasks (project_id = 0 - все проекты):
+        задачи читаются страницами по STREAM_BATCH_SIZE (как get_tasks_page), список целиком
+        не собирается, а соединение пула занято только на время чтения страницы"""
+        columns = PROJECT_TASK_COLUMNS if project_id else ALL_TASK_COLUMNS
+        after = None
+        while True:
+            tasks, after = self._get_sorted_tasks(columns, project_id or None, include_completed,
+                                                  STREAM_BATCH_SIZE, after)
+            yield from tasks
+            if after is None:
+                return
+    
+    def _get_sorted_tasks(self, columns, project_id=None, include_completed=True, limit=None, after=None):
+        """Список задач в порядке отображения (см. _iter_sorted_tasks).
+        Возвращает (задачи, курсор следующей страницы или None)."""
+        tasks = []
+        last = None
+        with self.connection() as conn:
+            for phase, task, key in self._iter_sorted_tasks(conn, columns, project_id, include_completed, limit, after):
+                tasks.append(task)
+                last = (phase, key)
+        
+        next_cursor = None
+        if limit is not None and len(tasks) >= limit and last is not None:
+            next_cursor = _encode_task_cursor(last[0], list(last[1]))
+        return tasks, next_cursor
+    
+    def _iter_sorted_tasks(self, conn, columns, project_id=None, include_completed=True, limit=None, after=None):
+        """
+        Задачи в порядке отображения, сортировка выполняется в SQL:
+        1. Сначала незавершенные задачи абонентских клиентов, по которым за сегодня
+           не выбран дневной лимит (меньше отработано - выше)
+        2. Потом остальные незавершенные задачи
+        3. Внутри групп сначала задачи, упорядоченные вручную (по рангу, см. move_task),
+           затем остальные от старых к новым (по дате создания); если до крайнего срока
+           больше 2 дней, при одинаковой дате задачи сортируются по цене
+        4. В конце завершенные задачи от старых к новым
+        
+        Незавершенные и завершенные задачи выбираются отдельными запросами, поэтому
+        первая страница не зависит от объема накопленной истории.
+        Генерирует кортежи (фаза, задача, ключ сортировки).
+        """
+        start_phase, after_key = _decode_task_cursor(after) if after else (0, None)
+        
+        today = date.today()
+        params = {
+            'project_id': project_id,
+            'today': today.isoformat(),
+            'price_from': (today + timedelta(days=2)).isoformat(),
+            'hours_limit': SUBSCRIPTION_DAILY_HOURS_LIMIT,
+        }
+        project_filter = ' AND t.project_id = :project_id' if project_id is not None else ''
+        
+        phases = [
+            (0, '''t.completed = 0 AND NOT (COALESCE(p.is_subscription, 0)
+                                           AND COALESCE(d.hours_worked, 0) >= :hours_limit)''',
+             OPEN_TASK_SORT_KEY),
+        ]
         if include_completed:
-            cursor.execute('''
-                SELECT t.id, t.title, t.description, t.completed, t.created_at, t.completed_at, t.deadline, 
-                       COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
-                       t.project_id, p.name as project_name, p.is_subscription
-                FROM tasks t
-                LEFT JOIN projects p ON t.project_id = p.id
-            ''')
-        else:
-            cursor.execute('''
-                SELECT t.id, t.title, t.description, t.completed, t.created_at, t.completed_at, t.deadline, 
-                       COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
-                       t.project_id, p.name as project_name, p.is_subscription
+            phases.append((1, 't.completed = 1', COMPLETED_TASK_SORT_KEY))
+        
+        produced = 0
+        for phase, condition, sort_key in phases:
+            if phase < start_phase:
+                continue
+            if limit is not None and produced >= limit:
+                break
+            
+            key_sql = ', '.join(sort_key)
+            condition += project_filter
+            if after_key is not None and phase == start_phase:
+                key_params = {f'k{i}': value for i, value in enumerate(after_key)}
+                condition += f" AND ({key_sql}) > ({', '.join(':' + name for name in key_params)})"
+                params.update(key_params)
+            # LIMIT -1 в SQLite - без ограничения
+            params['limit'] = -1 if limit is None else limit - produced
+            
+            cursor = conn.execute(f'''
+                SELECT {columns}, {key_sql}
                 FROM tasks t
                 LEFT JOIN projects p ON t.project_id = p.id
-                WHERE t.completed = 0
-            ''')
-        tasks = cursor.fetchall()
-        conn.close()
-        
-        # Применяем сортировку
-        sorted_tasks = self._sort_tasks(tasks)
-        return sorted_tasks
+                LEFT JOIN daily_subscription_time d ON d.project_id = t.project_id AND d.work_date = :today
+                WHERE {condition}
+                ORDER BY {key_sql}
+                LIMIT :limit
+            ''', params)
+            
+            # Колонки ключа сортировки идут в конце строки
+            key_len = len(sort_key)
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    produced += 1
+                    yield phase, row[:-key_len], row[-key_len:]
     
     def _update_subscription_time_on_completion(self, task_id, completed_at):
         """Обновить время работы с абонентским клиентом при завершении задачи"""
-        from datetime import datetime, date
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Получаем информацию о задаче
-        cursor.execute('''
-            SELECT t.project_id, t.started_at, p.is_subscription
-            FROM tasks t
-            LEFT JOIN projects p ON t.project_id = p.id
-            WHERE t.id = ?
-        ''', (task_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            return
-        
-        project_id, started_at, is_subscription = result
-        
-        # Если проект не абонентский, не обновляем
-        if not is_subscription:
-            conn.close()
-            return
-        
-        # Вычисляем время работы
-        if started_at and completed_at:
-            try:
-                start_time = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                end_time = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
-                duration_hours = (end_time - start_time).total_seconds() / 3600
-                
-                # Получаем дату работы
-                work_date = end_time.date().isoformat()
-                
-                # Обновляем время за день
-                current_hours = self.get_daily_subscription_time(project_id, work_date)
-                new_hours = current_hours + duration_hours
-                self.update_daily_subscription_time(project_id, work_date, new_hours)
-            except Exception as e:
-                print(f"Ошибка обновления времени абонентского клиента: {e}")
-        
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Получаем информацию о задаче
+            cursor.execute('''
+                SELECT t.project_id, t.started_at, p.is_subscription
+                FROM tasks t
+                LEFT JOIN projects p ON t.project_id = p.id
+                WHERE t.id = ?
+            ''', (task_id,))
+            result = cursor.fetchone()
+            
+            if not result:
+                return
+            
+            project_id, started_at, is_subscription = result
+            
+            # Если проект не абонентский, не обновляем
+            if not is_subscription:
+                return
+            
+            # Вычисляем время работы
+            if started_at and completed_at:
+                try:
+                    duration_hours = migrations.tracked_hours(started_at, completed_at)
+                    
+                    # Получаем дату работы
+                    work_date = migrations.parse_timestamp(completed_at).date().isoformat()
+                    
+                    # Обновляем время за день
+                    self.add_daily_subscription_time(project_id, work_date, duration_hours)
+                except Exception as e:
+                    print(f"Ошибка обновления времени абонентского клиента: {e}")
     
     def get_daily_subscription_time(self, project_id, work_date):
         """Получить время работы с абонентским клиентом за день"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT hours_worked FROM daily_subscription_time
-            WHERE project_id = ? AND work_date = ?
-        ''', (project_id, work_date))
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else 0.0
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT hours_worked FROM daily_subscription_time
+                WHERE project_id = ? AND work_date = ?
+            ''', (project_id, work_date))
+            result = cursor.fetchone()
+            return result[0] if result else 0.0
+    
+    def get_daily_subscription_times(self, project_ids, work_date):
+        """Получить время работы за день сразу для нескольких проектов: {project_id: часы}"""
+        project_ids = list(project_ids)
+        if not project_ids:
+            return {}
+        placeholders = ', '.join('?' * len(project_ids))
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT project_id, hours_worked FROM daily_subscription_time
+                WHERE work_date = ? AND project_id IN ({placeholders})
+            ''', [work_date] + project_ids)
+            hours = dict.fromkeys(project_ids, 0.0)
+            hours.update(cursor.fetchall())
+            return hours
     
+    @_writes
     def update_daily_subscription_time(self, project_id, work_date, hours):
         """Обновить время работы с абонентским клиентом за день"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO daily_subscription_time (project_id, work_date, hours_worked)
+                VALUES (?, ?, ?)
+            ''', (project_id, work_date, hours))
+    
+    @_writes
+    def add_daily_subscription_time(self, project_id, work_date, hours):
+        """Прибавить отработанное время к дню одним запросом"""
+        with self.connection() as conn:
+            conn.execute(SUBSCRIPTION_TIME_ADD_SQL, (project_id, work_date, hours))
+    
+    def _apply_task_stats(self, cursor, project_id, completed_at, count, hours):
+        """Прибавить к строке daily_task_stats дня завершения задачи (count=-1 - вычесть)"""
+        self._apply_task_stats_many(cursor, [(project_id, completed_at, count, hours)])
+    
+    def _apply_task_stats_many(self, cursor, changes):
+        """_apply_task_stats для многих задач: изменения складываются по (день, проект)
+        и записываются одним executemany. changes: кортежи (project_id, completed_at, count, hours)"""
+        totals = {}
+        for project_id, completed_at, count, hours in changes:
+            stat_date = migrations.sort_date(completed_at)
+            if stat_date is None:
+                continue
+            total = totals.setdefault((stat_date, project_id), [0, 0.0])
+            total[0] += count
+            total[1] += hours
+        if not totals:
+            return
+        cursor.executemany('''
+            INSERT INTO daily_task_stats (stat_date, project_id, completed_count, tracked_hours)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(stat_date, project_id) DO UPDATE SET
+                completed_count = completed_count + excluded.completed_count,
+                tracked_hours = tracked_hours + excluded.tracked_hours
+        ''', [(stat_date, project_id, count, hours) for (stat_date, project_id), (count, hours) in totals.items()])
+        cursor.executemany('''
+            DELETE FROM daily_task_stats
+            WHERE stat_date = ? AND project_id = ? AND completed_count <= 0
+        ''', [key for key, (count, _) in totals.items() if count < 0])
+    
+    def _revert_task_stats(self, cursor, task_id):
+        """Убрать вклад выполненной задачи из daily_task_stats (перед открытием или удалением)"""
         cursor.execute('''
-            INSERT OR REPLACE INTO daily_subscription_time (project_id, work_date, hours_worked)
-            VALUES (?, ?, ?)
-        ''', (project_id, work_date, hours))
-        conn.commit()
-        conn.close()
+            SELECT project_id, completed_at, tracked_hours FROM tasks
+            WHERE id = ? AND completed = 1
+        ''', (task_id,))
+        row = cursor.fetchone()
+        if row:
+            project_id, completed_at, hours = row
+            self._apply_task_stats(cursor, project_id, completed_at, -1, -(hours or 0.0))
     
-    def _sort_tasks(self, tasks, project_id=None):
-        """
-        Сортировка задач по правилам:
-        1. Сначала задачи абонентских клиентов (не более 3 часов в день на одного)
-        2. Потом задачи от старых к новым
-        3. Если крайние сроки позволяют, сортировать по цене
-        4. Все задачи от старых к новым
-        """
-        from datetime import datetime, date
-        
-        today = date.today().isoformat()
-        
-        # Разделяем задачи на завершенные и незавершенные
-        completed_tasks = []
-        uncompleted_tasks = []
-        
-        for task in tasks:
-            # Определяем структуру task в зависимости от количества полей
-            if len(task) >= 9:
-                is_completed = bool(task[3])
-                if is_completed:
-                    completed_tasks.append(task)
-                else:
-                    uncompleted_tasks.append(task)
-            else:
-                # Старая структура
-                is_completed = bool(task[3])
-                if is_completed:
-                    completed_tasks.append(task)
-                else:
-                    uncompleted_tasks.append(task)
-        
-        # Сортируем незавершенные задачи
-        sorted_uncompleted = self._sort_uncompleted_tasks(uncompleted_tasks, today)
-        
-        # Сортируем завершенные задачи от старых к новым
-        sorted_completed = sorted(completed_tasks, key=lambda t: t[4] if t[4] else '')  # created_at
-        
-        # Возвращаем сначала незавершенные, потом завершенные
-        return sorted_uncompleted + sorted_completed
+    @_writes
+    def rebuild_task_stats(self):
+        """Пересобрать daily_task_stats по истории задач (manage.py rebuild-stats)"""
+        with self.connection() as conn:
+            migrations.rebuild_task_stats(conn.cursor())
     
-    def _sort_uncompleted_tasks(self, tasks, today):
-        """Сортировка незавершенных задач"""
-        from datetime import datetime, date
-        
-        # Группируем задачи по проектам
-        subscription_tasks = []  # Задачи абонентских клиентов
-        regular_tasks = []  # Обычные задачи
-        
-        for task in tasks:
-            # Определяем is_subscription
-            is_subscription = False
-            if len(task) >= 10:
-                # Новая структура с is_subscription (позиция 9)
-                is_subscription = bool(task[9] if len(task) > 9 else 0)
-            elif len(task) >= 12:
-                # Структура из get_all_tasks (позиция 11)
-                is_subscription = bool(task[11] if len(task) > 11 else 0)
+    @_writes
+    def update_task(self, task_id, title=None, description=None, completed=None, deadline=None, started_at=None, price=None):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            updates = []
+            params = []
             
-            if is_subscription:
-                subscription_tasks.append(task)
-            else:
-                regular_tasks.append(task)
-        
-        # Сортируем задачи абонентских клиентов
-        sorted_subscription = self._sort_subscription_tasks(subscription_tasks, today)
-        
-        # Сортируем обычные задачи
-        sorted_regular = self._sort_regular_tasks(regular_tasks)
-        
-        # Возвращаем сначала абонентские (до 3 часов), потом обычные
-        return sorted_subscription + sorted_regular
-    
-    def _sort_subscription_tasks(self, tasks, today):
-        """Сортировка задач абонентских клиентов (не более 3 часов в день на одного)"""
-        from datetime import datetime, date
-        
-        # Группируем по проектам
-        tasks_by_project = {}
-        for task in tasks:
-            # Получаем project_id в зависимости от структуры
-            project_id = None
-            if len(task) >= 12:
-                # Структура из get_all_tasks: project_id на позиции 9
-                project_id = task[9] if len(task) > 9 else None
-            elif len(task) >= 10:
-                # Структура из get_tasks: project_id добавлен в конец кортежа (позиция 9)
-                project_id = task[9] if len(task) > 9 else None
+            if completed is not None:
+                # Повторное завершение или открытие задачи: сначала снимаем прежний вклад в статистику
+                self._revert_task_stats(cursor, task_id)
             
-            if project_id is None:
-                continue
+            if title is not None:
+                updates.append('title = ?')
+                params.append(title)
+            if description is not None:
+                updates.append('description = ?')
+                params.append(description)
+            if completed is not None:
+                updates.append('completed = ?')
+                params.append(completed)
+                # Если задача завершается, записываем дату завершения
+                if completed == 1:
+                    completed_at = datetime.now().isoformat()
+                    updates.append('completed_at = ?')
+                    params.append(completed_at)
+                    # Фиксируем отработанное время до сброса started_at
+                    cursor.execute('SELECT project_id, started_at FROM tasks WHERE id = ?', (task_id,))
+                    row = cursor.fetchone()
+                    if row:
+                        hours = migrations.tracked_hours(row[1], completed_at)
+                        updates.append('tracked_hours = ?')
+                        params.append(hours)
+                        self._apply_task_stats(cursor, row[0], completed_at, 1, hours)
+                    # Останавливаем таймер при завершении
+                    updates.append('started_at = NULL')
+                    # Обновляем время работы с абонентским клиентом
+                    self._update_subscription_time_on_completion(task_id, completed_at)
+                # Если задача открывается обратно, очищаем дату завершения
+                elif completed == 0:
+                    updates.append('completed_at = NULL')
+                    updates.append('tracked_hours = NULL')
+            if deadline is not None:
+                updates.append('deadline = ?')
+                params.append(deadline)
+                updates.append('deadline_date = ?')
+                params.append(migrations.sort_date(deadline))
+            if started_at is not None:
+                if started_at == '':
+                    updates.append('started_at = NULL')
+                else:
+                    updates.append('started_at = ?')
+                    params.append(started_at)
+            if price is not None:
+                updates.append('price = ?')
+                params.append(price)
             
-            if project_id not in tasks_by_project:
-                tasks_by_project[project_id] = []
-            tasks_by_project[project_id].append(task)
-        
-        # Сортируем проекты по времени работы за сегодня (меньше времени = выше приоритет)
-        project_priorities = []
-        for project_id, project_tasks in tasks_by_project.items():
-            hours_worked = self.get_daily_subscription_time(project_id, today)
-            # Если уже отработано 3+ часов, пропускаем этот проект
-            if hours_worked >= 3.0:
-                continue
-            project_priorities.append((project_id, hours_worked, project_tasks))
-        
-        # Сортируем проекты по времени работы (меньше = выше приоритет)
-        project_priorities.sort(key=lambda x: x[1])
-        
-        # Собираем задачи в правильном порядке
-        sorted_tasks = []
-        for project_id, hours_worked, project_tasks in project_priorities:
-            # Сортируем задачи проекта от старых к новым, затем по цене если deadline позволяет
-            sorted_project_tasks = self._sort_tasks_by_priority(project_tasks)
-            sorted_tasks.extend(sorted_project_tasks)
-        
-        return sorted_tasks
+            if updates:
+                updates.append('updated_at = ?')
+                params.append(datetime.now().isoformat())
+                params.append(task_id)
+                # Заменяем NULL на None для SQL
+                query = 'UPDATE tasks SET ' + ', '.join(updates) + ' WHERE id = ?'
+                cursor.execute(query, params)
+                if title is not None or completed is not None:
+                    extra = {} if completed is None else {'completed': bool(completed)}
+                    self._update_suggestions('update', 'task', task_id, title, **extra)
+                if completed is not None:
+                    self._update_analytics(task_id)
+            
+            # Если задача завершена, обновляем время абонентского клиента (если еще не обновлено выше)
+            if completed == 1:
+                # Получаем completed_at из обновленной задачи
+                cursor.execute('SELECT completed_at, started_at, project_id FROM tasks WHERE id = ?', (task_id,))
+                result = cursor.fetchone()
+                if result:
+                    completed_at, started_at, project_id = result
+                    if completed_at and started_at:
+                        self._update_subscription_time_on_completion(task_id, completed_at)
     
-    def _sort_regular_tasks(self, tasks):
-        """Сортировка обычных задач"""
-        return self._sort_tasks_by_priority(tasks)
+    @_writes
+    def move_task(self, task_id, prev_id=None, next_id=None):
+        """Переставить задачу вручную после prev_id (или перед next_id) - одна измененная строка.
+        Возвращает новый ранг или None, если задачи нет"""
+        return self._move_ranked('tasks', task_id, prev_id, next_id)
     
-    def _sort_tasks_by_priority(self, tasks):
-        """
-        Сортировка задач по приоритету:
-        1. От старых к новым (created_at ASC)
-        2. Если deadline позволяет, сортировать по цене (price DESC)
-        """
-        from datetime import datetime, date, timedelta
-        
-        today = date.today()
+    @_writes
+    def delete_task(self, task_id):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self._revert_task_stats(cursor, task_id)
+            # Удаляем заметки задачи
+            cursor.execute('DELETE FROM task_notes WHERE task_id = ?', (task_id,))
+            # Удаляем задачу
+            cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+            self._update_suggestions('remove', 'task', task_id)
+            self._update_analytics(task_id)
+    
+    # Массовые операции с задачами: одна транзакция, executemany, побочные эффекты пакетом
+    @_writes
+    def create_tasks(self, project_id, tasks):
+        """Создать несколько задач проекта. tasks: словари с title и необязательными
+        description, deadline, price. Возвращает id созданных задач в порядке tasks"""
+        created_at = datetime.now().isoformat()
+        created_date = migrations.sort_date(created_at)
+        rows = [(project_id, task['title'], task.get('description', ''), created_at, task.get('deadline'),
+                 task.get('price', 0), created_date, migrations.sort_date(task.get('deadline')), created_at)
+                for task in tasks]
+        if not rows:
+            return []
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(TASK_INSERT_SQL, rows)
+            # Строки одного executemany внутри транзакции получают идущие подряд id
+            last_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+            task_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            self._update_suggestions('add_many', [('task', task_id, row[1], {'project_id': project_id, 'completed': False})
+                                                  for task_id, row in zip(task_ids, rows)])
+            self._update_analytics(*task_ids)
+            return task_ids
+    
+    @_writes
+    def update_tasks(self, task_ids, completed=None, deadline=None, started_at=None, price=None, project_id=None):
+        """Одинаково изменить несколько задач: завершить или открыть, перенести в проект
+        project_id, задать срок, цену, таймер (started_at='' - сбросить).
         
-        def get_sort_key(task):
-            # Получаем поля задачи
-            created_at_str = task[4] if len(task) > 4 else ''  # created_at
-            deadline_str = task[6] if len(task) > 6 else ''  # deadline
-            price = float(task[8]) if len(task) > 8 else 0.0  # price
+        Вклад в daily_task_stats и время абонентских проектов считаются для всех задач
+        сразу и записываются executemany. Возвращает id найденных задач.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            rows = self._select_by_ids(cursor, '''
+                SELECT id, project_id, completed, completed_at, started_at, tracked_hours
+                FROM tasks WHERE id IN ({ids})
+            ''', dict.fromkeys(task_ids))
+            if not rows:
+                return []
             
-            # Парсим даты
-            try:
-                created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00')).date() if created_at_str else today
-            except:
-                created_at = today
+            # Значения, одинаковые для всех задач
+            columns = {}
+            if deadline is not None:
+                columns['deadline'] = deadline
+                columns['deadline_date'] = migrations.sort_date(deadline)
+            if started_at is not None:
+                columns['started_at'] = started_at or None
+            if price is not None:
+                columns['price'] = price
+            if project_id is not None:
+                columns['project_id'] = project_id
+            completed_at = datetime.now().isoformat()
+            if completed:
+                # Завершение останавливает таймер; отработанное время у каждой задачи свое
+                columns.update(completed=1, completed_at=completed_at, started_at=None)
+            elif completed is not None:
+                columns.update(completed=0, completed_at=None, tracked_hours=None)
+            if not columns:
+                return [row[0] for row in rows]
+            columns['updated_at'] = completed_at
             
-            deadline = None
-            if deadline_str:
-                try:
-                    deadline = datetime.fromisoformat(deadline_str.replace('Z', '+00:00')).date()
-                except:
-                    try:
-                        deadline = datetime.strptime(deadline_str, '%Y-%m-%d').date()
-                    except:
-                        deadline = None
+            stats = []  # изменения daily_task_stats: (project_id, completed_at, count, hours)
+            subscription_hours = {}  # (project_id, день) -> часы завершенных задач
+            params = []
+            for task_id, old_project_id, was_completed, old_completed_at, old_started_at, old_hours in rows:
+                new_project_id = old_project_id if project_id is None else project_id
+                if was_completed and (completed is not None or project_id is not None):
+                    stats.append((old_project_id, old_completed_at, -1, -(old_hours or 0.0)))
+                values = list(columns.values())
+                if completed:
+                    hours = migrations.tracked_hours(old_started_at, completed_at)
+                    values.append(hours)
+                    stats.append((new_project_id, completed_at, 1, hours))
+                    if old_started_at:
+                        key = (new_project_id, migrations.sort_date(completed_at))
+                        subscription_hours[key] = subscription_hours.get(key, 0.0) + hours
+                elif was_completed and completed is None and project_id is not None:
+                    # Перенос выполненной задачи: ее вклад переходит в новый проект
+                    stats.append((new_project_id, old_completed_at, 1, old_hours or 0.0))
+                params.append(values + [task_id])
             
-            # Определяем, позволяет ли deadline сортировать по цене
-            # Если deadline есть и до него больше 2 дней, можно сортировать по цене
-            can_sort_by_price = False
-            if deadline:
-                days_until_deadline = (deadline - today).days
-                if days_until_deadline > 2:
-                    can_sort_by_price = True
+            assignments = ', '.join(f'{column} = ?' for column in columns)
+            if completed:
+                assignments += ', tracked_hours = ?'
+            cursor.executemany(f'UPDATE tasks SET {assignments} WHERE id = ?', params)
+            self._apply_task_stats_many(cursor, stats)
             
-            # Возвращаем ключ сортировки
-            # Первый приоритет: created_at (старые первыми)
-            # Второй приоритет: если можно по цене, то -price (больше цена = выше), иначе 0
-            return (created_at, -price if can_sort_by_price else 0)
-        
-        return sorted(tasks, key=get_sort_key)
+            if subscription_hours:
+                subscription_projects = {project for project, is_subscription in self._select_by_ids(
+                    cursor, 'SELECT id, is_subscription FROM projects WHERE id IN ({ids})',
+                    {project for project, _ in subscription_hours}) if is_subscription}
+                cursor.executemany(SUBSCRIPTION_TIME_ADD_SQL, [
+                    (project, work_date, hours) for (project, work_date), hours in subscription_hours.items()
+                    if project in subscription_projects])
+            
+            found = [row[0] for row in rows]
+            extra = {}
+            if completed is not None:
+                extra['completed'] = bool(completed)
+            if project_id is not None:
+                extra['project_id'] = project_id
+            if extra:
+                if self.suggestions.loaded:
+                    def update_suggestions():
+                        for task_id in found:
+                            self.suggestions.update('task', task_id, **extra)
+                    self._on_commit(update_suggestions)
+                self._update_analytics(*found)
+            return found
     
-    def update_task(self, task_id, title=None, description=None, completed=None, deadline=None, started_at=None, price=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        updates = []
-        params = []
-        
-        if title is not None:
-            updates.append('title = ?')
-            params.append(title)
-        if description is not None:
-            updates.append('description = ?')
-            params.append(description)
-        if completed is not None:
-            updates.append('completed = ?')
-            params.append(completed)
-            # Если задача завершается, записываем дату завершения
-            if completed == 1:
-                completed_at = datetime.now().isoformat()
-                updates.append('completed_at = ?')
-                params.append(completed_at)
-                # Останавливаем таймер при завершении
-                updates.append('started_at = NULL')
-                # Обновляем время работы с абонентским клиентом
-                self._update_subscription_time_on_completion(task_id, completed_at)
-            # Если задача открывается обратно, очищаем дату завершения
-            elif completed == 0:
-                updates.append('completed_at = NULL')
-        if deadline is not None:
-            updates.append('deadline = ?')
-            params.append(deadline)
-        if started_at is not None:
-            if started_at == '':
-                updates.append('started_at = NULL')
-            else:
-                updates.append('started_at = ?')
-                params.append(started_at)
-        if price is not None:
-            updates.append('price = ?')
-            params.append(price)
-        
-        if updates:
-            params.append(task_id)
-            # Заменяем NULL на None для SQL
-            query = 'UPDATE tasks SET ' + ', '.join(updates) + ' WHERE id = ?'
-            cursor.execute(query, params)
-            conn.commit()
-        
-        # Если задача завершена, обновляем время абонентского клиента (если еще не обновлено выше)
-        if completed == 1:
-            # Получаем completed_at из обновленной задачи
-            cursor.execute('SELECT completed_at, started_at, project_id FROM tasks WHERE id = ?', (task_id,))
-            result = cursor.fetchone()
-            if result:
-                completed_at, started_at, project_id = result
-                if completed_at and started_at:
-                    self._update_subscription_time_on_completion(task_id, completed_at)
+    @_writes
+    def delete_tasks(self, task_ids):
+        """Удалить несколько задач вместе с заметками. Возвращает id удаленных задач"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            rows = self._select_by_ids(cursor, '''
+                SELECT id, project_id, completed, completed_at, tracked_hours
+                FROM tasks WHERE id IN ({ids})
+            ''', dict.fromkeys(task_ids))
+            if not rows:
+                return []
+            self._apply_task_stats_many(cursor, [
+                (project_id, completed_at, -1, -(hours or 0.0))
+                for _, project_id, completed, completed_at, hours in rows if completed])
+            found = [row[0] for row in rows]
+            params = [(task_id,) for task_id in found]
+            cursor.executemany('DELETE FROM task_notes WHERE task_id = ?', params)
+            cursor.executemany('DELETE FROM tasks WHERE id = ?', params)
+            self._update_suggestions('remove_many', [('task', task_id) for task_id in found])
+            self._update_analytics(*found)
+            return found
+    
+    # Методы для статистики (читают предагрегированную daily_task_stats)
+    def query_task_stats(self, date_from, date_to, granularity='day', group_by=None):
+        """Выполненные задачи и часы за период [date_from, date_to] с группировкой по периодам.
+        
+        granularity - ключ STATS_PERIOD_SQL, group_by - ключ STATS_GROUP_SQL.
+        Возвращает строки (период, ключ группы, название группы, количество, часы),
+        только для непустых периодов. Считается в колоночном кэше, если он включен,
+        иначе одним SQL-запросом по daily_task_stats.
+        """
+        if granularity not in STATS_PERIOD_SQL:
+            raise ValueError(f'Неизвестная гранулярность: {granularity}')
+        if group_by not in STATS_GROUP_SQL:
+            raise ValueError(f'Неизвестная группировка: {group_by}')
+        date_from = date.fromisoformat(str(date_from))
+        date_to = date.fromisoformat(str(date_to))
+        
+        engine = self._analytics_cache()
+        if engine is None:
+            return self._query_task_stats_sql(date_from, date_to, granularity, group_by)
+        
+        projects = self._project_stats_info()
+        if group_by == 'project':
+            group_of = lambda project_id: project_id
+            name_of = lambda key: projects.get(key, (None, 0))[0]
+        elif group_by == 'subscription':
+            group_of = lambda project_id: projects.get(project_id, (None, 0))[1]
+            name_of = lambda key: None
+        else:
+            group_of = None
+            name_of = lambda key: None
+        
+        periods = stats_periods(date_from, date_to, granularity)
+        groups, counts, hours = engine.period_stats(date_from, date_to, [start for _, start in periods], group_of)
+        # Ненулевые ячейки в порядке (период, группа) - как ORDER BY в SQL
+        period_index, group_index = counts.T.nonzero()
+        return [(periods[p][0], groups[g], name_of(groups[g]), int(counts[g, p]), float(hours[g, p]))
+                for p, g in zip(period_index.tolist(), group_index.tolist())]
+    
+    def _query_task_stats_sql(self, date_from, date_to, granularity, group_by):
+        period = STATS_PERIOD_SQL[granularity]
+        group_key, group_name = STATS_GROUP_SQL[group_by]
         
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {period} AS period, {group_key} AS group_key, {group_name},
+                       SUM(s.completed_count), SUM(s.tracked_hours)
+                FROM daily_task_stats s
+                LEFT JOIN projects p ON p.id = s.project_id
+                WHERE s.stat_date BETWEEN ? AND ?
+                GROUP BY period, group_key
+                ORDER BY period, group_key
+            ''', (str(date_from), str(date_to)))
+            return cursor.fetchall()
     
-    def delete_task(self, task_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        # Удаляем заметки задачи
-        cursor.execute('DELETE FROM task_notes WHERE task_id = ?', (task_id,))
-        # Удаляем задачу
-        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        conn.commit()
-        conn.close()
+    def _project_stats_info(self):
+        """{id проекта: (название, абонентский 0/1)}"""
+        with self.connection() as conn:
+            return {project_id: (name, is_subscription) for project_id, name, is_subscription
+                    in conn.execute('SELECT id, name, COALESCE(is_subscription, 0) FROM projects')}
+    
+    def get_task_stats_by_project(self):
+        """Статистика по проектам: (id, название, выполнено, всего задач, часы)"""
+        engine = self._analytics_cache()
+        if engine is not None:
+            projects = self._project_stats_info()
+            project_ids, completed, total, hours = engine.project_stats()
+            return [(project_id, projects[project_id][0], done, count, tracked)
+                    for project_id, done, count, tracked
+                    in zip(project_ids.tolist(), completed.tolist(), total.tolist(), hours.tolist())
+                    if project_id in projects]
+        return self._get_task_stats_by_project_sql()
+    
+    def _get_task_stats_by_project_sql(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT p.id, p.name, COALESCE(s.completed, 0), c.total, COALESCE(s.hours, 0)
+                FROM (SELECT project_id, COUNT(*) AS total FROM tasks GROUP BY project_id) c
+                JOIN projects p ON p.id = c.project_id
+                LEFT JOIN (
+                    SELECT project_id, SUM(completed_count) AS completed, SUM(tracked_hours) AS hours
+                    FROM daily_task_stats
+                    GROUP BY project_id
+                ) s ON s.project_id = c.project_id
+            ''')
+            return cursor.fetchall()
+    
+    def count_open_tasks(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM tasks WHERE completed = 0')
+            return cursor.fetchone()[0]
     
     # Методы для работы с заметками
     def get_note(self, project_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, content FROM notes
-            WHERE project_id = ?
-            LIMIT 1
-        ''', (project_id,))
-        note = cursor.fetchone()
-        conn.close()
-        return note
-    
-    def save_note(self, project_id, content):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        
-        # Проверяем, существует ли уже заметка для этого проекта
-        existing = self.get_note(project_id)
-        
-        if existing:
+        with self.connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
-                UPDATE notes
-                SET content = ?, updated_at = ?
+                SELECT id, content FROM notes
                 WHERE project_id = ?
-            ''', (content, now, project_id))
-        else:
-            cursor.execute('''
-                INSERT INTO notes (project_id, content, created_at, updated_at)
-                VALUES (?, ?, ?, ?)
-            ''', (project_id, content, now, now))
-        
-        conn.commit()
-        conn.close()
+                LIMIT 1
+            ''', (project_id,))
+            note = cursor.fetchone()
+            return note
+    
+    @_writes
+    def save_note(self, project_id, content):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            
+            # Проверяем, существует ли уже заметка для этого проекта
+            existing = self.get_note(project_id)
+            
+            if existing:
+                cursor.execute('''
+                    UPDATE notes
+                    SET content = ?, updated_at = ?
+                    WHERE project_id = ?
+                ''', (content, now, project_id))
+            else:
+                cursor.execute('''
+                    INSERT INTO notes (project_id, content, created_at, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (project_id, content, now, now))
     
     # Методы для работы с заметками задач
     def get_task_note(self, task_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, content FROM task_notes
-            WHERE task_id = ?
-            LIMIT 1
-        ''', (task_id,))
-        note = cursor.fetchone()
-        conn.close()
-        return note
-    
-    def save_task_note(self, task_id, content):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        
-        # Проверяем, существует ли уже заметка для этой задачи
-        existing = self.get_task_note(task_id)
-        
-        if existing:
+        with self.connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
-                UPDATE task_notes
-                SET content = ?, updated_at = ?
+                SELECT id, content FROM task_notes
                 WHERE task_id = ?
-            ''', (content, now, task_id))
-        else:
-            cursor.execute('''
-                INSERT INTO task_notes (task_id, content, created_at, updated_at)
-                VALUES (?, ?, ?, ?)
-            ''', (task_id, content, now, now))
-        
-        conn.commit()
-        conn.close()
+                LIMIT 1
+            ''', (task_id,))
+            note = cursor.fetchone()
+            return note
+    
+    @_writes
+    def save_task_note(self, task_id, content):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            
+            # Проверяем, существует ли уже заметка для этой задачи
+            existing = self.get_task_note(task_id)
+            
+            if existing:
+                cursor.execute('''
+                    UPDATE task_notes
+                    SET content = ?, updated_at = ?
+                    WHERE task_id = ?
+                ''', (content, now, task_id))
+            else:
+                cursor.execute('''
+                    INSERT INTO task_notes (task_id, content, created_at, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (task_id, content, now, now))
     
     # Методы для работы с состоянием UI
     def get_ui_state(self, key, default_value='0'):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
+        with self.connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('SELECT value FROM ui_state WHERE key = ?', (key,))
             result = cursor.fetchone()
             return result[0] if result else default_value
-        except sqlite3.OperationalError as e:
-            # Если таблица не существует, создаем её
-            if 'no such table' in str(e).lower():
-                self.init_database()
-                return default_value
-            raise
-        finally:
-            conn.close()
     
+    @_writes
     def set_ui_state(self, key, value):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
+        with self.connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO ui_state (key, value)
                 VALUES (?, ?)
             ''', (key, str(value)))
-            conn.commit()
-        except sqlite3.OperationalError as e:
-            # Если таблица не существует, создаем её и повторяем попытку
-            if 'no such table' in str(e).lower():
-                conn.rollback()
-                self.init_database()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO ui_state (key, value)
-                    VALUES (?, ?)
-                ''', (key, str(value)))
-                conn.commit()
-            else:
-                raise
-        finally:
-            conn.close()
+    
+    # Помидоро: одна строка pomodoro_state, общая для всех процессов, и история pomodoro_sessions
+    def get_pomodoro(self, now=None):
+        """Состояние помидоро: (state, time_left, work_count, started_at).
+        У идущего таймера time_left выводится из момента started_at (секунды epoch),
+        поэтому чтение ничего не записывает"""
+        now = time.time() if now is None else now
+        with self.connection() as conn:
+            row = conn.execute('SELECT state, time_left, work_count, started_at FROM pomodoro_state WHERE id = 1').fetchone()
+        if row is None:
+            return 'idle', POMODORO_WORK_SECONDS, 0, None
+        state, time_left, work_count, started_at = row
+        if state in POMODORO_RUNNING_STATES and started_at is not None:
+            time_left = max(0, time_left - int(now - started_at))
+        return state, time_left, work_count, started_at
+    
+    @_writes
+    def save_pomodoro(self, state, time_left, work_count, now=None):
+        """Записать состояние клиента: time_left - оставшееся на момент запроса время,
+        отсчет идет по часам сервера. Совпадающее с текущим состояние (периодические
+        сохранения идущего таймера) не записывается. Возвращает True, если состояние изменилось"""
+        now = time.time() if now is None else now
+        with self.connection() as conn:
+            old_state, old_left, old_count, _ = self.get_pomodoro(now)
+            if state == old_state and work_count == old_count and abs(time_left - old_left) <= POMODORO_DRIFT_SECONDS:
+                return False
+            timestamp = datetime.fromtimestamp(now).isoformat()
+            conn.execute('''
+                INSERT OR REPLACE INTO pomodoro_state (id, state, time_left, work_count, started_at, updated_at)
+                VALUES (1, ?, ?, ?, ?, ?)
+            ''', (state, time_left, work_count, now, timestamp))
+            self._record_pomodoro_session(conn, state, work_count != old_count, timestamp)
+            return True
+    
+    def _record_pomodoro_session(self, conn, state, new_count, timestamp):
+        """История сессий: переход в work или break открывает сессию, переход к следующей
+        сессии или остановка (idle) закрывает открытую. Пауза сессию не прерывает"""
+        if state not in POMODORO_RUNNING_STATES and state != 'idle':
+            return
+        row = conn.execute('SELECT kind FROM pomodoro_sessions WHERE ended_at IS NULL ORDER BY id DESC LIMIT 1').fetchone()
+        starts = state in POMODORO_RUNNING_STATES and (row is None or row[0] != state or new_count)
+        if row is not None and (starts or state == 'idle'):
+            # Сессия завершена, если таймер перешел к следующей, и прервана, если его остановили
+            conn.execute('UPDATE pomodoro_sessions SET ended_at = ?, completed = ? WHERE ended_at IS NULL',
+                         (timestamp, 0 if state == 'idle' else 1))
+        if starts:
+            conn.execute('INSERT INTO pomodoro_sessions (kind, started_at) VALUES (?, ?)', (state, timestamp))
+    
+    def get_pomodoro_sessions(self, limit=50):
+        """Последние сессии помидоро: (id, kind, started_at, ended_at, completed), новые первыми"""
+        with self.connection() as conn:
+            return conn.execute('''
+                SELECT id, kind, started_at, ended_at, completed FROM pomodoro_sessions
+                ORDER BY id DESC LIMIT ?
+            ''', (limit,)).fetchall()
     
     # Глобальный поиск по задачам
-    def search_tasks(self, query):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        search_term = f'%{query}%'
-        cursor.execute('''
-            SELECT t.id, t.project_id, t.title, t.description, t.completed, p.name as project_name
-            FROM tasks t
-            JOIN projects p ON t.project_id = p.id
-            WHERE t.title LIKE ? OR t.description LIKE ?
-            ORDER BY t.created_at DESC
-        ''', (search_term, search_term))
-        tasks = cursor.fetchall()
-        conn.close()
-        return tasks
+    def search_tasks(self, query, limit=None, offset=0):
+        """Поиск задач по названию и описанию.
+        
+        С FTS5 результаты ранжируются по bm25 (совпадение в названии весит больше),
+        без него - подстрочный поиск LIKE, новые задачи первыми.
+        Кортеж: (id, project_id, title, description, completed, project_name,
+                 created_at, completed_at, deadline, started_at, price, snippet)
+        snippet - фрагмент с совпадением, выделенным тегами <mark>, или None.
+        """
+        terms = _fts_terms(query)
+        params = {'limit': -1 if limit is None else limit, 'offset': offset}
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if terms and self.fts_enabled:
+                params['match'] = terms
+                cursor.execute('''
+                    SELECT t.id, t.project_id, t.title, t.description, t.completed, p.name as project_name,
+                           t.created_at, t.completed_at, t.deadline,
+                           COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
+                           snippet(tasks_fts, -1, '<mark>', '</mark>', '…', 16) as snippet
+                    FROM tasks_fts
+                    JOIN tasks t ON t.id = tasks_fts.rowid
+                    JOIN projects p ON t.project_id = p.id
+                    WHERE tasks_fts MATCH :match
+                    ORDER BY bm25(tasks_fts, 10.0, 1.0), t.id DESC
+                    LIMIT :limit OFFSET :offset
+                ''', params)
+            else:
+                params['like'] = f'%{query}%'
+                cursor.execute('''
+                    SELECT t.id, t.project_id, t.title, t.description, t.completed, p.name as project_name,
+                           t.created_at, t.completed_at, t.deadline,
+                           COALESCE(t.started_at, '') as started_at, COALESCE(t.price, 0) as price,
+                           NULL as snippet
+                    FROM tasks t
+                    JOIN projects p ON t.project_id = p.id
+                    WHERE t.title LIKE :like OR t.description LIKE :like
+                    ORDER BY t.created_at DESC
+                    LIMIT :limit OFFSET :offset
+                ''', params)
+            tasks = cursor.fetchall()
+            return tasks
     
     # Методы для работы с паролями
+    @_writes
     def create_password(self, project_id, name, type='website', username='', password='', url='', notes=''):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        cursor.execute('''
-            INSERT INTO passwords (project_id, name, type, username, password, url, notes, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (project_id, name, type, username, password, url, notes, now, now))
-        conn.commit()
-        password_id = cursor.lastrowid
-        conn.close()
-        return password_id
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute('''
+                INSERT INTO passwords (project_id, name, type, username, password, url, notes, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (project_id, name, type, username, password, url, notes, now, now))
+            password_id = cursor.lastrowid
+            return password_id
     
     def get_passwords(self, project_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, name, type, username, password, url, notes
-            FROM passwords
-            WHERE project_id = ?
-            ORDER BY created_at DESC
-        ''', (project_id,))
-        passwords = cursor.fetchall()
-        conn.close()
-        return passwords
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, name, type, username, password, url, notes
+                FROM passwords
+                WHERE project_id = ?
+                ORDER BY created_at DESC
+            ''', (project_id,))
+            passwords = cursor.fetchall()
+            return passwords
     
     def get_all_passwords(self):
         """Получить все пароли из всех проектов"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        return list(self.iter_all_passwords())
+    
+    def iter_all_passwords(self):
+        """Потоковый вариант get_all_passwords"""
+        return self._iter_rows('''
             SELECT p.id, p.name, p.type, p.username, p.password, p.url, p.notes, 
                    p.project_id, pr.name as project_name
             FROM passwords p
             LEFT JOIN projects pr ON p.project_id = pr.id
-            ORDER BY p.created_at DESC
+            ORDER BY p.created_at DESC, p.id DESC
         ''')
-        passwords = cursor.fetchall()
-        conn.close()
-        return passwords
     
     def get_password(self, password_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, project_id, name, type, username, password, url, notes
-            FROM passwords
-            WHERE id = ?
-        ''', (password_id,))
-        password = cursor.fetchone()
-        conn.close()
-        return password
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, project_id, name, type, username, password, url, notes
+                FROM passwords
+                WHERE id = ?
+            ''', (password_id,))
+            password = cursor.fetchone()
+            return password
     
+    @_writes
     def update_password(self, password_id, name=None, type=None, username=None, password=None, url=None, notes=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        updates = []
-        params = []
-        now = datetime.now().isoformat()
-        
-        if name is not None:
-            updates.append('name = ?')
-            params.append(name)
-        if type is not None:
-            updates.append('type = ?')
-            params.append(type)
-        if username is not None:
-            updates.append('username = ?')
-            params.append(username)
-        if password is not None:
-            updates.append('password = ?')
-            params.append(password)
-        if url is not None:
-            updates.append('url = ?')
-            params.append(url)
-        if notes is not None:
-            updates.append('notes = ?')
-            params.append(notes)
-        
-        if updates:
-            updates.append('updated_at = ?')
-            params.append(now)
-            params.append(password_id)
-            cursor.execute(f'''
-                UPDATE passwords
-                SET {', '.join(updates)}
-                WHERE id = ?
-            ''', params)
-            conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            updates = []
+            params = []
+            now = datetime.now().isoformat()
+            
+            if name is not None:
+                updates.append('name = ?')
+                params.append(name)
+            if type is not None:
+                updates.append('type = ?')
+                params.append(type)
+            if username is not None:
+                updates.append('username = ?')
+                params.append(username)
+            if password is not None:
+                updates.append('password = ?')
+                params.append(password)
+            if url is not None:
+                updates.append('url = ?')
+                params.append(url)
+            if notes is not None:
+                updates.append('notes = ?')
+                params.append(notes)
+            
+            if updates:
+                updates.append('updated_at = ?')
+                params.append(now)
+                params.append(password_id)
+                cursor.execute(f'''
+                    UPDATE passwords
+                    SET {', '.join(updates)}
+                    WHERE id = ?
+                ''', params)
     
+    @_writes
     def delete_password(self, password_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM passwords WHERE id = ?', (password_id,))
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM passwords WHERE id = ?', (password_id,))
     
     # Методы для работы с общими заметками (ежедневник)
     def get_all_daily_notes(self):
         """Получить все заметки ежедневника"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, title, content, created_at, updated_at FROM daily_notes ORDER BY updated_at DESC')
-        notes = cursor.fetchall()
-        conn.close()
-        return notes
+        return list(self.iter_all_daily_notes())
+    
+    def iter_all_daily_notes(self):
+        """Потоковый вариант get_all_daily_notes"""
+        return self._iter_rows('SELECT id, title, content, created_at, updated_at FROM daily_notes '
+                              'ORDER BY updated_at DESC, id DESC')
     
     def get_daily_note(self, note_id):
         """Получить конкретную заметку ежедневника"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, title, content, created_at, updated_at FROM daily_notes WHERE id = ?', (note_id,))
-        note = cursor.fetchone()
-        conn.close()
-        return note
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, title, content, created_at, updated_at FROM daily_notes WHERE id = ?', (note_id,))
+            note = cursor.fetchone()
+            return note
     
+    @_writes
     def create_daily_note(self, title, content=''):
         """Создать новую заметку ежедневника"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        cursor.execute('''
-            INSERT INTO daily_notes (title, content, created_at, updated_at)
-            VALUES (?, ?, ?, ?)
-        ''', (title, content, now, now))
-        conn.commit()
-        note_id = cursor.lastrowid
-        conn.close()
-        return note_id
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute('''
+                INSERT INTO daily_notes (title, content, created_at, updated_at)
+                VALUES (?, ?, ?, ?)
+            ''', (title, content, now, now))
+            note_id = cursor.lastrowid
+            self._update_suggestions('add', 'daily_note', note_id, title)
+            return note_id
     
+    @_writes
     def update_daily_note(self, note_id, title=None, content=None):
         """Обновить заметку ежедневника"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        updates = []
-        params = []
-        
-        if title is not None:
-            updates.append('title = ?')
-            params.append(title)
-        if content is not None:
-            updates.append('content = ?')
-            params.append(content)
-        
-        if updates:
-            updates.append('updated_at = ?')
-            params.append(now)
-            params.append(note_id)
-            cursor.execute(f'''
-                UPDATE daily_notes
-                SET {', '.join(updates)}
-                WHERE id = ?
-            ''', params)
-            conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            updates = []
+            params = []
+            
+            if title is not None:
+                updates.append('title = ?')
+                params.append(title)
+            if content is not None:
+                updates.append('content = ?')
+                params.append(content)
+            
+            if updates:
+                updates.append('updated_at = ?')
+                params.append(now)
+                params.append(note_id)
+                cursor.execute(f'''
+                    UPDATE daily_notes
+                    SET {', '.join(updates)}
+                    WHERE id = ?
+                ''', params)
+                if title is not None:
+                    self._update_suggestions('update', 'daily_note', note_id, title)
     
+    @_writes
     def delete_daily_note(self, note_id):
         """Удалить заметку ежедневника"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM daily_notes WHERE id = ?', (note_id,))
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM daily_notes WHERE id = ?', (note_id,))
+            self._update_suggestions('remove', 'daily_note', note_id)
     
     # Методы для работы с событиями календаря
     def get_calendar_events(self, date=None):
         """Получить события календаря. Если date указан, возвращает события на эту дату"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        return list(self.iter_calendar_events(date))
+    
+    def iter_calendar_events(self, date=None):
+        """Потоковый вариант get_calendar_events"""
         if date:
-            cursor.execute('''
+            return self._iter_rows('''
                 SELECT id, title, description, event_date, event_time, created_at, updated_at
                 FROM calendar_events
                 WHERE event_date = ?
-                ORDER BY COALESCE(event_time, '00:00') ASC
+                ORDER BY COALESCE(event_time, '00:00') ASC, id ASC
             ''', (date,))
-        else:
-            cursor.execute('''
-                SELECT id, title, description, event_date, event_time, created_at, updated_at
-                FROM calendar_events
-                ORDER BY event_date ASC, COALESCE(event_time, '00:00') ASC
-            ''')
-        events = cursor.fetchall()
-        conn.close()
-        return events
+        return self._iter_rows('''
+            SELECT id, title, description, event_date, event_time, created_at, updated_at
+            FROM calendar_events
+            ORDER BY event_date ASC, COALESCE(event_time, '00:00') ASC, id ASC
+        ''')
     
+    @_writes
     def create_calendar_event(self, title, event_date, description='', event_time=None):
         """Создать новое событие календаря"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        cursor.execute('''
-            INSERT INTO calendar_events (title, description, event_date, event_time, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (title, description, event_date, event_time, now, now))
-        conn.commit()
-        event_id = cursor.lastrowid
-        conn.close()
-        return event_id
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute('''
+                INSERT INTO calendar_events (title, description, event_date, event_time, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (title, description, event_date, event_time, now, now))
+            event_id = cursor.lastrowid
+            self._update_suggestions('add', 'event', event_id, title, {'event_date': event_date})
+            return event_id
     
+    @_writes
     def update_calendar_event(self, event_id, title=None, description=None, event_date=None, event_time=None):
         """Обновить событие календаря"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        updates = []
-        params = []
-        
-        if title is not None:
-            updates.append('title = ?')
-            params.append(title)
-        if description is not None:
-            updates.append('description = ?')
-            params.append(description)
-        if event_date is not None:
-            updates.append('event_date = ?')
-            params.append(event_date)
-        if event_time is not None:
-            updates.append('event_time = ?')
-            params.append(event_time)
-        
-        if updates:
-            updates.append('updated_at = ?')
-            params.append(now)
-            params.append(event_id)
-            cursor.execute(f'''
-                UPDATE calendar_events
-                SET {', '.join(updates)}
-                WHERE id = ?
-            ''', params)
-            conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            updates = []
+            params = []
+            
+            if title is not None:
+                updates.append('title = ?')
+                params.append(title)
+            if description is not None:
+                updates.append('description = ?')
+                params.append(description)
+            if event_date is not None:
+                updates.append('event_date = ?')
+                params.append(event_date)
+            if event_time is not None:
+                updates.append('event_time = ?')
+                params.append(event_time)
+            
+            if updates:
+                updates.append('updated_at = ?')
+                params.append(now)
+                params.append(event_id)
+                cursor.execute(f'''
+                    UPDATE calendar_events
+                    SET {', '.join(updates)}
+                    WHERE id = ?
+                ''', params)
+                if title is not None or event_date is not None:
+                    extra = {} if event_date is None else {'event_date': event_date}
+                    self._update_suggestions('update', 'event', event_id, title, **extra)
     
+    @_writes
     def delete_calendar_event(self, event_id):
         """Удалить событие календаря"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM calendar_events WHERE id = ?', (event_id,))
-        conn.commit()
-        conn.close()
-
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM calendar_events WHERE id = ?', (event_id,))
+            self._update_suggestions('remove', 'event', event_id)
+    
+    # Дельта-синхронизация по журналу sync_log (migrations._sync_log)
+    def get_sync_cursor(self):
+        """Текущая позиция журнала изменений: с нее клиент продолжает синхронизацию"""
+        with self.connection() as conn:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM sync_log').fetchone()[0]
+    
+    def get_changed_entities(self, since):
+        """Позиция журнала и таблицы, измененные после since (без чтения самих строк)"""
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT entity, MAX(seq) FROM sync_log WHERE seq > ? GROUP BY entity ORDER BY entity
+            ''', (since,)).fetchall()
+        return max((row[1] for row in rows), default=since), [row[0] for row in rows]
+    
+    def get_changes(self, since=0, limit=1000):
+        """Изменения после позиции since: не больше limit записей журнала.
+        
+        Возвращает (cursor, more, changed, deleted): cursor - позиция для следующего
+        запроса, more - в журнале остались записи после cursor, changed - {таблица:
+        строки с колонками SYNC_COLUMNS}, deleted - {таблица: id удаленных строк}.
+        Журнал и строки читаются в одной транзакции, поэтому строки соответствуют cursor.
+        """
+        with self.connection() as conn:
+            if not conn.in_transaction:
+                conn.execute('BEGIN')
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT seq, entity, entity_id, deleted FROM sync_log
+                WHERE seq > ? ORDER BY seq LIMIT ?
+            ''', (since, limit + 1))
+            entries = cursor.fetchall()
+            more = len(entries) > limit
+            entries = entries[:limit]
+            
+            changed_ids = {}
+            deleted = {}
+            for _, entity, entity_id, is_deleted in entries:
+                if entity not in SYNC_COLUMNS:
+                    continue
+                (deleted if is_deleted else changed_ids).setdefault(entity, []).append(entity_id)
+            changed = {}
+            for entity, ids in changed_ids.items():
+                columns = ', '.join(SYNC_COLUMNS[entity])
+                changed[entity] = self._select_by_ids(cursor, f'SELECT {columns} FROM {entity} WHERE id IN ({{ids}})', ids)
+            return (entries[-1][0] if entries else since), more, changed, deleted
@@ -0,0 +1,185 @@
+"""
+Серверные события (Server-Sent Events) вместо опросов с клиента.
+
+Клиент держит одно соединение GET /api/events и получает события по мере
+их появления: смену состояния помидоро, изменения данных, версию приложения.
+Пока событий нет, раз в HEARTBEAT_INTERVAL секунд уходит комментарий-пульс:
+он не дает прокси закрыть простаивающее соединение и позволяет серверу
+заметить отключившегося клиента.
+
+Каждое событие получает id вида <запуск>-<номер>. При переподключении браузер
+присылает последний полученный id в заголовке Last-Event-ID, и брокер
+досылает пропущенные события из истории последних HISTORY_SIZE событий.
+Если пропущенное уже вытеснено из истории или сервер перезапущен (другой
+<запуск>), клиент получает событие reset и перечитывает данные целиком.
+
+Изменения, сделанные другими процессами сервера, брокер видит через
+наблюдателей (watch): функции, которые фоновый поток вызывает раз
+в POLL_INTERVAL секунд, пока есть хотя бы один подписчик.
+"""
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+# Период пульса для простаивающих соединений, секунды
+HEARTBEAT_INTERVAL = 15
+
+# Пауза перед переподключением, которую браузер берет из поля retry:, миллисекунды
+RETRY_MS = 3000
+
+# Сколько последних событий хранится для досылки по Last-Event-ID
+HISTORY_SIZE = 256
+
+# Неотправленные события одного подписчика; медленный клиент отключается
+# и догоняет по Last-Event-ID после переподключения
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Период опроса наблюдателей, секунды
+POLL_INTERVAL = 1.0
+
+
+def format_event(event, data, event_id=None):
+    """Событие в формате text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    lines.extend(f'data: {line}' for line in payload.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+class _Subscriber:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.closed = False
+
+
+class EventBroker:
+    """Рассылка событий подписчикам одного процесса с историей для переподключений"""
+    
+    def __init__(self, history_size=HISTORY_SIZE, heartbeat=HEARTBEAT_INTERVAL, poll_interval=POLL_INTERVAL):
+        self.history_size = history_size
+        self.heartbeat = heartbeat
+        self.poll_interval = poll_interval
+        self._watchers = []
+        self._reset()
+    
+    def _reset(self):
+        # Метка запуска: номера событий после перезапуска начинаются заново, а у каждого
+        # процесса сервера своя нумерация
+        self.boot = f'{os.getpid():x}.{int(time.time() * 1000):x}'
+        self._numbers = itertools.count(1)
+        self._history = deque(maxlen=self.history_size)  # (номер, отформатированное событие)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+    
+    def reset_after_fork(self):
+        """Начать заново в дочернем процессе: своя метка запуска, без подписчиков и потока
+        наблюдателей родителя (наблюдатели сохраняются). Клиент, переподключившийся
+        к другому воркеру, получит reset"""
+        self._reset()
+    
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+    
+    def publish(self, event, data):
+        """Разослать событие всем подписчикам и запомнить его в истории"""
+        with self._lock:
+            number = next(self._numbers)
+            message = format_event(event, data, f'{self.boot}-{number}')
+            self._history.append((number, message))
+            for subscriber in list(self._subscribers):
+                if subscriber.queue.qsize() >= SUBSCRIBER_QUEUE_SIZE:
+                    # Клиент не успевает читать: закрываем поток, пропущенное он получит из истории
+                    self._subscribers.discard(subscriber)
+                    subscriber.closed = True
+                    subscriber.queue.put(None)
+                else:
+                    subscriber.queue.put(message)
+    
+    def _missed(self, last_event_id):
+        """События после last_event_id или None, если их уже нельзя досылать"""
+        boot, _, number = (last_event_id or '').partition('-')
+        if boot != self.boot or not number.isdigit():
+            return None
+        number = int(number)
+        if self._history and self._history[0][0] > number + 1:
+            return None
+        return [message for n, message in self._history if n > number]
+    
+    def subscribe(self, last_event_id=None):
+        """Новый подписчик и события, которые нужно отправить ему сразу"""
+        subscriber = _Subscriber()
+        with self._lock:
+            backlog = []
+            if last_event_id:
+                missed = self._missed(last_event_id)
+                if missed is None:
+                    backlog.append(format_event('reset', {}))
+                else:
+                    backlog.extend(missed)
+            self._subscribers.add(subscriber)
+            self._start_watching()
+            self._wakeup.notify_all()
+        return subscriber, backlog
+    
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            subscriber.closed = True
+    
+    def stream(self, last_event_id=None, hello=None):
+        """Генератор text/event-stream для одного клиента. hello - данные события
+        hello, которое отправляется первым (без id: на Last-Event-ID оно не влияет)"""
+        subscriber, backlog = self.subscribe(last_event_id)
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            if hello is not None:
+                yield format_event('hello', hello)
+            for message in backlog:
+                yield message
+            while not subscriber.closed:
+                try:
+                    message = subscriber.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+    
+    def watch(self, check):
+        """Добавить наблюдателя: check() вызывается фоновым потоком раз в poll_interval
+        секунд, пока есть подписчики, и сам публикует найденные изменения"""
+        with self._lock:
+            self._watchers.append(check)
+            self._start_watching()
+    
+    def _start_watching(self):
+        if self._thread is None and self._watchers and self._subscribers:
+            self._thread = threading.Thread(target=self._watch_loop, name='event-watchers', daemon=True)
+            self._thread.start()
+    
+    def _watch_loop(self):
+        while True:
+            with self._lock:
+                # Без подписчиков поток спит до первого subscribe
+                while not self._subscribers:
+                    self._wakeup.wait()
+                watchers = list(self._watchers)
+            for check in watchers:
+                try:
+                    check()
+                except Exception as e:
+                    print(f"Ошибка наблюдателя событий: {e}")
+            time.sleep(self.poll_interval)
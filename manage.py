@@ -0,0 +1,128 @@
+"""
+Служебные команды для базы данных планировщика
+
+Использование:
+    python manage.py check-indexes [--db planner.db]
+    python manage.py rebuild-stats [--db planner.db]
+    python manage.py bench-analytics [--db planner.db]
+    python manage.py rebalance-ranks [--db planner.db]
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from database import Database
+
+
+def check_indexes(db):
+    """Проверить, что запросы из INDEXED_QUERIES используют индексы"""
+    failed = 0
+    for result in db.explain_query_plans():
+        status = 'OK  ' if not result['full_scans'] else 'SCAN'
+        if result['full_scans']:
+            failed += 1
+        print(f"[{status}] {result['method']}: {result['sql']}")
+        for step in result['plan']:
+            print(f"         {step}")
+    if failed:
+        print(f"Запросов с полным сканированием таблиц: {failed}")
+        return 1
+    print('Все проверенные запросы используют индексы')
+    return 0
+
+
+def rebuild_stats(db):
+    """Пересобрать сводную статистику daily_task_stats по истории задач"""
+    db.rebuild_task_stats()
+    print('Статистика пересобрана')
+    return 0
+
+
+def _same_stats(expected, actual):
+    """Строки статистики совпадают (часы - с точностью до погрешности суммирования)"""
+    return len(expected) == len(actual) and all(
+        tuple(a[:-1]) == tuple(b[:-1]) and abs(a[-1] - b[-1]) < 1e-6
+        for a, b in zip(expected, actual))
+
+
+def _median_ms(func, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def bench_analytics(db):
+    """Сравнить колоночный кэш статистики (NumPy) с SQL по daily_task_stats: результаты и время"""
+    if db.analytics is None:
+        print('NumPy не установлен - колоночный кэш статистики недоступен')
+        return 1
+    
+    started = time.perf_counter()
+    db._analytics_cache()
+    print(f"Загрузка кэша: {(time.perf_counter() - started) * 1000:.1f} мс")
+    
+    today = date.today()
+    month_index = today.year * 12 + today.month - 1 - 11
+    cases = [
+        ('dailyStats', today - timedelta(days=29), 'day', None),
+        ('weeklyStats', today - timedelta(days=today.weekday(), weeks=11), 'week', None),
+        ('monthlyStats', date(month_index // 12, month_index % 12 + 1, 1), 'month', None),
+        ('по дням за 5 лет, по проектам', today - timedelta(days=5 * 365), 'day', 'project'),
+        ('по месяцам за 5 лет, абонентские', today - timedelta(days=5 * 365), 'month', 'subscription'),
+        ('по годам за все время, по проектам', date(2000, 1, 1), 'year', 'project'),
+    ]
+    benches = [(name, lambda f=date_from, g=granularity, b=group_by: db._query_task_stats_sql(f, today, g, b),
+                lambda f=date_from, g=granularity, b=group_by: db.query_task_stats(f, today, g, b))
+               for name, date_from, granularity, group_by in cases]
+    benches.append(('projectStats', lambda: sorted(db._get_task_stats_by_project_sql()),
+                    lambda: sorted(db.get_task_stats_by_project())))
+    
+    mismatches = 0
+    for name, sql_query, columnar_query in benches:
+        same = _same_stats(sql_query(), columnar_query())
+        if not same:
+            mismatches += 1
+        print(f"[{'OK  ' if same else 'DIFF'}] {name}: SQL {_median_ms(sql_query):.2f} мс, "
+              f"NumPy {_median_ms(columnar_query):.2f} мс")
+    if mismatches:
+        print(f"Расхождений с SQL: {mismatches}")
+        return 1
+    return 0
+
+
+def rebalance_ranks(db):
+    """Раздать проектам и задачам равномерные короткие ранги ручной сортировки"""
+    db.rebalance_ranks()
+    print('Ранги перебалансированы')
+    return 0
+
+
+COMMANDS = {
+    'check-indexes': check_indexes,
+    'rebuild-stats': rebuild_stats,
+    'bench-analytics': bench_analytics,
+    'rebalance-ranks': rebalance_ranks,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Служебные команды планировщика')
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--db', default='planner.db', help='путь к файлу базы данных')
+    args = parser.parse_args(argv)
+    
+    # Колоночный кэш статистики нужен только для его замера
+    db = Database(args.db, use_analytics=args.command == 'bench-analytics')
+    try:
+        return COMMANDS[args.command](db)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
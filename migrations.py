@@ -0,0 +1,466 @@
+"""
+Версионированные миграции схемы базы данных.
+
+Текущая версия схемы хранится в PRAGMA user_version. При старте применяются
+только недостающие шаги - в одной транзакции; если схема актуальна,
+никакого DDL не выполняется.
+"""
+import ranking
+
+
+def _columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _add_column(cursor, table, column, definition):
+    """Добавить колонку, если ее еще нет. Возвращает True, если колонка добавлена"""
+    if column in _columns(cursor, table):
+        return False
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+
+def _initial_schema(cursor):
+    """Базовая схема: таблицы и колонки, которые раньше досоздавались при каждом запуске"""
+    # Таблица проектов
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            monthly_price REAL DEFAULT 0,
+            is_subscription INTEGER DEFAULT 0,
+            payment_date TEXT,
+            sort_order INTEGER DEFAULT 0
+        )
+    ''')
+    
+    # Таблица задач
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            completed INTEGER DEFAULT 0,
+            created_at TEXT NOT NULL,
+            completed_at TEXT,
+            deadline TEXT,
+            price REAL DEFAULT 0,
+            FOREIGN KEY (project_id) REFERENCES projects (id)
+        )
+    ''')
+    
+    # Колонки, появившиеся в старых версиях приложения
+    _add_column(cursor, 'tasks', 'completed_at', 'TEXT')
+    _add_column(cursor, 'tasks', 'deadline', 'TEXT')
+    _add_column(cursor, 'tasks', 'started_at', 'TEXT')
+    _add_column(cursor, 'tasks', 'price', 'REAL DEFAULT 0')
+    _add_column(cursor, 'projects', 'monthly_price', 'REAL DEFAULT 0')
+    _add_column(cursor, 'projects', 'is_subscription', 'INTEGER DEFAULT 0')
+    _add_column(cursor, 'projects', 'payment_date', 'TEXT')
+    if _add_column(cursor, 'projects', 'sort_order', 'INTEGER DEFAULT 0'):
+        # Устанавливаем порядок для существующих проектов
+        cursor.execute('UPDATE projects SET sort_order = id WHERE sort_order = 0 OR sort_order IS NULL')
+    
+    # Таблица для отслеживания времени работы с абонентскими клиентами за день
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_subscription_time (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            work_date TEXT NOT NULL,
+            hours_worked REAL DEFAULT 0,
+            FOREIGN KEY (project_id) REFERENCES projects (id),
+            UNIQUE(project_id, work_date)
+        )
+    ''')
+    
+    # Таблица заметок проектов
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            content TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (project_id) REFERENCES projects (id)
+        )
+    ''')
+    
+    # Таблица заметок задач
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            content TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (task_id) REFERENCES tasks (id)
+        )
+    ''')
+    
+    # Таблица для сохранения состояния UI (свернутость панели проектов)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ui_state (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT UNIQUE NOT NULL,
+            value TEXT NOT NULL
+        )
+    ''')
+    
+    # Таблица паролей
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS passwords (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL DEFAULT 'website',
+            username TEXT,
+            password TEXT NOT NULL,
+            url TEXT,
+            notes TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (project_id) REFERENCES projects (id)
+        )
+    ''')
+    _add_column(cursor, 'passwords', 'type', "TEXT DEFAULT 'website'")
+    
+    # Таблица общих заметок (ежедневник) - несколько заметок
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    if _add_column(cursor, 'daily_notes', 'title', 'TEXT'):
+        cursor.execute("UPDATE daily_notes SET title = 'Заметка' WHERE title IS NULL")
+    
+    # Таблица событий календаря
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calendar_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            event_date TEXT NOT NULL,
+            event_time TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+
+# Вторичные индексы для горячих путей чтения: имя -> определение.
+# Частичные индексы покрывают только открытые задачи - их на порядки меньше,
+# чем накопленной истории выполненных.
+INDEXES = {
+    'idx_tasks_project': 'tasks (project_id, completed, created_at)',
+    'idx_tasks_completed': 'tasks (completed, created_at)',
+    'idx_tasks_open_project': 'tasks (project_id, created_at) WHERE completed = 0',
+    'idx_tasks_open_deadline': 'tasks (deadline) WHERE completed = 0 AND deadline IS NOT NULL',
+    'idx_tasks_completed_at': 'tasks (completed_at) WHERE completed_at IS NOT NULL',
+    'idx_notes_project': 'notes (project_id)',
+    'idx_task_notes_task': 'task_notes (task_id)',
+    'idx_passwords_project': 'passwords (project_id, created_at)',
+    'idx_passwords_created': 'passwords (created_at)',
+    'idx_daily_notes_updated': 'daily_notes (updated_at)',
+    'idx_calendar_events_date': 'calendar_events (event_date, event_time)',
+}
+
+
+def _create_indexes(cursor):
+    """Вторичные индексы из INDEXES"""
+    for name, definition in INDEXES.items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+
+
+def sort_date(value):
+    """Дата 'YYYY-MM-DD' из ISO-строки (created_at, deadline) или None, если не разбирается"""
+    from datetime import datetime
+    
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).date().isoformat()
+    except (ValueError, TypeError, AttributeError):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+        except (ValueError, TypeError):
+            return None
+
+
+def _task_sort_dates(cursor):
+    """Нормализованные даты задач для сортировки средствами SQL"""
+    _add_column(cursor, 'tasks', 'created_date', 'TEXT')
+    _add_column(cursor, 'tasks', 'deadline_date', 'TEXT')
+    cursor.execute('SELECT id, created_at, deadline FROM tasks')
+    rows = [(sort_date(created_at), sort_date(deadline), task_id)
+            for task_id, created_at, deadline in cursor.fetchall()]
+    cursor.executemany('UPDATE tasks SET created_date = ?, deadline_date = ? WHERE id = ?', rows)
+
+
+def has_fts(conn):
+    """Есть ли в базе полнотекстовый индекс задач (FTS5 может отсутствовать в сборке SQLite)"""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'").fetchone()
+    return row is not None
+
+
+def _tasks_fulltext(cursor):
+    """Полнотекстовый индекс FTS5 по названию и описанию задач, синхронизируемый триггерами"""
+    import sqlite3
+    
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                title, description,
+                content='tasks', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        if 'no such module' in str(e).lower():
+            return  # SQLite собран без FTS5 - поиск остается на LIKE
+        raise
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    ''')
+    cursor.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def parse_timestamp(value):
+    """Время из ISO-строки как локальное без часового пояса.
+    
+    Клиент присылает started_at из toISOString() - в UTC с 'Z', а сервер пишет
+    completed_at через datetime.now() - локальное без пояса. Вычитать такие
+    значения нельзя, поэтому время с поясом переводится в локальное."""
+    from datetime import datetime
+    
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def tracked_hours(started_at, completed_at):
+    """Отработанное по задаче время в часах: от запуска таймера до завершения (0, если не разбирается)"""
+    if not started_at or not completed_at:
+        return 0.0
+    try:
+        return (parse_timestamp(completed_at) - parse_timestamp(started_at)).total_seconds() / 3600
+    except (ValueError, TypeError, AttributeError):
+        return 0.0
+
+
+def rebuild_task_stats(cursor):
+    """Пересобрать daily_task_stats по выполненным задачам.
+    
+    Задачам без сохраненного tracked_hours время вычисляется по started_at/completed_at.
+    """
+    cursor.execute('''
+        SELECT id, started_at, completed_at FROM tasks
+        WHERE completed = 1 AND tracked_hours IS NULL
+    ''')
+    cursor.executemany('UPDATE tasks SET tracked_hours = ? WHERE id = ?',
+                       [(tracked_hours(started_at, completed_at), task_id)
+                        for task_id, started_at, completed_at in cursor.fetchall()])
+    
+    stats = {}
+    cursor.execute('''
+        SELECT project_id, completed_at, tracked_hours FROM tasks
+        WHERE completed = 1 AND completed_at IS NOT NULL
+    ''')
+    for project_id, completed_at, hours in cursor.fetchall():
+        stat_date = sort_date(completed_at)
+        if stat_date is None:
+            continue
+        count, total = stats.get((stat_date, project_id), (0, 0.0))
+        stats[(stat_date, project_id)] = (count + 1, total + (hours or 0.0))
+    
+    cursor.execute('DELETE FROM daily_task_stats')
+    cursor.executemany('''
+        INSERT INTO daily_task_stats (stat_date, project_id, completed_count, tracked_hours)
+        VALUES (?, ?, ?, ?)
+    ''', [(stat_date, project_id, count, total) for (stat_date, project_id), (count, total) in stats.items()])
+
+
+def _daily_task_stats(cursor):
+    """Предагрегированная статистика выполненных задач по дням и проектам"""
+    _add_column(cursor, 'tasks', 'tracked_hours', 'REAL')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_task_stats (
+            stat_date TEXT NOT NULL,
+            project_id INTEGER NOT NULL,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            tracked_hours REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, project_id)
+        )
+    ''')
+    rebuild_task_stats(cursor)
+
+
+# Таблицы, у которых ведется счетчик изменений data_versions (для ETag в app.py)
+VERSIONED_TABLES = [
+    'projects', 'tasks', 'notes', 'task_notes', 'passwords', 'daily_notes',
+    'calendar_events', 'ui_state', 'daily_subscription_time', 'daily_task_stats',
+]
+
+
+def _data_versions(cursor):
+    """Счетчики изменений таблиц: триггеры увеличивают версию при любой записи,
+    в том числе сделанной в обход методов Database"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        _version_triggers(cursor, table)
+
+
+def _version_triggers(cursor, table):
+    """Счетчик изменений table в data_versions и триггеры, которые его увеличивают"""
+    cursor.execute('INSERT OR IGNORE INTO data_versions (name) VALUES (?)', (table,))
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+            END
+        ''')
+
+
+def _manual_ranks(cursor):
+    """Ранги ручной сортировки (ranking.py). Проекты получают ранги в текущем
+    порядке sort_order, задачи - только когда их перемещают вручную"""
+    _add_column(cursor, 'projects', 'rank', 'TEXT')
+    _add_column(cursor, 'tasks', 'rank', 'TEXT')
+    cursor.execute('SELECT id FROM projects ORDER BY COALESCE(sort_order, 0), created_at DESC')
+    ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany('UPDATE projects SET rank = ? WHERE id = ?', zip(ranking.spread_ranks(len(ids)), ids))
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_rank ON projects (rank)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_rank ON tasks (rank)')
+
+
+# Таблицы, изменения которых попадают в журнал sync_log (дельта-синхронизация, /api/sync)
+SYNCED_TABLES = [
+    'projects', 'tasks', 'notes', 'task_notes', 'passwords', 'daily_notes', 'calendar_events',
+]
+
+
+def _sync_log(cursor):
+    """Журнал изменений для дельта-синхронизации. На каждую строку - одна запись:
+    новое изменение заменяет старую запись той же строки с новым seq, поэтому журнал
+    не растет от повторных правок. Удаление оставляет запись с deleted = 1 (надгробие)"""
+    if _add_column(cursor, 'projects', 'updated_at', 'TEXT'):
+        cursor.execute('UPDATE projects SET updated_at = created_at')
+    if _add_column(cursor, 'tasks', 'updated_at', 'TEXT'):
+        cursor.execute('UPDATE tasks SET updated_at = COALESCE(completed_at, created_at)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (entity, entity_id)
+        )
+    ''')
+    for table in SYNCED_TABLES:
+        # Существующие строки - первая выгрузка для клиентов, начинающих с since=0
+        cursor.execute(f"INSERT OR REPLACE INTO sync_log (entity, entity_id) SELECT '{table}', id FROM {table}")
+        for event, row, deleted in (('INSERT', 'NEW', 0), ('UPDATE', 'NEW', 0), ('DELETE', 'OLD', 1)):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_sync_{event.lower()} AFTER {event} ON {table} BEGIN
+                    INSERT OR REPLACE INTO sync_log (entity, entity_id, deleted) VALUES ('{table}', {row}.id, {deleted});
+                END
+            ''')
+
+
+def _pomodoro(cursor):
+    """Состояние помидоро (одна строка, общая для всех процессов сервера) и история сессий.
+    Оставшееся время не хранится: оно выводится из time_left и момента started_at"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pomodoro_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            state TEXT NOT NULL DEFAULT 'idle',
+            time_left INTEGER NOT NULL DEFAULT 1500,
+            work_count INTEGER NOT NULL DEFAULT 0,
+            started_at REAL,
+            updated_at TEXT
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO pomodoro_state (id) VALUES (1)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pomodoro_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            ended_at TEXT,
+            completed INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pomodoro_sessions_started ON pomodoro_sessions (started_at)')
+    # Счетчик изменений: по нему /api/events замечает смену состояния в любом процессе
+    _version_triggers(cursor, 'pomodoro_state')
+
+
+# Реестр миграций: (версия, функция). Новые шаги добавляются только в конец.
+MIGRATIONS = [
+    (1, _initial_schema),
+    (2, _create_indexes),
+    (3, _task_sort_dates),
+    (4, _tasks_fulltext),
+    (5, _daily_task_stats),
+    (6, _data_versions),
+    (7, _manual_ranks),
+    (8, _sync_log),
+    (9, _pomodoro),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Применить недостающие миграции. Возвращает список примененных версий"""
+    if get_version(conn) >= LATEST_VERSION:
+        return []
+    
+    # IMMEDIATE сразу берет блокировку записи: параллельно стартующие
+    # воркеры не начнут применять те же шаги одновременно
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = get_version(conn)
+        applied = []
+        cursor = conn.cursor()
+        for version, step in MIGRATIONS:
+            if version > current:
+                step(cursor)
+                applied.append(version)
+        if applied:
+            cursor.execute(f'PRAGMA user_version = {LATEST_VERSION}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return applied
@@ -0,0 +1,83 @@
+"""
+Ключи ручной сортировки (ранги).
+
+Ранг - строка из цифр base-62 ('0'-'9', 'A'-'Z', 'a'-'z'), которая читается
+как дробь 0.<цифры>. Порядок цифр совпадает с порядком символов, поэтому ранги
+сравниваются обычным сравнением строк - и в Python, и в SQLite (ORDER BY rank).
+Между любыми двумя рангами есть третий, поэтому перемещение элемента - это
+изменение одной его строки, соседи не переписываются. Ранг не заканчивается
+на '0': иначе между 'a' и 'a0' не нашлось бы места.
+
+Частые вставки в одно место удлиняют ранги; когда ранг становится длиннее
+MAX_RANK_LENGTH, список стоит перебалансировать - раздать равномерные ранги
+заново (spread_ranks).
+"""
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+# Ранги длиннее этого - сигнал для перебалансировки списка
+MAX_RANK_LENGTH = 24
+
+
+def is_valid_rank(rank):
+    return (isinstance(rank, str) and rank != '' and rank[-1] != '0'
+            and all(char in DIGITS for char in rank))
+
+
+def _midpoint(lower, upper):
+    """Строка строго между lower и upper (lower может быть '', upper - None, то есть 1.0)"""
+    if upper is not None:
+        # Общий префикс переносим как есть (недостающие цифры lower - нули)
+        n = 0
+        while n < len(upper) and (lower[n] if n < len(lower) else '0') == upper[n]:
+            n += 1
+        if n > 0:
+            return upper[:n] + _midpoint(lower[n:], upper[n:])
+    digit_lower = DIGITS.index(lower[0]) if lower else 0
+    digit_upper = DIGITS.index(upper[0]) if upper is not None else BASE
+    if digit_upper - digit_lower > 1:
+        return DIGITS[(digit_lower + digit_upper + 1) // 2]
+    # Соседние цифры: берем первую цифру upper, если за ней что-то есть, иначе уходим в следующий разряд
+    if upper is not None and len(upper) > 1:
+        return upper[:1]
+    return DIGITS[digit_lower] + _midpoint(lower[1:], None)
+
+
+def rank_between(lower=None, upper=None):
+    """Ранг строго между lower и upper; None - начало или конец списка.
+
+    Добавление в конец и в начало сдвигает ранг на одну цифру, а не делит
+    промежуток пополам: ранги при этом растут на символ раз в несколько десятков вставок.
+    """
+    if lower is not None and upper is not None and lower >= upper:
+        raise ValueError(f'Ранг {lower!r} должен быть меньше {upper!r}')
+    if lower is not None and upper is None:
+        for i, char in enumerate(lower):
+            if char != DIGITS[-1]:
+                return lower[:i] + DIGITS[DIGITS.index(char) + 1]
+    elif upper is not None and lower is None:
+        for i, char in enumerate(upper):
+            if DIGITS.index(char) > 1:
+                return upper[:i] + DIGITS[DIGITS.index(char) - 1]
+    return _midpoint(lower or '', upper)
+
+
+def spread_ranks(count):
+    """count рангов одинаковой длины, равномерно распределенных по всему диапазону"""
+    length = 1
+    while BASE ** length <= count:
+        length += 1
+    space = BASE ** length
+    ranks = []
+    for i in range(1, count + 1):
+        value = i * space // (count + 1)
+        digits = []
+        for _ in range(length):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        ranks.append(''.join(reversed(digits)).rstrip('0'))
+    return ranks
+
+
+def needs_rebalance(rank):
+    return len(rank) > MAX_RANK_LENGTH
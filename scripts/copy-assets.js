@@ -33,11 +33,58 @@ if (fs.existsSync(indexHtmlSrc)) {
         /{{ url_for\('static', filename='([^']+)'\) }}/g,
         '/static/$1'
     );
+    indexHtmlContent = renderTemplateForBundle(indexHtmlContent);
+    
+    // Оставшаяся разметка Jinja попала бы в приложение как есть
+    const unrendered = indexHtmlContent.match(/{{[\s\S]*?}}|{%[\s\S]*?%}/);
+    if (unrendered) {
+        throw new Error(`index.html: не удалось преобразовать шаблон для Capacitor: ${unrendered[0]}`);
+    }
     
     fs.writeFileSync(indexHtmlDest, indexHtmlContent, 'utf8');
     console.log('index.html copied to dist/ with paths fixed for Capacitor');
 }
 
+// Шаблон страницы (assets.py, build_bootstrap в app.py) -> статический HTML для dist.
+// В сборке нет сервера: модули берутся из dist/static без хэшей, стартовых данных нет
+// (клиент запросит их у API)
+function renderTemplateForBundle(html) {
+    const staticUrl = (file) => `/static/${file}`;
+    
+    // {% set entry_modules = [...] %} - список точек входа
+    let entryModules = [];
+    html = html.replace(/[ \t]*{%-?\s*set\s+entry_modules\s*=\s*\[([\s\S]*?)\]\s*-?%}\n?/, (_, list) => {
+        entryModules = [...list.matchAll(/'([^']+)'/g)].map(match => match[1]);
+        return '';
+    });
+    
+    html = html.replace(/{{\s*assets\.url\('([^']+)'\)\s*}}/g, (_, file) => staticUrl(file));
+    html = html.replace(/{{\s*bootstrap\|tojson\s*}}/g, 'null');
+    // Адреса /assets/... ведут на файлы dist/static
+    html = html.replace(/{{\s*assets\.import_map\(\)\|tojson\s*}}/g,
+        JSON.stringify({ imports: { '/assets/': '/static/' } }));
+    
+    // Циклы {% for %} по точкам входа: modulepreload и import модулей.
+    // {%- ... %} удаляет пробелы и перевод строки перед тегом, как в Jinja
+    html = html.replace(
+        /(\s*){%(-?)\s*for\s+(\w+)\s+in\s+([^%]+?)\s*-?%}([\s\S]*?)(\s*){%(-?)\s*endfor\s*-?%}/g,
+        (match, before, trimBefore, variable, iterable, body, beforeEnd, trimEnd) => {
+            let items;
+            if (/^assets\.preload\(\s*entry_modules\s*\)$/.test(iterable)) {
+                items = entryModules.map(staticUrl);
+            } else if (iterable === 'entry_modules') {
+                items = entryModules;
+            } else {
+                return match;
+            }
+            const placeholder = new RegExp(`{{\\s*${variable}\\s*}}`, 'g');
+            const itemBody = trimEnd ? body : body + beforeEnd;
+            return (trimBefore ? '' : before) + items.map(item => itemBody.replace(placeholder, item)).join('');
+        }
+    );
+    return html;
+}
+
 // Копируем database.py и app.py для локального запуска
 const filesToCopy = ['database.py', 'app.py', 'requirements.txt'];
 filesToCopy.forEach(file => {
@@ -0,0 +1,156 @@
+"""
+Запуск приложения на производственном WSGI-сервере.
+
+Использование:
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers 2] [--sse-clients 8] [--threads N]
+                    [--keepalive 5] [--server auto|gunicorn|waitress] [--preload] [--single-writer]
+
+gunicorn (Linux, macOS): несколько процессов-воркеров, в каждом - потоки (gthread).
+Простаивающие keep-alive соединения ждут в общем цикле воркера, но открытый поток
+серверных событий (/api/events, по одному на вкладку или устройство) занимает поток
+все время, пока открыт. Поэтому потоков по умолчанию --sse-clients + REQUEST_THREADS:
+вкладки не отнимают потоки у обычных запросов. Если вкладок больше, чем --sse-clients,
+лишние потоки событий ждут свободного потока наравне с запросами.
+    kill -HUP <pid мастера>   - плавный перезапуск: новые воркеры загружают свежий код,
+                                старые дорабатывают начатые запросы и завершаются
+    kill -TERM <pid мастера>  - плавная остановка
+С --preload приложение загружается один раз в мастере (быстрее старт, общая память),
+но SIGHUP тогда перезапускает воркеры без перечитывания кода.
+
+waitress (Windows или без gunicorn): один процесс с пулом потоков.
+
+Каждый воркер открывает свои соединения с базой после fork (Database.reset_after_fork);
+кэши в памяти воркеров догоняют изменения друг друга по журналу sync_log.
+С --single-writer изменения в каждом процессе выполняет один поток-писатель
+с групповой фиксацией (Database(single_writer=True)).
+Серверы указаны в requirements.txt (gunicorn - не на Windows, waitress - на Windows).
+Для разработки по-прежнему можно запускать python app.py (сервер Werkzeug).
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# Потоки для обычных запросов сверх занятых потоками серверных событий
+REQUEST_THREADS = 8
+
+
+def load_app():
+    import app
+    return app.app
+
+
+def _close_master_connections(server, worker):
+    """Мастер не должен передавать воркерам открытые соединения SQLite"""
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.db.pool.close()
+
+
+def _after_fork(server, worker):
+    """В воркере: свой пул соединений, своя рассылка серверных событий и свежий манифест
+    статики (с --preload приложение загружено в мастере до обновления файлов)"""
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.db.reset_after_fork()
+        app_module.event_broker.reset_after_fork()
+        app_module.app.extensions['assets'].refresh()
+
+
+def run_gunicorn(options):
+    from gunicorn.app.base import BaseApplication
+    
+    class PlannerApplication(BaseApplication):
+        def __init__(self, settings):
+            self.settings = settings
+            super().__init__()
+        
+        def load_config(self):
+            for key, value in self.settings.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return load_app()
+    
+    PlannerApplication({
+        'bind': f'{options.host}:{options.port}',
+        'workers': options.workers,
+        'worker_class': 'gthread',
+        'threads': options.threads,
+        'keepalive': options.keepalive,
+        # Потоки SSE (/api/events) живут долго; время ожидания касается зависшего воркера, а не запроса
+        'timeout': options.timeout,
+        'graceful_timeout': options.graceful_timeout,
+        'preload_app': options.preload,
+        'pre_fork': _close_master_connections,
+        'post_fork': _after_fork,
+        'accesslog': '-' if options.access_log else None,
+    }).run()
+
+
+def run_waitress(options):
+    from waitress import serve
+    
+    if options.workers > 1:
+        print('waitress работает в одном процессе: --workers не используется', file=sys.stderr)
+    # Каждое открытое соединение /api/events занимает поток (см. --sse-clients)
+    serve(load_app(), host=options.host, port=options.port, threads=options.threads,
+          channel_timeout=max(options.keepalive, 1), connection_limit=options.connection_limit)
+
+
+def server_available(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def choose_server(name):
+    if name != 'auto':
+        return name
+    # gunicorn работает только на POSIX
+    return 'gunicorn' if os.name == 'posix' and server_available('gunicorn') else 'waitress'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Запуск планировщика на производственном WSGI-сервере')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='процессы (только gunicorn)')
+    parser.add_argument('--sse-clients', type=int, default=8,
+                        help='сколько вкладок и устройств одновременно держат /api/events')
+    parser.add_argument('--threads', type=int, default=None,
+                        help=f'потоки в каждом процессе (по умолчанию --sse-clients + {REQUEST_THREADS})')
+    parser.add_argument('--keepalive', type=int, default=5,
+                        help='сколько секунд держать простаивающее keep-alive соединение')
+    parser.add_argument('--timeout', type=int, default=60, help='перезапуск зависшего воркера, секунды')
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help='сколько ждать завершения запросов при перезапуске и остановке, секунды')
+    parser.add_argument('--connection-limit', type=int, default=1000, help='предел соединений (только waitress)')
+    parser.add_argument('--preload', action='store_true', help='загрузить приложение в мастере до fork')
+    parser.add_argument('--access-log', action='store_true', help='журнал запросов в stdout')
+    parser.add_argument('--single-writer', action='store_true',
+                        help='все изменения через один поток-писатель с групповой фиксацией')
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'waitress'), default='auto')
+    options = parser.parse_args(argv)
+    if options.threads is None:
+        options.threads = options.sse_clients + REQUEST_THREADS
+    if options.single_writer:
+        # Читается в app.py при создании Database
+        os.environ['PLANNER_SINGLE_WRITER'] = '1'
+    # Каждому потоку запросов - свое соединение пула, плюс служебные потоки (события, подсказки):
+    # иначе при занятых соединениях запросы ждут и падают по тайм-ауту пула
+    os.environ.setdefault('PLANNER_POOL_SIZE', str(options.threads + 2))
+    
+    server = choose_server(options.server)
+    if not server_available(server):
+        print(f'Не найден сервер {server}. Установите зависимости: pip install -r requirements.txt '
+              f'(или pip install {server})', file=sys.stderr)
+        return 1
+    if server == 'gunicorn':
+        run_gunicorn(options)
+    else:
+        run_waitress(options)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -83,4 +83,30 @@ export async function apiDelete(path) {
     return response.json();
 }
 
+// Тела запросов больше этого размера отправляются сжатыми (сервер распаковывает gzip)
+const COMPRESS_BODY_MIN_LENGTH = 8 * 1024;
 
+// Параметры fetch для JSON-тела: большие тела (длинные заметки) сжимаются gzip,
+// если браузер поддерживает CompressionStream
+export async function jsonRequest(method, data) {
+    const json = JSON.stringify(data);
+    const headers = { 'Content-Type': 'application/json' };
+    if (json.length < COMPRESS_BODY_MIN_LENGTH || typeof CompressionStream === 'undefined') {
+        return { method, headers, body: json };
+    }
+    const stream = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+    const body = await new Response(stream).arrayBuffer();
+    return { method, headers: { ...headers, 'Content-Encoding': 'gzip' }, body };
+}
+
+// Несколько операций одним запросом и одной транзакцией: [{ method, path, body }].
+// Возвращает результаты [{ status, body }] по порядку; если хотя бы одна операция
+// не выполнена, сервер отменяет изменения всего пакета
+export async function apiBatch(operations) {
+    const response = await apiFetch('api/batch', await jsonRequest('POST', { operations }));
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || `HTTP error! status: ${response.status}`);
+    }
+    return data.results;
+}
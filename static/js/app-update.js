@@ -28,6 +28,7 @@
 
 import { apiGet } from './api.js';
 import { isCapacitor } from './config.js';
+import { onServerEvent } from './events.js';
 
 // Импортируем Capacitor App если доступен
 let CapacitorApp = null;
@@ -37,6 +38,8 @@ if (isCapacitor() && window.Capacitor && window.Capacitor.Plugins) {
 
 let currentVersion = '1.0.0';
 let updateCheckInterval = null;
+let versionEventsSubscribed = false;
+let autoUpdateCheckEnabled = false;
 
 // Получить версию приложения с сервера
 async function getServerVersion() {
@@ -488,11 +491,23 @@ export function startAutoUpdateCheck(intervalMinutes = 30) {
     if (updateCheckInterval) {
         clearInterval(updateCheckInterval);
     }
+    autoUpdateCheckEnabled = true;
     
     // Проверяем сразу при запуске
     checkForUpdates(true);
     
-    // Затем проверяем каждые N минут
+    // Версию сервер присылает при каждом подключении к событиям (после перезапуска
+    // с новой версией - тоже), поэтому опрашивать его не нужно
+    if (!versionEventsSubscribed) {
+        versionEventsSubscribed = onServerEvent('hello', (data) => {
+            if (autoUpdateCheckEnabled && data && data.version && data.version !== getLocalVersion()) {
+                checkForUpdates(true);
+            }
+        });
+    }
+    if (versionEventsSubscribed) return;
+    
+    // Без поддержки EventSource проверяем каждые N минут
     updateCheckInterval = setInterval(() => {
         checkForUpdates(true);
     }, intervalMinutes * 60 * 1000);
@@ -500,6 +515,7 @@ export function startAutoUpdateCheck(intervalMinutes = 30) {
 
 // Остановить автоматическую проверку
 export function stopAutoUpdateCheck() {
+    autoUpdateCheckEnabled = false;
     if (updateCheckInterval) {
         clearInterval(updateCheckInterval);
         updateCheckInterval = null;
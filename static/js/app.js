@@ -448,13 +448,11 @@ async function editTask(taskId, event) {
             const query = document.getElementById('searchInput').value.trim();
             const response = await fetch(`/api/search/tasks?q=${encodeURIComponent(query)}`);
             tasks = await response.json();
+            // Результаты поиска содержат все поля задачи
             task = tasks.find(t => t.id === taskId);
             // Если редактируем из поиска, переключаемся на проект задачи
             if (task && task.project_id && task.project_id !== currentProjectId) {
                 await selectProject(task.project_id);
-                // Перезагружаем задачи проекта
-                const projectTasks = await fetch(`/api/projects/${task.project_id}/tasks`).then(r => r.json());
-                task = projectTasks.find(t => t.id === taskId) || task;
             }
         } else {
             const response = await fetch(`/api/projects/${currentProjectId}/tasks?include_completed=${showCompletedTasks}`);
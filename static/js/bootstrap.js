@@ -0,0 +1,29 @@
+// Стартовые данные, встроенные сервером в страницу (build_bootstrap в app.py)
+
+let bootstrapData;
+
+function readBootstrap() {
+    if (bootstrapData === undefined) {
+        const element = document.getElementById('bootstrapData');
+        try {
+            bootstrapData = element ? JSON.parse(element.textContent) : null;
+        } catch (error) {
+            console.warn('Не удалось разобрать стартовые данные:', error);
+            bootstrapData = null;
+        }
+    }
+    return bootstrapData;
+}
+
+// Забрать часть стартовых данных. Каждая часть отдается один раз - следующие загрузки
+// идут в API за свежими данными. projectId - часть относится к проекту (задачи, заметки)
+// и годится, только если страница открыта с тем же проектом.
+// undefined - данных нет, нужно запросить их с сервера
+export function takeBootstrap(key, projectId = undefined) {
+    const data = readBootstrap();
+    if (!data || !(key in data)) return undefined;
+    if (projectId !== undefined && projectId !== data.projectId) return undefined;
+    const value = data[key];
+    delete data[key];
+    return value;
+}
@@ -0,0 +1,80 @@
+// Серверные события (SSE, /api/events в app.py): одно соединение на вкладку вместо опросов
+
+import { getApiUrl } from './config.js';
+
+// Пауза перед повторным подключением, если браузер закрыл соединение сам (ошибка HTTP)
+const RECONNECT_DELAY = 5000;
+
+const handlers = new Map(); // тип события -> обработчики
+let source = null;
+let lastEventId = '';
+let reconnectTimer = null;
+
+// Поддерживаются ли серверные события (иначе модули продолжают опрашивать API)
+export function serverEventsSupported() {
+    return typeof window.EventSource === 'function';
+}
+
+function dispatch(type, event) {
+    if (event.lastEventId) {
+        lastEventId = event.lastEventId;
+    }
+    let data = null;
+    try {
+        data = event.data ? JSON.parse(event.data) : null;
+    } catch (error) {
+        console.warn('Некорректное серверное событие:', type, error);
+        return;
+    }
+    for (const handler of handlers.get(type) || []) {
+        try {
+            handler(data);
+        } catch (error) {
+            console.error(`Ошибка обработчика события ${type}:`, error);
+        }
+    }
+}
+
+function connect() {
+    let url;
+    try {
+        url = getApiUrl('api/events');
+    } catch (error) {
+        // Сервер не настроен - подключимся при следующей подписке
+        return;
+    }
+    // Браузер сам шлет Last-Event-ID при переподключении; параметр нужен,
+    // когда соединение создается заново после ошибки
+    if (lastEventId) {
+        url += `?lastEventId=${encodeURIComponent(lastEventId)}`;
+    }
+    source = new EventSource(url);
+    for (const type of handlers.keys()) {
+        source.addEventListener(type, (event) => dispatch(type, event));
+    }
+    source.addEventListener('error', () => {
+        if (source && source.readyState === EventSource.CLOSED) {
+            source = null;
+            clearTimeout(reconnectTimer);
+            reconnectTimer = setTimeout(connect, RECONNECT_DELAY);
+        }
+    });
+}
+
+// Подписаться на серверное событие: hello (при каждом подключении), reset (пропущенные
+// события потеряны - перечитать данные), pomodoro, changes. Возвращает false,
+// если браузер не поддерживает EventSource
+export function onServerEvent(type, handler) {
+    if (!serverEventsSupported()) return false;
+    if (!handlers.has(type)) {
+        handlers.set(type, []);
+        if (source) {
+            source.addEventListener(type, (event) => dispatch(type, event));
+        }
+    }
+    handlers.get(type).push(handler);
+    if (!source && !reconnectTimer) {
+        connect();
+    }
+    return true;
+}
@@ -1,16 +1,18 @@
 // Главный файл - инициализация и настройка обработчиков событий
 
-import { loadProjects, showProjectModal, hideProjectModal, createProject, selectProject, deleteProject } from './projects.js';
+import { loadProjects, showProjectModal, hideProjectModal, createProject, selectProject, deleteProject, updateProjectTaskCounts } from './projects.js';
 import { addTask, hideTaskModal, saveTask, clearTaskDeadline, loadTasks, closeTaskDescription, editTask, deleteTask, toggleTask, saveTaskDeadline, toggleCompletedTasks, hideSelectProjectModal } from './tasks.js';
-import { debounceSearch, clearSearch } from './search.js';
+import { initSearch } from './search.js';
 import { toggleProjectsPanel, loadPanelState, initMobileUI } from './ui.js';
 import { togglePasswordMode, showPasswordModal, savePassword, cancelPassword, deletePassword, togglePasswordVisibility, copyPassword, togglePasswordViewVisibility, hidePasswordModal } from './passwords.js';
 import { debounceSaveNotes, handlePasteImage } from './notes.js';
-import { selectedTaskId, currentProjectId, currentPasswordId } from './state.js';
+import { selectedTaskId, currentProjectId, currentPasswordId, isPasswordMode } from './state.js';
 import { startTaskTimer, completeTask } from './timer.js';
 import { initCalendar, deleteCalendarEvent, editCalendarEvent } from './calendar.js';
 import { initIdleProtection, checkPincode, lockSite } from './idle-timeout.js';
 import { showServerSettings } from './server-settings.js';
+import { onServerEvent } from './events.js';
+import { takeBootstrap } from './bootstrap.js';
 
 // Инициализация уведомлений для Capacitor
 async function initNotifications() {
@@ -65,6 +67,7 @@ document.addEventListener('DOMContentLoaded', async () => {
             // Сервер настроен, загружаем проекты
             try {
                 await loadProjects();
+                initLiveUpdates();
                 // После загрузки проектов роутер восстановит состояние из URL
                 // Если в URL нет параметров, будет выбран проект по умолчанию
             } catch (error) {
@@ -92,6 +95,59 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 });
 
+// Обновление списков по серверным событиям: изменения с других устройств и вкладок
+// появляются без перезагрузки страницы
+const LIVE_UPDATE_DELAY = 500;
+let pendingEntities = new Set();
+let liveUpdateTimer = null;
+
+function scheduleLiveUpdate(entities) {
+    entities.forEach(entity => pendingEntities.add(entity));
+    clearTimeout(liveUpdateTimer);
+    // Несколько событий подряд (пакетные операции) - одно обновление
+    liveUpdateTimer = setTimeout(applyLiveUpdate, LIVE_UPDATE_DELAY);
+}
+
+async function applyLiveUpdate() {
+    // Скрытая вкладка обновится, когда ее откроют
+    if (document.hidden) return;
+    const entities = pendingEntities;
+    pendingEntities = new Set();
+    try {
+        if (entities.has('projects')) {
+            await loadProjects();
+        } else if (entities.has('tasks')) {
+            await updateProjectTaskCounts();
+        }
+        if (entities.has('tasks') && currentProjectId !== null && currentProjectId >= 0 && !isPasswordMode) {
+            await loadTasks();
+        }
+    } catch (error) {
+        console.error('Ошибка обновления по серверному событию:', error);
+    }
+}
+
+function initLiveUpdates() {
+    const bootstrapCursor = takeBootstrap('syncCursor');
+    let firstHello = true;
+    const subscribed = onServerEvent('changes', (data) => {
+        if (data && data.entities) scheduleLiveUpdate(data.entities);
+    });
+    if (!subscribed) return;
+    onServerEvent('hello', (data) => {
+        // Изменения между отдачей страницы и подключением к событиям
+        if (firstHello && bootstrapCursor !== undefined && data && data.syncCursor !== bootstrapCursor) {
+            scheduleLiveUpdate(['projects', 'tasks']);
+        }
+        firstHello = false;
+    });
+    // Пропущенные события потеряны (перезапуск сервера) - перечитываем списки
+    onServerEvent('reset', () => scheduleLiveUpdate(['projects', 'tasks']));
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden && pendingEntities.size > 0) applyLiveUpdate();
+    });
+}
+
 // Настройка обработчиков событий
 function setupEventListeners() {
     // Кнопка добавления проекта
@@ -119,8 +175,7 @@ function setupEventListeners() {
     }
     
     // Поиск
-    document.getElementById('searchInput').addEventListener('input', debounceSearch);
-    document.getElementById('clearSearchBtn').addEventListener('click', clearSearch);
+    initSearch();
     
     // Обработчик для настроек сервера
     const serverSettingsMenuItem = document.getElementById('serverSettingsMenuItem');
@@ -1,6 +1,8 @@
 // Работа с заметками
 
 import { currentProjectId, selectedTaskId, saveTimeout, setSaveTimeout } from './state.js';
+import { jsonRequest } from './api.js';
+import { takeBootstrap } from './bootstrap.js';
 
 // Загрузка заметок
 export async function loadNotes() {
@@ -44,6 +46,12 @@ export async function loadNotes() {
         return;
     }
     
+    const bootstrapped = takeBootstrap('notes', currentProjectId);
+    if (bootstrapped) {
+        notesTextarea.innerHTML = bootstrapped.content || '';
+        return;
+    }
+    
     try {
         const response = await fetch(`/api/projects/${currentProjectId}/notes`);
         if (!response.ok) {
@@ -81,13 +89,7 @@ export async function saveNotes() {
     // Если выбрана задача, сохраняем заметки задачи
     if (selectedTaskId) {
         try {
-            const response = await fetch(`/api/tasks/${selectedTaskId}/notes`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ content })
-            });
+            const response = await fetch(`/api/tasks/${selectedTaskId}/notes`, await jsonRequest('POST', { content }));
             
             if (response.ok) {
                 const indicator = document.getElementById('saveIndicator');
@@ -116,13 +118,7 @@ export async function saveNotes() {
             const noteId = parseInt(selectedNote.dataset.noteId);
             if (noteId) {
                 try {
-                    const response = await fetch(`/api/daily-notes/${noteId}`, {
-                        method: 'PUT',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify({ content })
-                    });
+                    const response = await fetch(`/api/daily-notes/${noteId}`, await jsonRequest('PUT', { content }));
                     
                     if (response.ok) {
                         const indicator = document.getElementById('saveIndicator');
@@ -149,13 +145,7 @@ export async function saveNotes() {
     if (currentProjectId === 0) {
         // Сохраняем общие заметки (ежедневник)
         try {
-            const response = await fetch('/api/daily-notes', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ content })
-            });
+            const response = await fetch('/api/daily-notes', await jsonRequest('POST', { content }));
             
             if (response.ok) {
                 const indicator = document.getElementById('saveIndicator');
@@ -178,13 +168,7 @@ export async function saveNotes() {
     if (!currentProjectId) return;
     
     try {
-        const response = await fetch(`/api/projects/${currentProjectId}/notes`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ content })
-        });
+        const response = await fetch(`/api/projects/${currentProjectId}/notes`, await jsonRequest('POST', { content }));
         
         if (response.ok) {
             const indicator = document.getElementById('saveIndicator');
@@ -2,13 +2,16 @@
 
 import { apiGet, apiPost } from './api.js';
 import { isCapacitor } from './config.js';
+import { takeBootstrap } from './bootstrap.js';
+import { onServerEvent } from './events.js';
 
 let pomodoroInterval = null;
 let pomodoroTimeLeft = 25 * 60; // 25 минут в секундах
 let pomodoroState = 'idle'; // idle, work, break, paused
 let pomodoroWorkCount = 0;
 let pomodoroBreakTime = 5 * 60; // 5 минут перерыва
-let syncInterval = null; // Интервал синхронизации
+let syncInterval = null; // Интервал синхронизации (только без серверных событий)
+let serverEventsSubscribed = false;
 let lastSyncTime = 0;
 
 // Проверка, мобильное ли устройство
@@ -28,32 +31,36 @@ document.addEventListener('DOMContentLoaded', async () => {
 async function syncPomodoroState() {
     try {
         // Получаем состояние с сервера
-        const serverState = await apiGet('api/pomodoro/state');
+        const serverState = takeBootstrap('pomodoro') ?? await apiGet('api/pomodoro/state');
+        applyServerState(serverState);
+    } catch (error) {
+        console.error('Ошибка синхронизации помидоро:', error);
+    }
+}
+
+// Применить состояние с сервера: ответ API или серверное событие
+function applyServerState(serverState) {
+    if (serverState && serverState.state !== 'idle') {
+        // Если на сервере есть активный таймер, синхронизируемся с ним
+        const serverTimeLeft = serverState.timeLeft || 0;
+        const serverStateType = serverState.state;
         
-        if (serverState && serverState.state !== 'idle') {
-            // Если на сервере есть активный таймер, синхронизируемся с ним
-            const serverTimeLeft = serverState.timeLeft || 0;
-            const serverStateType = serverState.state;
+        // Если состояние отличается или время сильно отличается, синхронизируемся
+        if (serverStateType !== pomodoroState || Math.abs(serverTimeLeft - pomodoroTimeLeft) > 5) {
+            pomodoroTimeLeft = serverTimeLeft;
+            pomodoroState = serverStateType;
+            pomodoroWorkCount = serverState.workCount || 0;
             
-            // Если состояние отличается или время сильно отличается, синхронизируемся
-            if (serverStateType !== pomodoroState || Math.abs(serverTimeLeft - pomodoroTimeLeft) > 5) {
-                pomodoroTimeLeft = serverTimeLeft;
-                pomodoroState = serverStateType;
-                pomodoroWorkCount = serverState.workCount || 0;
-                
-                // Если таймер должен работать, но не работает - запускаем
-                if ((pomodoroState === 'work' || pomodoroState === 'break') && !pomodoroInterval) {
-                    startPomodoroTimer();
-                }
-                
-                updatePomodoroUI();
+            // Если таймер должен работать, но не работает - запускаем
+            if ((pomodoroState === 'work' || pomodoroState === 'break') && !pomodoroInterval) {
+                startPomodoroTimer();
             }
+            
+            updatePomodoroUI();
         }
-        
-        lastSyncTime = Date.now();
-    } catch (error) {
-        console.error('Ошибка синхронизации помидоро:', error);
     }
+    
+    lastSyncTime = Date.now();
 }
 
 // Сохранение состояния на сервер
@@ -72,10 +79,21 @@ async function savePomodoroStateToServer() {
 
 // Запуск синхронизации
 function startSync() {
-    // Синхронизируемся каждые 5 секунд
     if (syncInterval) {
         clearInterval(syncInterval);
+        syncInterval = null;
     }
+    
+    // Сервер сам присылает смену состояния и текущее состояние при каждом подключении
+    if (!serverEventsSubscribed) {
+        serverEventsSubscribed = onServerEvent('pomodoro', applyServerState);
+        if (serverEventsSubscribed) {
+            onServerEvent('hello', (data) => applyServerState(data && data.pomodoro));
+        }
+    }
+    if (serverEventsSubscribed) return;
+    
+    // Без поддержки EventSource синхронизируемся каждые 5 секунд
     syncInterval = setInterval(() => {
         syncPomodoroState();
     }, 5000);
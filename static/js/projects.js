@@ -7,6 +7,7 @@ import { loadNotes } from './notes.js';
 import { loadPasswords, clearPasswordForm, togglePasswordMode } from './passwords.js';
 import { apiGet, apiPost, apiPut, apiDelete } from './api.js';
 import { hideProjectsPanel } from './ui.js';
+import { takeBootstrap } from './bootstrap.js';
 
 // Загрузка проектов
 export async function loadProjects() {
@@ -14,7 +15,7 @@ export async function loadProjects() {
         // Всегда используем apiGet для единообразия
         let projects;
         try {
-            projects = await apiGet('api/projects');
+            projects = takeBootstrap('projects') ?? await apiGet('api/projects');
         } catch (error) {
             console.error('Ошибка загрузки проектов:', error);
             // Показываем понятное сообщение об ошибке
@@ -219,8 +220,8 @@ function handleDrop(e) {
             this.parentNode.insertBefore(draggedElement, this.nextSibling);
         }
         
-        // Сохраняем новый порядок
-        saveProjectsOrder();
+        // Сохраняем новое место перетащенного проекта
+        saveProjectPosition(draggedElement);
     }
     
     this.classList.remove('drag-over', 'drag-over-top', 'drag-over-bottom');
@@ -236,28 +237,24 @@ function handleDragEnd(e) {
     });
 }
 
-// Сохранение порядка проектов
-async function saveProjectsOrder() {
-    const projectsList = document.getElementById('projectsList');
-    const projectItems = projectsList.querySelectorAll('.project-item.draggable');
-    
-    const orders = Array.from(projectItems).map((item, index) => ({
-        id: parseInt(item.dataset.projectId),
-        order: index
-    }));
+// Ближайший перетаскиваемый проект рядом с элементом (previousElementSibling / nextElementSibling)
+function neighbourProjectId(item, direction) {
+    let sibling = item[direction];
+    while (sibling && !sibling.classList.contains('draggable')) {
+        sibling = sibling[direction];
+    }
+    return sibling ? parseInt(sibling.dataset.projectId) : null;
+}
+
+// Сохранение места проекта: сервер меняет только его ранг, остальные проекты не переписываются
+async function saveProjectPosition(item) {
+    const projectId = parseInt(item.dataset.projectId);
     
     try {
-        const response = await fetch('/api/projects/order', {
-            method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ orders })
+        await apiPut(`api/projects/${projectId}/move`, {
+            prev_id: neighbourProjectId(item, 'previousElementSibling'),
+            next_id: neighbourProjectId(item, 'nextElementSibling')
         });
-        
-        if (!response.ok) {
-            console.error('Ошибка сохранения порядка проектов');
-        }
     } catch (error) {
         console.error('Ошибка сохранения порядка проектов:', error);
     }
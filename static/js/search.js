@@ -1,10 +1,116 @@
 // Поиск задач
 
 import { isSearchMode, setIsSearchMode, selectedTaskId, setSelectedTaskId, currentProjectId } from './state.js';
-import { loadTasks } from './tasks.js';
-import { closeTaskDescription } from './tasks.js';
+import { loadTasks, closeTaskDescription, selectTaskForDescription } from './tasks.js';
+import { apiGet } from './api.js';
+import { selectProject } from './projects.js';
+
+// Подсказки при вводе идут из in-memory индекса (/api/search/suggest),
+// полный поиск (/api/search/tasks) - только по Enter
+const SUGGEST_DELAY = 150;
+const SUGGEST_LIMIT = 8;
+
+// В строке поиска задач подсказываем задачи и проекты
+const SUGGEST_TYPES = ['task', 'project'];
 
 let searchTimeout = null;
+let suggestRequest = 0; // номер последнего запроса: ответы на устаревшие запросы отбрасываются
+let suggestions = [];
+let activeSuggestion = -1;
+
+function getSuggestionsList() {
+    let list = document.getElementById('searchSuggestions');
+    if (!list) {
+        list = document.createElement('ul');
+        list.id = 'searchSuggestions';
+        list.className = 'search-suggestions';
+        list.style.display = 'none';
+        document.getElementById('searchContainer').appendChild(list);
+    }
+    return list;
+}
+
+function hideSuggestions() {
+    suggestRequest++;
+    suggestions = [];
+    activeSuggestion = -1;
+    const list = document.getElementById('searchSuggestions');
+    if (list) {
+        list.style.display = 'none';
+        list.innerHTML = '';
+    }
+}
+
+function renderSuggestions() {
+    const list = getSuggestionsList();
+    list.innerHTML = '';
+    if (suggestions.length === 0) {
+        list.style.display = 'none';
+        return;
+    }
+    suggestions.forEach((item, index) => {
+        const element = document.createElement('li');
+        element.className = 'search-suggestion' + (index === activeSuggestion ? ' active' : '');
+        if (item.completed) {
+            element.classList.add('completed');
+        }
+        const type = document.createElement('span');
+        type.className = 'search-suggestion-type';
+        type.textContent = item.type === 'project' ? 'Проект' : 'Задача';
+        const title = document.createElement('span');
+        title.className = 'search-suggestion-title';
+        title.textContent = item.title;
+        element.append(type, title);
+        // mousedown, а не click: click придет уже после blur строки поиска
+        element.addEventListener('mousedown', (event) => {
+            event.preventDefault();
+            openSuggestion(item);
+        });
+        list.appendChild(element);
+    });
+    list.style.display = 'block';
+}
+
+async function loadSuggestions(query) {
+    const request = ++suggestRequest;
+    try {
+        const items = await apiGet(`api/search/suggest?q=${encodeURIComponent(query)}&limit=${SUGGEST_LIMIT}`);
+        if (request !== suggestRequest) return;
+        suggestions = items.filter(item => SUGGEST_TYPES.includes(item.type));
+        activeSuggestion = -1;
+        renderSuggestions();
+    } catch (error) {
+        console.error('Ошибка загрузки подсказок поиска:', error);
+    }
+}
+
+async function openSuggestion(item) {
+    hideSuggestions();
+    if (item.type === 'project') {
+        await selectProject(item.id);
+    } else {
+        await selectProject(item.project_id);
+        await selectTaskForDescription(item.id);
+    }
+}
+
+// Полный поиск по задачам с выдачей в списке задач
+export function submitSearch() {
+    clearTimeout(searchTimeout);
+    hideSuggestions();
+    const query = document.getElementById('searchInput').value.trim();
+    if (query) {
+        setIsSearchMode(true);
+        setSelectedTaskId(null);
+        closeTaskDescription();
+        loadTasks();
+    } else {
+        setIsSearchMode(false);
+        if (currentProjectId) {
+            loadTasks();
+        }
+    }
+}
 
 export function debounceSearch() {
     const query = document.getElementById('searchInput').value.trim();
@@ -13,22 +119,42 @@ export function debounceSearch() {
     clearBtn.style.display = query ? 'flex' : 'none';
     
     clearTimeout(searchTimeout);
-    searchTimeout = setTimeout(() => {
-        if (query) {
-            setIsSearchMode(true);
-            setSelectedTaskId(null);
-            closeTaskDescription();
-            loadTasks();
+    if (!query) {
+        hideSuggestions();
+        // Строку очистили - возвращаемся к задачам проекта
+        if (isSearchMode) {
+            submitSearch();
+        }
+        return;
+    }
+    searchTimeout = setTimeout(() => loadSuggestions(query), SUGGEST_DELAY);
+}
+
+// Enter - полный поиск (или выбранная стрелками подсказка), стрелки - выбор подсказки, Escape - закрыть
+export function handleSearchKeydown(event) {
+    if (event.key === 'Enter') {
+        event.preventDefault();
+        if (activeSuggestion >= 0 && suggestions[activeSuggestion]) {
+            openSuggestion(suggestions[activeSuggestion]);
         } else {
-            setIsSearchMode(false);
-            if (currentProjectId) {
-                loadTasks();
-            }
+            submitSearch();
         }
-    }, 300);
+    } else if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+        if (suggestions.length === 0) return;
+        event.preventDefault();
+        // Позиции по кругу: строка ввода (-1), затем подсказки
+        const step = event.key === 'ArrowDown' ? 1 : -1;
+        const positions = suggestions.length + 1;
+        activeSuggestion = (activeSuggestion + 1 + step + positions) % positions - 1;
+        renderSuggestions();
+    } else if (event.key === 'Escape') {
+        hideSuggestions();
+    }
 }
 
 export function clearSearch() {
+    clearTimeout(searchTimeout);
+    hideSuggestions();
     document.getElementById('searchInput').value = '';
     document.getElementById('clearSearchBtn').style.display = 'none';
     setIsSearchMode(false);
@@ -37,3 +163,10 @@ export function clearSearch() {
     }
 }
 
+export function initSearch() {
+    const input = document.getElementById('searchInput');
+    input.addEventListener('input', debounceSearch);
+    input.addEventListener('keydown', handleSearchKeydown);
+    input.addEventListener('blur', hideSuggestions);
+    document.getElementById('clearSearchBtn').addEventListener('click', clearSearch);
+}
@@ -1,11 +1,18 @@
 // Статистика для проекта "Все задачи"
 
 import { currentProjectId } from './state.js';
+import { takeBootstrap } from './bootstrap.js';
 
 // Загрузка статистики
 export async function loadStatistics() {
     if (currentProjectId !== 0) return;
     
+    const bootstrapped = takeBootstrap('statistics', 0);
+    if (bootstrapped) {
+        displayStatistics(bootstrapped);
+        return;
+    }
+    
     try {
         const response = await fetch('/api/statistics');
         if (!response.ok) {
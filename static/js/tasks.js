@@ -4,7 +4,8 @@ import { escapeHtml } from './utils.js';
 import { currentProjectId, selectedTaskId, setSelectedTaskId, showCompletedTasks, setShowCompletedTasks, isSearchMode, setIsSearchMode, currentTaskId, setCurrentTaskId } from './state.js';
 import { getActiveTaskId, timerStartTime, startTimerDisplay, updateTimerUI, updateTimerDisplay, stopTaskTimer } from './timer.js';
 import { showMainNotes } from './notes.js';
-import { apiGet, apiPost, apiPut, apiDelete } from './api.js';
+import { apiFetch, apiGet, apiPost, apiPut, apiDelete } from './api.js';
+import { takeBootstrap } from './bootstrap.js';
 
 // Глобальная переменная для отслеживания скролла контейнера задач
 let tasksContainerScrolling = false;
@@ -65,6 +66,84 @@ if (document.readyState === 'loading') {
     initTasksContainerScrollTracking();
 }
 
+// Размер страницы при загрузке списка задач
+const TASKS_PAGE_SIZE = 100;
+
+// Размер страницы результатов поиска
+const SEARCH_PAGE_SIZE = 50;
+
+// Результаты поиска, показанные в списке (для редактирования задачи из поиска)
+const searchResults = new Map();
+
+// Страница задач: { tasks, next } - next загружает следующую страницу (null - страниц больше нет)
+function tasksPage(tasks, nextCursor) {
+    return { tasks, next: nextCursor ? () => fetchTasksPage(nextCursor) : null };
+}
+
+// Загрузка одной страницы задач текущего проекта; курсор следующей страницы приходит в X-Next-Cursor
+async function fetchTasksPage(after = null) {
+    if (!after) {
+        // Первая страница могла прийти вместе со страницей
+        const page = takeBootstrap('tasks', currentProjectId);
+        if (page && page.includeCompleted === showCompletedTasks) {
+            return tasksPage(page.items, page.nextCursor);
+        }
+    }
+    let path = `api/projects/${currentProjectId}/tasks?include_completed=${showCompletedTasks}&limit=${TASKS_PAGE_SIZE}`;
+    if (after) {
+        path += `&after=${encodeURIComponent(after)}`;
+    }
+    const response = await apiFetch(path, { method: 'GET' });
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const tasks = await response.json();
+    return tasksPage(tasks, response.headers.get('X-Next-Cursor'));
+}
+
+// Загрузка одной страницы результатов поиска; смещение следующей страницы приходит в X-Next-Offset
+async function fetchSearchPage(query, offset = 0) {
+    const path = `api/search/tasks?q=${encodeURIComponent(query)}&limit=${SEARCH_PAGE_SIZE}&offset=${offset}`;
+    const response = await apiFetch(path, { method: 'GET' });
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const tasks = await response.json();
+    tasks.forEach(task => searchResults.set(task.id, task));
+    const nextOffset = response.headers.get('X-Next-Offset');
+    return { tasks, next: nextOffset ? () => fetchSearchPage(query, Number(nextOffset)) : null };
+}
+
+// Кнопка подгрузки следующей страницы задач или результатов поиска
+function appendLoadMoreButton(container, next) {
+    const button = document.createElement('button');
+    button.className = 'btn-secondary tasks-load-more';
+    button.textContent = 'Показать еще';
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+        try {
+            const page = await next();
+            button.remove();
+            renderTasks(container, page.tasks);
+            if (page.next) {
+                appendLoadMoreButton(container, page.next);
+            }
+        } catch (error) {
+            console.error('Ошибка загрузки следующей страницы задач:', error);
+            button.disabled = false;
+        }
+    });
+    container.appendChild(button);
+}
+
+function renderTasks(container, tasks) {
+    tasks.forEach(task => {
+        // Для режима "Все задачи" и результатов поиска показываем название проекта
+        const projectName = ((currentProjectId === 0 || isSearchMode) && task.project_name) ? task.project_name : null;
+        container.appendChild(createTaskElement(task, projectName));
+    });
+}
+
 // Загрузка задач
 export async function loadTasks() {
     // Разрешаем загрузку если currentProjectId === 0 (Все задачи) или есть режим поиска
@@ -75,7 +154,7 @@ export async function loadTasks() {
     
     try {
         console.log('loadTasks: начинаем загрузку для проекта', currentProjectId);
-        let tasks = [];
+        let page;
         if (isSearchMode) {
             const query = document.getElementById('searchInput').value.trim();
             if (!query) {
@@ -85,10 +164,12 @@ export async function loadTasks() {
                 }
                 return;
             }
-            tasks = await apiGet(`api/search/tasks?q=${encodeURIComponent(query)}`);
+            searchResults.clear();
+            page = await fetchSearchPage(query);
         } else {
-            tasks = await apiGet(`api/projects/${currentProjectId}/tasks?include_completed=${showCompletedTasks}`);
+            page = await fetchTasksPage();
         }
+        const tasks = page.tasks;
         
         console.log('loadTasks: получено задач', tasks.length);
         
@@ -108,11 +189,10 @@ export async function loadTasks() {
         }
         
         container.innerHTML = '';
-        tasks.forEach(task => {
-            // Для режима "Все задачи" всегда показываем название проекта
-            const projectName = (currentProjectId === 0 && task.project_name) ? task.project_name : null;
-            container.appendChild(createTaskElement(task, projectName));
-        });
+        renderTasks(container, tasks);
+        if (page.next) {
+            appendLoadMoreButton(container, page.next);
+        }
         
         console.log('loadTasks: задачи успешно загружены и отображены');
     } catch (error) {
@@ -132,6 +212,15 @@ function createTaskElement(task, projectName = null) {
     
     const projectLabel = projectName ? `<div class="task-project-label">${escapeHtml(projectName)}</div>` : '';
     
+    // Фрагмент с совпадением из поиска: экранируем текст и возвращаем только теги <mark>
+    let searchSnippet = '';
+    if (task.snippet && task.snippet !== task.title) {
+        const highlighted = escapeHtml(task.snippet)
+            .replace(/&lt;mark&gt;/g, '<mark>')
+            .replace(/&lt;\/mark&gt;/g, '</mark>');
+        searchSnippet = `<div class="task-search-snippet">${highlighted}</div>`;
+    }
+    
     // Форматируем стоимость задачи
     let priceBadge = '';
     if (task.price && parseFloat(task.price) > 0) {
@@ -168,6 +257,7 @@ function createTaskElement(task, projectName = null) {
         >
         <div class="task-content">
             <div class="task-title">${escapeHtml(task.title)}${deadlineBadge}${priceBadge}</div>
+            ${searchSnippet}
             ${projectLabel}
         </div>
         <div class="task-actions">
@@ -433,18 +523,13 @@ export async function editTask(taskId, event) {
     
     // Получаем данные задачи
     try {
-        let tasks = [];
         let task = null;
         if (isSearchMode) {
-            const query = document.getElementById('searchInput').value.trim();
-            tasks = await apiGet(`api/search/tasks?q=${encodeURIComponent(query)}`);
-            task = tasks.find(t => t.id === taskId);
+            // Результаты поиска содержат все поля задачи; задача есть среди загруженных страниц
+            task = searchResults.get(taskId) || null;
             // Если редактируем из поиска, переключаемся на проект задачи
             if (task && task.project_id && task.project_id !== currentProjectId) {
                 await selectProject(task.project_id);
-                // Перезагружаем задачи проекта
-                const projectTasks = await apiGet(`api/projects/${task.project_id}/tasks`);
-                task = projectTasks.find(t => t.id === taskId) || task;
             }
         } else {
             const tasks = await apiGet(`api/projects/${currentProjectId}/tasks?include_completed=${showCompletedTasks}`);
@@ -2,6 +2,7 @@
 
 import { selectedTaskId, showCompletedTasks } from './state.js';
 import { loadTasks, closeTaskDescription } from './tasks.js';
+import { apiBatch } from './api.js';
 
 let timerInterval = null;
 export let timerStartTime = null;
@@ -41,9 +42,10 @@ function restoreTimer() {
 export async function startTaskTimer(taskId) {
     if (!taskId) return;
     
-    // Останавливаем предыдущий таймер, если есть
+    // Останавливаем предыдущий таймер, если есть (в БД - одним пакетом с запуском нового)
+    const previousTaskId = timerInterval ? getActiveTaskId() : null;
     if (timerInterval) {
-        stopTaskTimer();
+        stopTaskTimer(previousTaskId, false);
     }
     
     const startTime = new Date();
@@ -56,14 +58,13 @@ export async function startTaskTimer(taskId) {
     }));
     
     // Сохраняем в БД
+    const operations = [];
+    if (previousTaskId && previousTaskId !== taskId) {
+        operations.push({ method: 'PUT', path: `/api/tasks/${previousTaskId}`, body: { started_at: '' } });
+    }
+    operations.push({ method: 'PUT', path: `/api/tasks/${taskId}`, body: { started_at: startTime.toISOString() } });
     try {
-        await fetch(`/api/tasks/${taskId}`, {
-            method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ started_at: startTime.toISOString() })
-        });
+        await apiBatch(operations);
     } catch (error) {
         console.error('Ошибка сохранения времени начала:', error);
     }
@@ -73,8 +74,9 @@ export async function startTaskTimer(taskId) {
     updateTimerUI(true);
 }
 
-// Завершить работу над задачей (остановить таймер)
-export async function stopTaskTimer(taskId = null) {
+// Завершить работу над задачей (остановить таймер).
+// saveToServer = false - started_at очистит следующий запрос вызывающего кода
+export async function stopTaskTimer(taskId = null, saveToServer = true) {
     if (!taskId) {
         // Получаем taskId из localStorage
         const savedTimer = localStorage.getItem('activeTaskTimer');
@@ -98,7 +100,7 @@ export async function stopTaskTimer(taskId = null) {
     localStorage.removeItem('activeTaskTimer');
     
     // Обновляем БД - очищаем started_at
-    if (taskId) {
+    if (taskId && saveToServer) {
         try {
             await fetch(`/api/tasks/${taskId}`, {
                 method: 'PUT',
@@ -127,7 +129,8 @@ export async function completeTask(taskId) {
     // Останавливаем таймер, если он запущен
     const activeTaskId = getActiveTaskId();
     if (activeTaskId === taskId) {
-        await stopTaskTimer(taskId);
+        // started_at очищается тем же запросом, что завершает задачу
+        await stopTaskTimer(taskId, false);
     }
     
     // Устанавливаем задачу как завершенную в БД
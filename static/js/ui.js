@@ -1,5 +1,7 @@
 // Управление UI состоянием
 
+import { takeBootstrap } from './bootstrap.js';
+
 // Проверка мобильного устройства
 function isMobile() {
     return window.innerWidth <= 768;
@@ -132,13 +134,16 @@ window.addEventListener('resize', () => {
 // Загрузка состояния панели
 export async function loadPanelState() {
     try {
-        const response = await fetch('/api/ui-state?key=projects_panel_collapsed');
-        if (!response.ok) {
-            console.warn('Не удалось загрузить состояние панели:', response.status);
-            return;
+        let value = takeBootstrap('uiState')?.projects_panel_collapsed;
+        if (value === undefined) {
+            const response = await fetch('/api/ui-state?key=projects_panel_collapsed');
+            if (!response.ok) {
+                console.warn('Не удалось загрузить состояние панели:', response.status);
+                return;
+            }
+            value = (await response.json()).value;
         }
-        const data = await response.json();
-        const isCollapsed = data.value === '1';
+        const isCollapsed = value === '1';
         
         if (isCollapsed) {
             document.getElementById('projectsPanel').classList.add('collapsed');
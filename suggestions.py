@@ -0,0 +1,180 @@
+"""
+In-memory индекс подсказок для поиска по мере ввода.
+
+Слова заголовков (задачи, проекты, заметки ежедневника, события календаря)
+хранятся в отсортированном списке, поэтому все слова с заданным префиксом
+находятся двоичным поиском, без обращения к базе данных.
+"""
+import bisect
+import heapq
+import re
+import threading
+
+# Порядок типов в выдаче при прочих равных
+KIND_PRIORITY = {'project': 0, 'task': 1, 'daily_note': 2, 'event': 3}
+
+# Сколько вхождений слова просматривается на запрос: ограничивает время ответа
+# для коротких префиксов, которые встречаются почти везде
+MAX_SCAN = 2000
+
+# Во сколько раз больше кандидатов, чем нужно выдать, набирается для ранжирования
+CANDIDATES_FACTOR = 5
+
+# До стольких вхождений слов массовые изменения вносятся по одному двоичным поиском;
+# больше - одним проходом по всему списку
+SMALL_CHANGE = 1000
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре (ё приравнивается к е)"""
+    return re.findall(r'\w+', (text or '').casefold().replace('ё', 'е'))
+
+
+class SuggestionIndex:
+    """Префиксный индекс слов заголовков с инкрементальным обновлением"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []  # отсортированные кортежи (слово, тип, id)
+        self._docs = {}     # (тип, id) -> (заголовок, слова, доп. поля)
+        self.loaded = False
+
+    def load(self, items):
+        """Заполнить индекс целиком. items: кортежи (тип, id, заголовок, доп. поля)"""
+        entries = []
+        docs = {}
+        for kind, item_id, title, extra in items:
+            words = tokenize(title)
+            docs[(kind, item_id)] = (title, words, extra or {})
+            entries.extend((word, kind, item_id) for word in set(words))
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._docs = docs
+            self.loaded = True
+
+    def add(self, kind, item_id, title, extra=None):
+        """Добавить или заменить элемент"""
+        with self._lock:
+            self._remove_entries(kind, item_id)
+            words = tokenize(title)
+            self._docs[(kind, item_id)] = (title, words, extra or {})
+            for word in set(words):
+                bisect.insort(self._entries, (word, kind, item_id))
+
+    def update(self, kind, item_id, title=None, **extra):
+        """Изменить заголовок и/или доп. поля уже проиндексированного элемента"""
+        with self._lock:
+            doc = self._docs.get((kind, item_id))
+            if doc is None:
+                return
+            if title is None:
+                doc[2].update(extra)
+            else:
+                self.add(kind, item_id, title, {**doc[2], **extra})
+
+    def add_many(self, items):
+        """Добавить или заменить несколько элементов (массовое создание): немного - вставками
+        двоичным поиском, много - одним слиянием списка. items: кортежи (тип, id, заголовок, доп. поля)"""
+        items = list(items)
+        with self._lock:
+            self.remove_many((kind, item_id) for kind, item_id, _, _ in items)
+            entries = []
+            for kind, item_id, title, extra in items:
+                words = tokenize(title)
+                self._docs[(kind, item_id)] = (title, words, extra or {})
+                entries.extend((word, kind, item_id) for word in set(words))
+            if len(entries) <= SMALL_CHANGE:
+                for entry in entries:
+                    bisect.insort(self._entries, entry)
+                return
+            entries.sort()
+            self._entries = list(heapq.merge(self._entries, entries))
+
+    def remove(self, kind, item_id):
+        with self._lock:
+            self._remove_entries(kind, item_id)
+
+    def remove_many(self, keys):
+        """Удалить несколько элементов (тип, id): немного - двоичным поиском, много - одним
+        проходом по списку слов"""
+        with self._lock:
+            keys = [key for key in set(keys) if key in self._docs]
+            if sum(len(self._docs[key][1]) for key in keys) <= SMALL_CHANGE:
+                for kind, item_id in keys:
+                    self._remove_entries(kind, item_id)
+                return
+            removed = set(keys)
+            for key in removed:
+                del self._docs[key]
+            self._entries = [entry for entry in self._entries if entry[1:] not in removed]
+
+    def remove_where(self, kind, **extra):
+        """Удалить элементы типа kind, у которых доп. поля совпадают с extra"""
+        with self._lock:
+            self.remove_many([key for key, (_, _, fields) in self._docs.items()
+                              if key[0] == kind and all(fields.get(name) == value for name, value in extra.items())])
+
+    def _remove_entries(self, kind, item_id):
+        doc = self._docs.pop((kind, item_id), None)
+        if doc is None:
+            return
+        for word in set(doc[1]):
+            entry = (word, kind, item_id)
+            pos = bisect.bisect_left(self._entries, entry)
+            if pos < len(self._entries) and self._entries[pos] == entry:
+                del self._entries[pos]
+
+    def _prefix_range(self, prefix):
+        lo = bisect.bisect_left(self._entries, (prefix,))
+        # Следующая за префиксом строка: увеличиваем последний символ
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        hi = bisect.bisect_left(self._entries, (upper,), lo)
+        return lo, hi
+
+    def search(self, query, limit=10):
+        """Элементы, в заголовке которых каждое слово запроса начинает какое-то слово.
+
+        Вхождения перебираются в алфавитном порядке слов, поэтому первыми попадают
+        самые короткие дополнения префикса; перебор останавливается, как только
+        набрано достаточно кандидатов. Среди них выше те, чей заголовок начинается
+        с запроса, затем проекты, открытые задачи, более короткие заголовки.
+        Возвращает список словарей (type, id, title, ...).
+        """
+        words = tokenize(query)
+        if not words or limit <= 0:
+            return []
+
+        with self._lock:
+            ranges = [self._prefix_range(word) for word in words]
+            # Перебираем вхождения самого редкого слова, остальные проверяем по документу
+            driver = min(range(len(words)), key=lambda i: ranges[i][1] - ranges[i][0])
+            lo, hi = ranges[driver]
+            hi = min(hi, lo + MAX_SCAN)
+            other_words = words[:driver] + words[driver + 1:]
+
+            query_text = ' '.join(words)
+            wanted = limit * CANDIDATES_FACTOR
+            matches = []
+            seen = set()
+            for _, kind, item_id in self._entries[lo:hi]:
+                key = (kind, item_id)
+                if key in seen:
+                    continue
+                seen.add(key)
+                title, doc_words, extra = self._docs[key]
+                if other_words and not all(any(w.startswith(word) for w in doc_words) for word in other_words):
+                    continue
+                rank = (
+                    0 if ' '.join(doc_words).startswith(query_text) else 1,
+                    KIND_PRIORITY.get(kind, len(KIND_PRIORITY)),
+                    1 if extra.get('completed') else 0,
+                    len(title),
+                )
+                matches.append((rank, kind, item_id, title, extra))
+                if len(matches) >= wanted:
+                    break
+
+        matches.sort(key=lambda m: m[0])
+        return [{'type': kind, 'id': item_id, 'title': title, **extra}
+                for _, kind, item_id, title, extra in matches[:limit]]
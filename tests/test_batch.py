@@ -0,0 +1,71 @@
+import pytest
+
+from database import Database
+
+
+@pytest.fixture(params=[False, True], ids=['direct', 'single_writer'])
+def client(request, tmp_path, monkeypatch):
+    # app при импорте открывает planner.db в текущем каталоге - подменяем базу на временную
+    monkeypatch.chdir(tmp_path)
+    import app
+    db = Database(str(tmp_path / 'test.db'), single_writer=request.param)
+    monkeypatch.setattr(app, 'db', db)
+    yield app.app.test_client(), db
+    db.close()
+
+
+def task_titles(db, project_id):
+    return sorted(task[1] for task in db.get_tasks(project_id))
+
+
+def test_batch_commits_all_operations(client):
+    client, db = client
+    project_id = db.create_project('Проект')
+    
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': f'/api/projects/{project_id}/tasks', 'body': {'title': 'первая'}},
+        {'method': 'POST', 'path': f'/api/projects/{project_id}/tasks', 'body': {'title': 'вторая'}},
+    ]})
+    
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json['results']] == [201, 201]
+    assert task_titles(db, project_id) == ['вторая', 'первая']
+
+
+def test_failing_operation_rolls_back_batch(client):
+    client, db = client
+    project_id = db.create_project('Проект')
+    task_id = db.create_task(project_id, 'было')
+    
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': f'/api/projects/{project_id}/tasks', 'body': {'title': 'откатится'}},
+        {'method': 'PUT', 'path': f'/api/tasks/{task_id}', 'body': {'title': 'стало'}},
+        {'method': 'PUT', 'path': '/api/tasks/999999/move', 'body': {'prev_id': None, 'next_id': None}},
+    ]})
+    
+    assert response.status_code == 404
+    assert response.json['failed'] == 2
+    assert task_titles(db, project_id) == ['было']
+
+
+def test_swallowed_database_error_rolls_back_batch(client, monkeypatch):
+    client, db = client
+    project_id = db.create_project('Абонент', is_subscription=True)
+    task_id = db.create_task(project_id, 'задача')
+    db.update_task(task_id, started_at='2026-10-18T09:00:00')
+    
+    def failing_subscription_time(*args):
+        with db.connection() as conn:
+            conn.execute('UPDATE no_such_table SET hours = 0')
+    
+    # update_task перехватывает ошибку учета времени абонента и отвечает 200
+    monkeypatch.setattr(db, 'add_daily_subscription_time', failing_subscription_time)
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': f'/api/projects/{project_id}/tasks', 'body': {'title': 'откатится'}},
+        {'method': 'PUT', 'path': f'/api/tasks/{task_id}', 'body': {'completed': True}},
+    ]})
+    
+    assert response.status_code == 500
+    assert response.json['failed'] == 1
+    assert task_titles(db, project_id) == ['задача']
+    assert [task[3] for task in db.get_tasks(project_id)] == [0]
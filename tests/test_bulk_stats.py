@@ -0,0 +1,45 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from database import Database
+
+
+def stats_snapshot(db):
+    """Статистика по проектам и по дням; часы округлены - суммы float зависят от порядка сложения"""
+    today = date.today()
+    by_project = [row[:4] + (round(row[4], 6),) for row in db.get_task_stats_by_project()]
+    by_day = [row[:4] + (round(row[4], 6),)
+              for row in db.query_task_stats(today - timedelta(days=30), today, 'day', 'project')]
+    return by_project, by_day
+
+
+@pytest.mark.parametrize('use_analytics', [False, True])
+def test_stats_after_bulk_changes_match_recount(tmp_path, use_analytics):
+    path = str(tmp_path / 'planner.db')
+    db = Database(path, use_analytics=use_analytics)
+    first = db.create_project('Первый')
+    second = db.create_project('Второй')
+    
+    task_ids = db.create_tasks(first, [{'title': f'задача {i}', 'price': i * 100} for i in range(10)])
+    db.update_tasks(task_ids[:6], started_at=(datetime.now() - timedelta(hours=2)).isoformat())
+    db.update_tasks(task_ids[:6], completed=True)
+    # Перенос выполненных и открытых задач, повторное открытие и удаление выполненной
+    db.update_tasks(task_ids[4:8], project_id=second)
+    db.update_tasks(task_ids[5:6], completed=False)
+    db.delete_tasks([task_ids[0], task_ids[7]])
+    db.create_tasks(second, [{'title': 'еще задача'}])
+    
+    incremental = stats_snapshot(db)
+    db.close()
+    
+    recount = Database(path)
+    recount.rebuild_task_stats()
+    try:
+        assert incremental == stats_snapshot(recount)
+    finally:
+        recount.close()
+    
+    by_project, _ = incremental
+    assert [(name, completed, total) for _, name, completed, total, _ in by_project] == [
+        ('Первый', 3, 5), ('Второй', 1, 4)]
@@ -0,0 +1,72 @@
+import pytest
+
+import database
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'planner.db'))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def project_id(db):
+    """Два проекта по 23 задачи; возвращает id первого"""
+    first = db.create_project('Первый')
+    second = db.create_project('Второй')
+    # Одинаковые created_at (одна пачка), сроки в прошлом и будущем, без срока, выполненные
+    for project_id in (first, second):
+        task_ids = db.create_tasks(project_id, [
+            {'title': f'задача {i}', 'deadline': [None, '2020-01-01', '2030-06-01', '2030-06-01T10:00'][i % 4]}
+            for i in range(23)])
+        db.update_tasks(task_ids[::3], completed=True)
+    return first
+
+
+def read_pages(db, project_id, limit, include_completed=True):
+    tasks, cursor = db.get_tasks_page(project_id, limit, include_completed=include_completed)
+    pages = 1
+    while cursor is not None:
+        page, cursor = db.get_tasks_page(project_id, limit, after=cursor, include_completed=include_completed)
+        assert len(page) <= limit
+        tasks.extend(page)
+        pages += 1
+    return tasks, pages
+
+
+@pytest.mark.parametrize('limit', [1, 4, 7, 46, 100])
+@pytest.mark.parametrize('include_completed', [True, False])
+def test_pages_return_every_task_once_in_order(db, project_id, limit, include_completed):
+    expected = db.get_tasks(project_id, include_completed=include_completed)
+    
+    tasks, pages = read_pages(db, project_id, limit, include_completed)
+    
+    task_ids = [task[0] for task in tasks]
+    assert len(set(task_ids)) == len(task_ids) == (23 if include_completed else 15)
+    assert task_ids == [task[0] for task in expected]
+    assert pages <= len(expected) // limit + 1
+
+
+@pytest.mark.parametrize('limit', [1, 5, 50])
+def test_pages_of_all_projects(db, project_id, limit):
+    expected = db.get_all_tasks()
+    
+    tasks, _ = read_pages(db, 0, limit)
+    
+    assert tasks == expected
+    assert len({task[0] for task in tasks}) == 46
+
+
+def test_stream_matches_list(db, project_id, monkeypatch):
+    # Маленькие порции: поток читает задачи несколькими страницами
+    monkeypatch.setattr(database, 'STREAM_BATCH_SIZE', 4)
+    
+    assert list(db.iter_tasks(project_id)) == db.get_tasks(project_id)
+    assert list(db.iter_tasks(0, include_completed=False)) == db.get_all_tasks(include_completed=False)
+
+
+def test_invalid_cursor(db, project_id):
+    with pytest.raises(ValueError):
+        db.get_tasks_page(project_id, 10, after='не курсор')
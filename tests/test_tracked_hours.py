@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta, timezone
+
+import migrations
+
+
+def test_utc_start_with_naive_completion():
+    # started_at от клиента (toISOString, UTC с 'Z'), completed_at сервера (локальное без пояса)
+    completed = datetime.now()
+    started = (completed - timedelta(hours=2)).astimezone(timezone.utc)
+    started_at = started.strftime('%Y-%m-%dT%H:%M:%S.') + f'{started.microsecond // 1000:03d}Z'
+    
+    hours = migrations.tracked_hours(started_at, completed.isoformat())
+    
+    assert abs(hours - 2) < 0.01
+
+
+def test_naive_timestamps():
+    assert migrations.tracked_hours('2026-10-18T09:00:00', '2026-10-18T10:30:00') == 1.5
+
+
+def test_unparsable_timestamps():
+    assert migrations.tracked_hours('вчера', '2026-10-18T10:30:00') == 0.0
+    assert migrations.tracked_hours(None, '2026-10-18T10:30:00') == 0.0
@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from database import Database
+
+
+class WriteAborted(BaseException):
+    """Не Exception: так прерывают изменение KeyboardInterrupt и SystemExit"""
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'planner.db'), single_writer=True)
+    yield db
+    db.close()
+
+
+def run_in_thread(func):
+    """Выполнить func в отдельном потоке; вернуть (результат или исключение, завершилась ли)"""
+    outcome = []
+    
+    def target():
+        try:
+            outcome.append(func())
+        except BaseException as e:
+            outcome.append(e)
+    
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join(timeout=10)
+    return (outcome[0] if outcome else None), not thread.is_alive()
+
+
+def task_titles(db, project_id):
+    return sorted(task[1] for task in db.get_tasks(project_id))
+
+
+def test_failing_write_rolls_back_and_returns_error(db):
+    project_id = db.create_project('Проект')
+    
+    def failing_write():
+        db.create_task(project_id, 'откатится')
+        raise ValueError('ошибка изменения')
+    
+    outcome, finished = run_in_thread(lambda: db.run_write(failing_write))
+    
+    assert finished
+    assert isinstance(outcome, ValueError)
+    assert task_titles(db, project_id) == []
+
+
+def test_failing_write_does_not_affect_its_batch(db):
+    project_id = db.create_project('Проект')
+    start = threading.Barrier(8)
+    errors = {}
+    
+    def write(index):
+        # Потоки ставят изменения одновременно - писатель выполняет их одной пачкой
+        start.wait()
+        try:
+            if index == 4:
+                db.run_write(lambda: (db.create_task(project_id, 'откатится'), 1 / 0))
+            else:
+                db.create_task(project_id, f'задача {index}')
+        except ZeroDivisionError as e:
+            errors[index] = e
+    
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    
+    assert not any(thread.is_alive() for thread in threads)
+    assert list(errors) == [4]
+    assert task_titles(db, project_id) == sorted(f'задача {index}' for index in range(8) if index != 4)
+
+
+def test_base_exception_does_not_stop_writer(db):
+    project_id = db.create_project('Проект')
+    
+    def interrupted_write():
+        db.create_task(project_id, 'откатится')
+        raise WriteAborted()
+    
+    outcome, finished = run_in_thread(lambda: db.run_write(interrupted_write))
+    assert finished
+    assert isinstance(outcome, WriteAborted)
+    
+    outcome, finished = run_in_thread(lambda: db.create_task(project_id, 'сохранится'))
+    assert finished
+    assert task_titles(db, project_id) == ['сохранится']